@@ -0,0 +1,130 @@
+"""
+Benchmark: proxy call latency with and without hedged page requests.
+
+Drives upstream.Paginator against benchmarks/fake_upstream.py where a small
+share of pages is very slow. Without hedging a call is as slow as its
+slowest page; with hedging a slow page gets a duplicate request after the
+chosen percentile of recent page latency, within the extra-load cap. The
+extra load is reported as measured (hedges per page request, and upstream
+requests over the unhedged run) and checked against the credit budget:
+at most max_ratio of the page requests plus the reserve.
+
+Usage:
+    python benchmarks/bench_hedging.py [--calls 200] [--tail-rate 0.02]
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+from upstream import Hedger, Paginator, create_client  # noqa: E402
+
+
+async def run_calls(client, fake, hedger, calls, concurrency):
+    async def one(i):
+        async def send(range_header):
+            response = await client.get(
+                "https://fake/routings",
+                params={"placeOfLoading": f"L{i:04d}", "placeOfDischarge": "BBBBB"},
+                headers={"Range": range_header},
+            )
+            response.raise_for_status()
+            return response
+
+        paginator = Paginator(
+            send, "schedule:bench", history=None, scheduler=None, hedger=hedger
+        )
+        start = time.perf_counter()
+        items = await paginator.fetch_all()
+        assert [item["item"] for item in items] == list(range(fake.total_items))
+        return time.perf_counter() - start
+
+    slots = asyncio.Semaphore(concurrency)
+
+    async def limited(i):
+        async with slots:
+            return await one(i)
+
+    return await asyncio.gather(*(limited(i) for i in range(calls)))
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+async def run(args):
+    print(
+        f"{args.calls} calls of {args.items} items, {args.latency * 1000:.0f} ms pages "
+        f"(+{args.jitter * 1000:.0f} ms jitter), {args.tail_rate:.0%} of pages take "
+        f"{args.tail_latency * 1000:.0f} ms"
+    )
+    scenarios = [
+        ("no hedging", None),
+        (
+            f"hedge at p{args.percentile:g}",
+            Hedger(percentile=args.percentile, max_ratio=args.max_ratio),
+        ),
+    ]
+    baseline = None
+    for name, hedger in scenarios:
+        fake = FakeUpstream(
+            total_items=args.items,
+            latency=args.latency,
+            jitter=args.jitter,
+            tail_rate=args.tail_rate,
+            tail_latency=args.tail_latency,
+            seed=1,
+        )
+        async with create_client(transport=httpx.MockTransport(fake.handler)) as client:
+            # Fill the latency window first, as in a running server
+            await run_calls(client, fake, hedger, args.warmup, args.concurrency)
+            requests_before = fake.requests
+            if hedger:
+                hedger.requests = hedger.fired = hedger.won = 0
+                hedger.credit = 0.0
+            latencies = await run_calls(
+                client, fake, hedger, args.calls, args.concurrency
+            )
+        requests = fake.requests - requests_before
+        baseline = requests if baseline is None else baseline
+        line = (
+            f"  {name:<14} p50 {statistics.median(latencies) * 1000:6.0f} ms  "
+            f"p99 {percentile(latencies, 99) * 1000:6.0f} ms  "
+            f"{requests} upstream requests"
+        )
+        if hedger:
+            assert hedger.fired <= hedger.max_ratio * hedger.requests + hedger.reserve
+            line += (
+                f" ({requests / baseline - 1:+.1%})  hedges {hedger.fired} "
+                f"({hedger.fired / hedger.requests:.1%} of page requests, cap "
+                f"{hedger.max_ratio:.0%}), won {hedger.won}"
+            )
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--items", type=int, default=60)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--tail-rate", type=float, default=0.02)
+    parser.add_argument("--tail-latency", type=float, default=0.5)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--max-ratio", type=float, default=0.1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: startup load time of the CSV parse vs the compiled snapshot.
+
+Usage:
+    python benchmarks/bench_load.py [--pairs 20000] [--dates 52]
+"""
+
+import argparse
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from store import AvailabilityStore  # noqa: E402
+
+
+def write_csv(path: Path, n_pairs: int, n_dates: int) -> None:
+    rng = np.random.default_rng(42)
+    dates = np.datetime64("2025-11-03") + np.arange(n_dates) * 7
+    values = rng.uniform(0, 100, size=(n_pairs, n_dates))
+    with open(path, "w") as f:
+        f.write("Qlik Sense export\n")
+        f.write("POL-POD Booked;" + ";".join(str(d) for d in dates) + "\n")
+        for i, row in enumerate(values):
+            cells = ";".join(f"{v:.2f}" for v in row)
+            f.write(f"P{i:05d}-D{i * 7 % 99991:05d};{cells}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--dates", type=int, default=52)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "export.csv"
+        snapshot_path = Path(tmp) / "export.snapshot"
+        write_csv(csv_path, args.pairs, args.dates)
+        AvailabilityStore.from_csv(csv_path).save_snapshot(snapshot_path)
+
+        print(f"{args.pairs} port pairs x {args.dates} dates")
+        timings = {}
+        for name, load in (
+            ("csv", lambda: AvailabilityStore.from_csv(csv_path)),
+            ("snapshot", lambda: AvailabilityStore.from_snapshot(snapshot_path)),
+        ):
+            timings[name] = min(timeit.repeat(load, number=1, repeat=5))
+            print(f"  {name:<9} {timings[name] * 1000:10.1f} ms")
+        print(f"  speedup   {timings['csv'] / timings['snapshot']:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: upstream pagination with and without speculative page fetches.
+
+Drives upstream.Paginator against benchmarks/fake_upstream.py, which emulates
+the 206/content-range behaviour of the CMA CGM APIs, and checks every run
+returns each item exactly once, in order.
+
+Usage:
+    python benchmarks/bench_pagination.py [--items 40] [--latency 0.1]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+from upstream import LaneHistory, Paginator, create_client  # noqa: E402
+
+
+async def run_once(client, fake, lane, history, **options):
+    async def send(range_header):
+        response = await client.get(
+            "https://fake/routings",
+            params={"placeOfLoading": lane[0], "placeOfDischarge": lane[1]},
+            headers={"Range": range_header},
+        )
+        response.raise_for_status()
+        return response
+
+    requests_before = fake.requests
+    paginator = Paginator(send, "-".join(lane), history=history, **options)
+    start = time.perf_counter()
+    items = await paginator.fetch_all()
+    elapsed = time.perf_counter() - start
+
+    total = fake.lane_totals.get("-".join(lane), fake.total_items)
+    assert [item["item"] for item in items] == list(range(total)), items
+    return elapsed, fake.requests - requests_before, paginator.stats()
+
+
+async def run(args):
+    fake = FakeUpstream(
+        total_items=args.items, latency=args.latency, lane_totals={"AAAAA-SHRNK": 40}
+    )
+    history = LaneHistory()
+    async with create_client(transport=httpx.MockTransport(fake.handler)) as client:
+        print(f"{args.items} items per lane, {args.latency * 1000:.0f} ms per page")
+        scenarios = [
+            ("cold history", ("AAAAA", "BBBBB"), {}),
+            ("warm history", ("AAAAA", "BBBBB"), {}),
+            ("no speculation", ("AAAAA", "CCCCC"), {"speculative_pages": 0}),
+            ("page size 10", ("AAAAA", "DDDDD"), {"page_size": 10}),
+            ("concurrency 10", ("AAAAA", "EEEEE"), {"concurrency": 10}),
+        ]
+        for name, lane, options in scenarios:
+            elapsed, requests, stats = await run_once(
+                client, fake, lane, history, **options
+            )
+            print(
+                f"  {name:<16} {elapsed * 1000:7.0f} ms  {requests:3d} requests  "
+                f"speculative used {stats['speculative_used']}"
+                f"/{stats['speculative_launched']}"
+            )
+
+        # History says 40 items but the lane has shrunk: extra pages are dropped
+        await run_once(client, fake, ("AAAAA", "SHRNK"), history)
+        fake.lane_totals["AAAAA-SHRNK"] = 7
+        elapsed, requests, stats = await run_once(
+            client, fake, ("AAAAA", "SHRNK"), history
+        )
+        print(
+            f"  {'shrunk lane':<16} {elapsed * 1000:7.0f} ms  {requests:3d} requests  "
+            f"speculative used {stats['speculative_used']}"
+            f"/{stats['speculative_launched']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
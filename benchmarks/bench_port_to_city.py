@@ -0,0 +1,110 @@
+"""
+Benchmark: port code to city resolution.
+
+Compares the original per-code loop of GET /port-to-city (with its debug
+prints sent to a sink) against ports.lookup_cities, then times the GET and
+POST /port-to-city/batch endpoints in-process (GET only for as many codes
+as fit in a URL).
+
+Usage:
+    python benchmarks/bench_port_to_city.py [--codes 5000] [--unique 300]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main as app_module  # noqa: E402
+from ports import lookup_cities, parse_ports_param, port_directory  # noqa: E402
+
+
+def legacy(ports, mapping):
+    """The handler body before the fast path, minus FastAPI"""
+    print(f"DEBUG - Received ports: {ports}")
+    print(f"DEBUG - Type: {type(ports)}")
+    port_list = json.loads(ports[0])
+    print(f"DEBUG - Successfully parsed from list element: {port_list}")
+    print(f"DEBUG - Final port_list: {port_list}, length: {len(port_list)}")
+    result = []
+    for port_code in port_list:
+        port_upper = port_code.strip().upper()
+        if port_upper:
+            result.append(mapping.get(port_upper, ""))
+    print(result)
+    return result
+
+
+def fast(ports, mapping):
+    cities = lookup_cities(parse_ports_param(ports), mapping)
+    return [city for city in cities if city is not None]
+
+
+def best_of(fn, repeat=20):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+async def endpoint_timings(codes, get_codes, repeat=10):
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        timings = {f"GET ({get_codes} codes)": [], "POST batch": []}
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = await client.get(
+                "/port-to-city", params={"ports": json.dumps(codes[:get_codes])}
+            )
+            timings[f"GET ({get_codes} codes)"].append(time.perf_counter() - start)
+            assert response.status_code == 200
+
+            start = time.perf_counter()
+            response = await client.post("/port-to-city/batch", json={"ports": codes})
+            timings["POST batch"].append(time.perf_counter() - start)
+            assert response.status_code == 200
+    return {name: min(values) * 1000 for name, values in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--codes", type=int, default=5000)
+    parser.add_argument("--unique", type=int, default=300)
+    parser.add_argument("--get-codes", type=int, default=1000)
+    args = parser.parse_args()
+
+    mapping = port_directory()
+    rng = random.Random(0)
+    known = [mapping.code(row) for row in range(len(mapping))]
+    pool = rng.sample(known, min(args.unique, len(known)))
+    pool = [code.lower() if i % 3 == 0 else f" {code} " for i, code in enumerate(pool)]
+    codes = [rng.choice(pool) for _ in range(args.codes)]
+    ports = [json.dumps(codes)]
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert legacy(ports, mapping) == fast(ports, mapping)
+        legacy_ms = best_of(lambda: legacy(ports, mapping))
+    fast_ms = best_of(lambda: fast(ports, mapping))
+
+    print(f"{args.codes} codes, {len(pool)} distinct")
+    print(f"  per-code loop + debug prints  {legacy_ms:8.2f} ms")
+    print(f"  deduplicated lookup           {fast_ms:8.2f} ms")
+    # Much longer JSON arrays do not fit in a query string
+    get_codes = min(args.codes, args.get_codes)
+    for name, ms in asyncio.run(endpoint_timings(codes, get_codes)).items():
+        print(f"  {name:<30}{ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
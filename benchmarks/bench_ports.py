@@ -0,0 +1,227 @@
+"""
+Benchmark: port directory lookup latency and resident memory at full
+UN/LOCODE size.
+
+Generates a synthetic code list of --locations entries (the curated
+ports.csv plus made-up locations, since the UN/LOCODE release is not in the
+repo), then in separate processes compares a plain dict built from the CSV,
+as the old PORT_TO_CITY literal was, with the compiled, memory-mapped
+ports.PortDirectory, and times nearby-port queries against a full scan.
+
+Usage:
+    python benchmarks/bench_ports.py [--locations 120000]
+"""
+
+import argparse
+import csv
+import json
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import numpy as np  # noqa: E402
+
+from ports import (  # noqa: E402
+    PortDirectory,
+    haversine_km,
+    lookup_cities,
+    normalize_code,
+    read_ports_csv,
+)
+
+SYLLABLES = (
+    "ka lo ri san ta ve mar por bel ham to ne sha gu do lin ber ra mi chi".split()
+)
+
+
+def synthetic_pairs(count, seed=0):
+    """code -> (city, lat, lon): ports.csv plus made-up locations"""
+    rng = random.Random(seed)
+    pairs = {}
+    for code, city, *_ in read_ports_csv(ROOT / "ports.csv"):
+        pairs[code] = (city, rng.uniform(-60, 70), rng.uniform(-180, 180))
+    countries = ["".join(rng.choices(string.ascii_uppercase, k=2)) for _ in range(240)]
+    alphabet = string.ascii_uppercase + "23456789"
+    while len(pairs) < count:
+        code = rng.choice(countries) + "".join(rng.choices(alphabet, k=3))
+        words = [
+            "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))).capitalize()
+            for _ in range(rng.choice((1, 1, 1, 2)))
+        ]
+        position = (rng.uniform(-60, 70), rng.uniform(-180, 180))
+        pairs.setdefault(code, (" ".join(words), *position))
+    return pairs
+
+
+def rss_mb():
+    """(anonymous, file-backed) resident memory in MB"""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value
+    return tuple(int(fields[name].split()[0]) / 1000 for name in ("RssAnon", "RssFile"))
+
+
+def rss_delta(before):
+    return [round(now - then, 1) for now, then in zip(rss_mb(), before)]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def child(mode, path, codes_path):
+    """Open the dataset one way and report timings and RSS as JSON"""
+    codes = json.loads(Path(codes_path).read_text())
+    before = rss_mb()
+    start = time.perf_counter()
+    if mode == "dict":
+        mapping = {
+            normalize_code(code): city for code, city, *_ in read_ports_csv(path)
+        }
+        get_many = lambda batch: [mapping.get(code, "") for code in batch]  # noqa
+    else:
+        directory = PortDirectory.open(path)
+        mapping = directory
+        get_many = directory.get_many
+    result = {"open_ms": (time.perf_counter() - start) * 1000}
+    result["rss_open_mb"] = rss_delta(before)
+
+    singles = codes[:10000]
+    result["get_us"] = (
+        timed(lambda: [mapping.get(code) for code in singles], 3) / len(singles) * 1e6
+    )
+    result["get_many_ms"] = timed(lambda: get_many(codes), 5) * 1000
+    result["rss_lookups_mb"] = rss_delta(before)
+    batch = [f" {code.lower()} " for code in codes[:5000]]
+    if mode == "directory":
+        result["lookup_cities_ms"] = (
+            timed(lambda: lookup_cities(batch, directory), 5) * 1000
+        )
+        for name, query in (
+            ("search_prefix_us", "rotter"),
+            ("search_fuzzy_us", "roterdam"),
+            ("search_code_us", "NLRTM"),
+        ):
+            result[name] = timed(lambda: directory.search(query, 10), 200) * 1e6
+        result["codes_for_us"] = (
+            timed(lambda: directory.codes_for("Antwerp"), 200) * 1e6
+        )
+        result["rss_search_mb"] = rss_delta(before)
+        start = time.perf_counter()
+        directory.grid
+        result["grid_ms"] = (time.perf_counter() - start) * 1000
+        located = directory.rows(codes[:200]).tolist()
+        located = [row for row in located if row >= 0]
+        result["nearby_us"] = (
+            timed(lambda: [directory.nearby(row, 150, 20) for row in located], 5)
+            / len(located)
+            * 1e6
+        )
+
+        def brute_force(row):
+            distances = haversine_km(
+                directory.lat[row], directory.lon[row], directory.lat, directory.lon
+            )
+            return np.flatnonzero(distances <= 150)
+
+        result["nearby_scan_us"] = (
+            timed(lambda: [brute_force(row) for row in located], 5) / len(located) * 1e6
+        )
+        result["rss_nearby_mb"] = rss_delta(before)
+    print(json.dumps(result))
+
+
+def run_child(mode, path, codes_path):
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", mode, str(path), str(codes_path)],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--locations", type=int, default=120000)
+    parser.add_argument("--lookups", type=int, default=50000)
+    parser.add_argument("--child", nargs=3, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    pairs = synthetic_pairs(args.locations)
+    rng = random.Random(1)
+    population = sorted(pairs)
+    # Mostly known codes, some unknown
+    codes = [
+        rng.choice(population) if rng.random() < 0.9 else "ZZ" + str(i % 1000)
+        for i in range(args.lookups)
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = Path(tmp) / "ports.csv"
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(["code", "city", "lat", "lon"])
+            writer.writerows((code, *row) for code, row in pairs.items())
+        start = time.perf_counter()
+        compiled = Path(tmp) / "ports.locode"
+        PortDirectory.from_pairs((code, *row) for code, row in pairs.items()).save(
+            compiled
+        )
+        compile_s = time.perf_counter() - start
+        codes_path = Path(tmp) / "codes.json"
+        codes_path.write_text(json.dumps(codes))
+
+        print(
+            f"{len(pairs)} locations, compiled in {compile_s:.2f}s to "
+            f"{compiled.stat().st_size / 1e6:.1f} MB "
+            f"(CSV {csv_path.stat().st_size / 1e6:.1f} MB)"
+        )
+        for name, mode, path in (
+            ("dict from CSV", "dict", csv_path),
+            ("mmap directory", "directory", compiled),
+        ):
+            result = run_child(mode, path, codes_path)
+            print(
+                f"  {name:<15} open {result['open_ms']:6.1f} ms  "
+                f"get {result['get_us']:5.2f} us  "
+                f"{len(codes)} codes {result['get_many_ms']:6.1f} ms"
+            )
+            for stage in ("open", "lookups", "search", "nearby"):
+                if f"rss_{stage}_mb" in result:
+                    anon, file = result[f"rss_{stage}_mb"]
+                    print(
+                        f"  {'':<15} RSS after {stage:<8} "
+                        f"+{anon:5.1f} MB anonymous  +{file:5.1f} MB file-backed"
+                    )
+            if mode == "directory":
+                print(
+                    f"  {'':<15} lookup_cities(5000) {result['lookup_cities_ms']:.2f} ms  "
+                    f"search prefix {result['search_prefix_us']:.0f} us, "
+                    f"fuzzy {result['search_fuzzy_us']:.0f} us, "
+                    f"code {result['search_code_us']:.0f} us  "
+                    f"by city {result['codes_for_us']:.0f} us"
+                )
+                print(
+                    f"  {'':<15} nearby 150 km {result['nearby_us']:.0f} us "
+                    f"(full scan {result['nearby_scan_us']:.0f} us, "
+                    f"grid built in {result['grid_ms']:.0f} ms)"
+                )
+
+
+if __name__ == "__main__":
+    main()
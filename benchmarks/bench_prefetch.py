@@ -0,0 +1,105 @@
+"""
+Benchmark: share of /proxy-schedule calls served from cache, with and
+without popularity-driven prefetching.
+
+Runs the app in-process against benchmarks/fake_upstream.py with Zipf
+distributed traffic over many lanes and a short cache TTL. Without
+prefetching every hot lane pays the live fan-out once per TTL; with it,
+the hottest lanes are refreshed before they expire.
+
+Usage:
+    python benchmarks/bench_prefetch.py [--lanes 200] [--seconds 8] [--ttl 2]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("CMA_CGM_TOKEN", "benchmark")
+os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+
+import main as app_module  # noqa: E402
+from fake_upstream import FakeUpstream  # noqa: E402
+from prefetch import Prefetcher  # noqa: E402
+from upstream import create_client  # noqa: E402
+
+
+async def traffic(client, args, seed):
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** args.skew for rank in range(args.lanes)]
+    latencies, hits = [], 0
+    deadline = time.perf_counter() + args.seconds
+    while time.perf_counter() < deadline:
+        lane = rng.choices(range(args.lanes), weights)[0]
+        start = time.perf_counter()
+        response = await client.get(
+            "/proxy-schedule",
+            params={"placeOfLoading": f"L{lane:04d}", "placeOfDischarge": "BBBBB"},
+        )
+        latencies.append(time.perf_counter() - start)
+        hits += response.json()["metadata"]["cache"]["hit"]
+        await asyncio.sleep(rng.expovariate(args.rate / args.clients))
+    return latencies, hits
+
+
+async def run(args):
+    print(
+        f"{args.lanes} lanes, Zipf s={args.skew}, ~{args.rate:.0f} calls/s for "
+        f"{args.seconds:.0f}s, cache TTL {args.ttl}s"
+    )
+    for name, top_n in (("no prefetch", 0), (f"prefetch top {args.top}", args.top)):
+        fake = FakeUpstream(total_items=args.items, latency=args.latency)
+        app_module.http_client = create_client(
+            transport=httpx.MockTransport(fake.handler)
+        )
+        app_module.schedule_cache = type(app_module.schedule_cache)(
+            args.ttl, 64 << 20, namespace="schedules"
+        )
+        app_module.prefetcher = prefetcher = Prefetcher(
+            top_n=top_n, interval=args.ttl / 4, ahead=0.6, rate=0
+        )
+        task = asyncio.create_task(prefetcher.run()) if prefetcher.enabled else None
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://app"
+        ) as client:
+            results = await asyncio.gather(
+                *(traffic(client, args, seed) for seed in range(args.clients))
+            )
+        if task:
+            task.cancel()
+        latencies = [latency for result, _ in results for latency in result]
+        hits = sum(hit for _, hit in results)
+        latencies.sort()
+        print(
+            f"  {name:<16} {hits / len(latencies):6.1%} from cache  "
+            f"p50 {statistics.median(latencies) * 1000:5.1f} ms  "
+            f"p90 {latencies[int(len(latencies) * 0.9)] * 1000:5.1f} ms  "
+            f"{fake.requests} upstream requests"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lanes", type=int, default=200)
+    parser.add_argument("--skew", type=float, default=1.2)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=8)
+    parser.add_argument("--rate", type=float, default=100)
+    parser.add_argument("--clients", type=int, default=10)
+    parser.add_argument("--ttl", type=float, default=2)
+    parser.add_argument("--items", type=int, default=12)
+    parser.add_argument("--latency", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark: POST /proxy/batch against independent /proxy calls.
+
+Runs the app in-process against benchmarks/fake_upstream.py. The baseline
+fires one /proxy call per lane with the global scheduler switched off, as
+before it existed, so upstream concurrency grows with the number of lanes.
+The batch endpoint keeps it at UPSTREAM_MAX_IN_FLIGHT.
+
+Usage:
+    python benchmarks/bench_proxy_batch.py [--lanes 200] [--limit 20] [--latency 0.05]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("CMA_CGM_TOKEN", "benchmark")
+os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+os.environ.setdefault("QUOTE_CACHE_TTL", "0")
+
+EQUIPMENT = [{"numberOfContainers": 1, "equipmentGroupIsoCode": "40GP"}]
+
+
+def lane(i: int) -> dict:
+    return {
+        "portOfLoading": f"P{i:04d}",
+        "portOfDischarge": "BRSSZ",
+        "departureDate": "2025-11-15",
+        "requestedEquipments": EQUIPMENT,
+    }
+
+
+async def independent_calls(client, lanes):
+    async def one(payload):
+        params = {**payload, "requestedEquipments": json.dumps(EQUIPMENT)}
+        response = await client.get("/proxy", params={**params, "behalfOf": "BENCH"})
+        assert response.status_code == 200, response.text
+
+    await asyncio.gather(*(one(payload) for payload in lanes))
+
+
+async def batch_call(client, lanes):
+    response = await client.post(
+        "/proxy/batch", json={"behalfOf": "BENCH", "lanes": lanes}, timeout=None
+    )
+    assert response.status_code == 200, response.text
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    results, summary = lines[:-1], lines[-1]["metadata"]
+    assert summary["failed"] == 0, summary
+    assert sorted(line["index"] for line in results) == list(range(len(lanes)))
+    return results, summary
+
+
+async def run(args):
+    os.environ["UPSTREAM_MAX_IN_FLIGHT"] = str(args.limit)
+    import main as app_module
+    from fake_upstream import FakeUpstream
+    from upstream import create_client
+
+    lanes = [lane(i) for i in range(args.lanes)]
+    big = f"{lanes[0]['portOfLoading']}-{lanes[0]['portOfDischarge']}"
+    print(
+        f"{args.lanes} lanes of {args.items} items, one lane of {args.big_items}, "
+        f"{args.latency * 1000:.0f} ms per page, in-flight limit {args.limit}"
+    )
+
+    scenarios = (
+        ("unbounded", independent_calls, 10**9),
+        ("batch", batch_call, args.limit),
+    )
+    for name, scenario, limit in scenarios:
+        app_module.upstream_scheduler.limit = limit
+        fake = FakeUpstream(
+            total_items=args.items,
+            latency=args.latency,
+            lane_totals={big: args.big_items},
+        )
+        app_module.http_client = create_client(
+            transport=httpx.MockTransport(fake.handler)
+        )
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://app"
+        ) as client:
+            start = time.perf_counter()
+            await scenario(client, lanes)
+            elapsed = time.perf_counter() - start
+        await app_module.http_client.aclose()
+        print(
+            f"  {name:<12} {elapsed:6.2f}s  {fake.requests:5d} upstream requests  "
+            f"max in flight {fake.max_in_flight}"
+        )
+        if name == "batch":
+            assert fake.max_in_flight <= args.limit, fake.max_in_flight
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lanes", type=int, default=200)
+    parser.add_argument("--items", type=int, default=12)
+    parser.add_argument("--big-items", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
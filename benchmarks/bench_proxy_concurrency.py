@@ -0,0 +1,101 @@
+"""
+Benchmark: latency of a local endpoint while /proxy calls are in flight.
+
+Runs the app in-process against benchmarks/fake_upstream.py, so no network
+or CMA CGM token is needed. With the async upstream client, GET / latency
+should stay flat no matter how many proxy calls are waiting on upstream.
+Every call searches its own lane with the quote cache off, so none of them
+is coalesced with another or answered from cache.
+
+Usage:
+    python benchmarks/bench_proxy_concurrency.py [--proxies 50] [--latency 0.3]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("CMA_CGM_TOKEN", "benchmark")
+os.environ.setdefault("UPSTREAM_RATE_LIMIT", "0")
+os.environ["QUOTE_CACHE_TTL"] = "0"
+
+import main as app_module  # noqa: E402
+from fake_upstream import FakeUpstream  # noqa: E402
+from upstream import create_client  # noqa: E402
+
+
+def proxy_url(lane: int) -> str:
+    return (
+        f"/proxy?portOfLoading=ES{lane:03d}&portOfDischarge=BRSSZ"
+        "&departureDate=2025-11-15"
+        '&requestedEquipments=[{"numberOfContainers":1,"equipmentGroupIsoCode":"40GP"}]'
+        "&behalfOf=BENCH"
+    )
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, samples: list):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await client.get("/")
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+
+
+async def run(args):
+    fake = FakeUpstream(total_items=args.items, latency=args.latency)
+    app_module.http_client = create_client(transport=httpx.MockTransport(fake.handler))
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        idle = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, idle))
+        await asyncio.sleep(0.5)
+        stop.set()
+        await task
+
+        busy = []
+        stop = asyncio.Event()
+        task = asyncio.create_task(probe(client, stop, busy))
+        start = time.perf_counter()
+        responses = await asyncio.gather(
+            *(client.get(proxy_url(lane)) for lane in range(args.proxies))
+        )
+        proxy_time = time.perf_counter() - start
+        stop.set()
+        await task
+
+    assert all(r.status_code == 200 for r in responses), responses[0].text
+    # Each call must have paid its own upstream fan-out
+    assert all(not r.json()["metadata"]["cache"]["hit"] for r in responses)
+    assert fake.requests >= args.proxies, fake.requests
+    print(
+        f"{args.proxies} concurrent /proxy calls, {args.items} items each, "
+        f"{args.latency * 1000:.0f} ms upstream latency: done in {proxy_time:.2f}s "
+        f"({fake.requests} upstream requests)"
+    )
+    for name, samples in (("idle", idle), ("proxies in flight", busy)):
+        samples.sort()
+        p99 = samples[int(len(samples) * 0.99) - 1]
+        print(
+            f"  GET / {name:<18} p50 {statistics.median(samples):6.2f} ms  "
+            f"p99 {p99:6.2f} ms  ({len(samples)} samples)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--proxies", type=int, default=50)
+    parser.add_argument("--items", type=int, default=23)
+    parser.add_argument("--latency", type=float, default=0.3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
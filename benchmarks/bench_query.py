@@ -0,0 +1,84 @@
+"""
+Benchmark: /query threshold filters vs pulling every pair.
+
+Times GET /query in-process on a synthetic store, against the per-pair
+loop a client runs today (every pair through the /port-pairs/{port_pair}
+body, dates filtered in Python).
+
+Usage:
+    python benchmarks/bench_query.py [--pairs 150000] [--dates 52]
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main as app_module  # noqa: E402
+from bench_store import make_frame  # noqa: E402
+from store import AvailabilityStore  # noqa: E402
+
+QUERIES = (
+    ("any below 20, 4 weeks", {"op": "lt", "value": 20, "to": "2025-11-30"}),
+    ("any between 30-31", {"op": "between", "value": 30, "upper": 31}),
+    ("all above 5", {"op": "gt", "value": 5, "aggregate": "all"}),
+    (
+        "mean above 60, POL P1",
+        {"op": "gt", "value": 60, "aggregate": "mean", "origin": "P1"},
+    ),
+)
+
+
+def pair_loop(snapshot, threshold):
+    """Pairs with any date below threshold, pulled one at a time as clients do today"""
+    matches = []
+    for port_pair in snapshot.pairs:
+        cells = snapshot.series(port_pair).tolist()
+        if any(cell < threshold for cell in cells):
+            matches.append(port_pair)
+    return matches
+
+
+async def query_timings(params, repeat=5):
+    transport = httpx.ASGITransport(app=app_module.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = await client.get("/query", params=params)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.text
+    return min(timings) * 1000, response.json()["count"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pairs", type=int, default=150000)
+    parser.add_argument("--dates", type=int, default=52)
+    args = parser.parse_args()
+
+    snapshot = AvailabilityStore.from_frame(make_frame(args.pairs, args.dates))
+    app_module.store = snapshot
+    print(f"{args.pairs} port pairs x {args.dates} dates")
+
+    for name, params in QUERIES:
+        query_ms, count = asyncio.run(query_timings(params))
+        print(f"  {name:<24} /query   {query_ms:8.2f} ms  ({count} matches)")
+
+    query_ms, count = asyncio.run(query_timings({"op": "lt", "value": 20}))
+    start = time.perf_counter()
+    assert len(pair_loop(snapshot, 20)) == count
+    loop_ms = (time.perf_counter() - start) * 1000
+    print(
+        f"  {'any below 20, all dates':<24} /query   {query_ms:8.2f} ms  ({count} matches)"
+    )
+    print(f"  {'':<24} per pair {loop_ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark: top-K selection for /rankings vs sorting every pair.
+
+Usage:
+    python benchmarks/bench_rankings.py [--pairs 50000] [--dates 52] [--k 50]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bench_store import make_frame  # noqa: E402
+from store import AvailabilityStore, top_k  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pairs", type=int, default=50000)
+    parser.add_argument("--dates", type=int, default=52)
+    parser.add_argument("--k", type=int, default=50)
+    args = parser.parse_args()
+
+    store = AvailabilityStore.from_frame(make_frame(args.pairs, args.dates))
+    column = args.dates // 2
+
+    scores = store.values[:, column]
+
+    def full_sort():
+        order = np.argsort(-store.values[:, column], kind="stable")
+        return [store.pairs[row] for row in order[: args.k].tolist()]
+
+    def partial():
+        rows = top_k(store.values[:, column], args.k)
+        return [store.pairs[row] for row in rows.tolist()]
+
+    def window_partial():
+        block = store.values[:, : args.dates // 4]
+        return top_k(np.nanmean(block, axis=1), args.k)
+
+    # Ties may be broken differently, but the selected scores must agree
+    assert [scores[store.index[p]] for p in full_sort()] == [
+        scores[store.index[p]] for p in partial()
+    ]
+    print(f"{args.pairs} port pairs x {args.dates} dates, k={args.k}")
+    for name, fn in (
+        ("full sort", full_sort),
+        ("top_k", partial),
+        ("top_k over window", window_partial),
+    ):
+        elapsed = min(timeit.repeat(fn, number=20, repeat=3)) / 20
+        print(f"  {name:<18} {elapsed * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
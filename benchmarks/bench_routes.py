@@ -0,0 +1,127 @@
+"""
+Benchmark: /routes search over a large synthetic port pair graph.
+
+Builds a store whose lanes concentrate on hub ports (Zipf-weighted POLs
+and PODs), then times building the lane graph and answering random
+origin/destination queries with up to two hubs, against building a dict
+of lanes per query and walking it, as a handler without the prebuilt
+graph would.
+
+Usage:
+    python benchmarks/bench_routes.py [--ports 3000] [--pairs 150000] [--dates 52]
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from routes import find_routes  # noqa: E402
+from store import AvailabilityStore, row_means  # noqa: E402
+
+
+def make_store(n_ports, n_pairs, n_dates, skew, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = 1 / np.arange(1, n_ports + 1) ** skew
+    weights /= weights.sum()
+    pairs = set()
+    while len(pairs) < n_pairs:
+        pols = rng.choice(n_ports, n_pairs, p=weights)
+        pods = rng.choice(n_ports, n_pairs, p=weights)
+        pairs.update(
+            (pol, pod) for pol, pod in zip(pols.tolist(), pods.tolist()) if pol != pod
+        )
+    pairs = [f"P{pol:05d}-P{pod:05d}" for pol, pod in list(pairs)[:n_pairs]]
+    labels = [str(day) for day in np.arange(n_dates) * 7 + np.datetime64("2025-11-03")]
+    values = rng.uniform(0, 100, (len(pairs), n_dates)).astype(np.float32)
+    values[rng.random(values.shape) < 0.05] = np.nan
+    return AvailabilityStore(pairs, labels, values)
+
+
+def walk_routes(store, origin, destination, columns, limit):
+    """Route enumeration without the lane graph, for comparison"""
+    lanes = {}
+    for row, (pol, pod) in enumerate(zip(store.pols, store.pods)):
+        lanes.setdefault(pol, {}).setdefault(pod, row)
+    weights = row_means(store.values[:, columns])
+    found = []
+    for hub, first in lanes.get(origin, {}).items():
+        if hub == destination:
+            found.append((weights[first], [first]))
+            continue
+        for second_hub, second in lanes.get(hub, {}).items():
+            if second_hub == origin:
+                continue
+            if second_hub == destination:
+                found.append(
+                    (np.minimum(weights[first], weights[second]), [first, second])
+                )
+                continue
+            last = lanes.get(second_hub, {}).get(destination)
+            if last is not None:
+                legs = [first, second, last]
+                found.append((weights[legs].min(), legs))
+    found = [route for route in found if not np.isnan(route[0])]
+    found.sort(key=lambda route: (-route[0], len(route[1])))
+    return found[:limit]
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--ports", type=int, default=3000)
+    parser.add_argument("--pairs", type=int, default=150000)
+    parser.add_argument("--dates", type=int, default=52)
+    parser.add_argument("--skew", type=float, default=0.8)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--walks", type=int, default=5)
+    args = parser.parse_args()
+
+    store = make_store(args.ports, args.pairs, args.dates, args.skew)
+    start = time.perf_counter()
+    graph = store.graph
+    build_ms = (time.perf_counter() - start) * 1000
+    degrees = np.diff(graph.out_offsets)
+    print(
+        f"{len(graph.ports)} ports, {len(graph)} lanes x {args.dates} dates "
+        f"(max out-degree {degrees.max()}, median {int(np.median(degrees))}); "
+        f"lane graph built in {build_ms:.0f} ms"
+    )
+
+    rng = random.Random(1)
+    queries = [tuple(rng.sample(graph.ports, 2)) for _ in range(args.queries)]
+    for name, columns in (("one date", slice(10, 11)), ("13-week mean", slice(0, 13))):
+        timings, found = [], 0
+        for origin, destination in queries:
+            start = time.perf_counter()
+            routes = find_routes(store, origin, destination, columns, 2, 10)
+            timings.append(time.perf_counter() - start)
+            found += bool(routes)
+        walk_timings = []
+        for origin, destination in queries[: args.walks]:
+            start = time.perf_counter()
+            walked = walk_routes(store, origin, destination, columns, 10)
+            walk_timings.append(time.perf_counter() - start)
+            routes = find_routes(store, origin, destination, columns, 2, 10)
+            assert np.allclose(
+                [route.availability for route in routes], [w for w, _ in walked]
+            )
+        print(
+            f"  {name:<13} lane graph p50 {percentile(timings, 50) * 1000:6.2f} ms  "
+            f"p99 {percentile(timings, 99) * 1000:6.2f} ms  "
+            f"({found}/{len(queries)} with routes)  "
+            f"dict walk {np.mean(walk_timings) * 1000:8.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark: /search linear scan vs the POL/POD prefix index.
+
+Usage:
+    python benchmarks/bench_search.py [--sizes 1000,10000,50000] [--queries 200]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from store import AvailabilityStore  # noqa: E402
+
+
+def make_store(n_pairs: int) -> AvailabilityStore:
+    rng = np.random.default_rng(42)
+    letters = np.array(list("ABCDEFGHIJKLMNOPQRSTUVWXYZ"))
+    codes = ["".join(rng.choice(letters, 5)) for _ in range(max(50, n_pairs // 20))]
+    pairs = set()
+    while len(pairs) < n_pairs:
+        a, b = rng.choice(len(codes), 2, replace=False)
+        pairs.add(f"{codes[a]}-{codes[b]}")
+    return AvailabilityStore(
+        sorted(pairs), ["2025-11-03"], np.zeros((n_pairs, 1), dtype=np.float32)
+    )
+
+
+def linear_search(pairs, origin, destination):
+    """The previous search_port_pairs implementation"""
+    filtered_pairs = []
+    for pair in pairs:
+        parts = pair.split("-")
+        if len(parts) >= 2:
+            pol = parts[0].strip()
+            pod = "-".join(parts[1:]).strip()
+            match = True
+            if origin and not pol.upper().startswith(origin.upper()):
+                match = False
+            if destination and not pod.upper().startswith(destination.upper()):
+                match = False
+            if match:
+                filtered_pairs.append(pair)
+    return filtered_pairs
+
+
+def indexed_search(store, origin, destination):
+    return [store.pairs[row] for row in store.search(origin, destination).tolist()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,50000")
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'pairs':>8} {'linear µs':>12} {'indexed µs':>12} {'speedup':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        store = make_store(size)
+        rng = np.random.default_rng(7)
+        queries = []
+        for _ in range(args.queries):
+            pol, pod = store.pairs[rng.integers(len(store))].split("-")
+            queries.append(
+                (pol[:3], None) if rng.random() < 0.5 else (pol[:2], pod[:2])
+            )
+        assert all(
+            linear_search(store.pairs, o, d) == indexed_search(store, o, d)
+            for o, d in queries[:20]
+        )
+        timings = [
+            min(
+                timeit.repeat(
+                    lambda: [fn(target, o, d) for o, d in queries], number=1, repeat=3
+                )
+            )
+            / args.queries
+            * 1e6
+            for fn, target in ((linear_search, store.pairs), (indexed_search, store))
+        ]
+        print(
+            f"{size:>8} {timings[0]:>12.1f} {timings[1]:>12.1f} "
+            f"{timings[0] / timings[1]:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Microbenchmark: per-lookup cost of the old df.loc path vs AvailabilityStore.
+
+Usage:
+    python benchmarks/bench_store.py [--pairs 20000] [--dates 52] [--lookups 2000]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from store import AvailabilityStore, to_json_values  # noqa: E402
+
+
+def make_frame(n_pairs: int, n_dates: int) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    pairs = [f"P{i:05d}-D{i * 7 % 99991:05d}" for i in range(n_pairs)]
+    dates = pd.date_range("2025-11-03", periods=n_dates, freq="W-MON")
+    values = np.round(rng.uniform(0, 100, size=(n_pairs, n_dates)), 2)
+    return pd.DataFrame(
+        values,
+        index=pd.Index(pairs, name="POL-POD Booked"),
+        columns=dates.strftime("%Y-%m-%d"),
+    )
+
+
+def df_loc_lookup(df: pd.DataFrame, port_pair: str) -> list:
+    """The previous get_port_pair_data implementation"""
+    data = df.loc[port_pair]
+    data_array = []
+    for date in data.index:
+        data_array.append({date: data[date]})
+    return data_array
+
+
+def store_lookup(store: AvailabilityStore, port_pair: str) -> list:
+    row = store.row(port_pair)
+    values = to_json_values(store.values[row])
+    return [{date: value} for date, value in zip(store.date_labels, values)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--pairs", type=int, default=20000)
+    parser.add_argument("--dates", type=int, default=52)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    df = make_frame(args.pairs, args.dates)
+    store = AvailabilityStore.from_frame(df)
+    keys = np.random.default_rng(7).choice(df.index.to_numpy(), size=args.lookups)
+
+    print(f"{args.pairs} port pairs x {args.dates} dates, {args.lookups} lookups")
+    for name, fn, target in (
+        ("df.loc", df_loc_lookup, df),
+        ("store", store_lookup, store),
+    ):
+        elapsed = min(
+            timeit.repeat(lambda: [fn(target, k) for k in keys], number=1, repeat=3)
+        )
+        per_lookup = elapsed / args.lookups * 1e6
+        print(f"  {name:<8} {per_lookup:10.1f} µs/lookup")
+        if name == "df.loc":
+            baseline = per_lookup
+    print(f"  speedup  {baseline / per_lookup:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
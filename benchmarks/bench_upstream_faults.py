@@ -0,0 +1,152 @@
+"""
+Benchmark: upstream governor under injected 429/5xx failures.
+
+Drives upstream.Paginator through an UpstreamGovernor against
+benchmarks/fake_upstream.py with growing error rates: failed pages are
+retried on their own, and a lane either returns each item exactly once or
+fails with the upstream status once a page has used up its retries.
+Reports the measured share of complete lanes next to the share expected
+from the retry budget, (1 - rate^(retries + 1))^pages.
+Then simulates an outage to show the circuit opening, failing fast, and
+closing again once the upstream recovers.
+
+Usage:
+    python benchmarks/bench_upstream_faults.py [--lanes 20] [--items 40]
+"""
+
+import argparse
+import asyncio
+import math
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+from upstream import (  # noqa: E402
+    UPSTREAM_PAGE_SIZE,
+    LaneHistory,
+    Paginator,
+    UpstreamGovernor,
+    UpstreamUnavailable,
+    create_client,
+)
+
+URL = "https://fake.cma-cgm.test/routings"
+
+
+def paginator(client, governor, lane):
+    async def send(range_header):
+        response = await governor.send(
+            URL,
+            lambda: client.get(
+                URL,
+                params={"placeOfLoading": lane, "placeOfDischarge": "BBBBB"},
+                headers={"Range": range_header},
+            ),
+        )
+        response.raise_for_status()
+        return response
+
+    return Paginator(send, lane, history=LaneHistory(), scheduler=None)
+
+
+async def sweep(client, governor, fake, lanes):
+    """Fetch every lane; returns (completed lanes, errors)"""
+    outcomes = await asyncio.gather(
+        *(paginator(client, governor, f"L{i:04d}").fetch_all() for i in range(lanes)),
+        return_exceptions=True,
+    )
+    completed = 0
+    errors = []
+    for outcome in outcomes:
+        if isinstance(outcome, httpx.HTTPStatusError):
+            errors.append(f"HTTP {outcome.response.status_code}")
+        elif isinstance(outcome, BaseException):
+            errors.append(type(outcome).__name__)
+        else:
+            assert [item["item"] for item in outcome] == list(range(fake.total_items))
+            completed += 1
+    return completed, errors
+
+
+async def run(args):
+    print(f"{args.lanes} lanes of {args.items} items, {args.latency * 1000:.0f} ms")
+    for error_rate in (0.0, 0.1, 0.3):
+        fake = FakeUpstream(
+            total_items=args.items,
+            latency=args.latency,
+            error_rate=error_rate,
+            retry_after=0.05,
+        )
+        governor = UpstreamGovernor(
+            rate=args.rate, burst=args.rate, backoff_base=0.05, backoff_max=1, seed=0
+        )
+        async with create_client(transport=httpx.MockTransport(fake.handler)) as client:
+            start = time.perf_counter()
+            completed, errors = await sweep(client, governor, fake, args.lanes)
+            elapsed = time.perf_counter() - start
+        pages = math.ceil(args.items / UPSTREAM_PAGE_SIZE)
+        expected = (1 - error_rate ** (governor.max_retries + 1)) ** pages
+        print(
+            f"  error rate {error_rate:4.0%}: {completed}/{args.lanes} lanes complete "
+            f"({completed / args.lanes:.0%}, expected {expected:.0%} with "
+            f"{governor.max_retries} retries per page) in {elapsed:5.2f}s, "
+            f"{fake.requests} requests, {fake.errors} injected errors, "
+            f"{governor.retries} retries"
+            + (f", failed: {', '.join(sorted(set(errors)))}" if errors else "")
+        )
+        # Lanes only fail on an injected status that outlasted the retries
+        injected = {f"HTTP {status}" for status in fake.error_statuses}
+        assert set(errors) <= injected, errors
+        if not error_rate:
+            assert completed == args.lanes
+
+    # Outage: every request fails until the upstream recovers
+    fake = FakeUpstream(
+        total_items=args.items,
+        latency=args.latency,
+        error_rate=1.0,
+        error_statuses=(503,),
+    )
+    governor = UpstreamGovernor(
+        rate=0, backoff_base=0.05, breaker_threshold=5, breaker_reset=0.5, seed=0
+    )
+    async with create_client(transport=httpx.MockTransport(fake.handler)) as client:
+        start = time.perf_counter()
+        completed, errors = await sweep(client, governor, fake, args.lanes)
+        elapsed = time.perf_counter() - start
+        print(
+            f"  outage: {completed} lanes complete, {fake.requests} upstream requests "
+            f"for {args.lanes} lanes, {errors.count('UpstreamUnavailable')} failed "
+            f"fast, circuit {governor.breakers['fake.cma-cgm.test'].state} "
+            f"after {elapsed:.2f}s"
+        )
+        try:
+            await paginator(client, governor, "PROBE").fetch_all()
+        except UpstreamUnavailable as e:
+            print(f"  while open: {e}")
+
+        fake.error_rate = 0.0
+        await asyncio.sleep(0.6)
+        completed, errors = await sweep(client, governor, fake, args.lanes)
+        print(
+            f"  recovered: {completed}/{args.lanes} lanes complete, circuit "
+            f"{governor.breakers['fake.cma-cgm.test'].state}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lanes", type=int, default=20)
+    parser.add_argument("--items", type=int, default=40)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--rate", type=float, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+In-process fake of the CMA CGM APIs for benchmarks.
+
+Emulates the Range pagination of the SpotOn and Route APIs: a request for
+'Range: a-b' gets items a..b, status 206 with 'content-range: a-b/total'
+while more items remain, 200 otherwise. Plug it into the app with
+create_client(transport=httpx.MockTransport(fake.handler)).
+
+A tail_rate share of requests takes tail_latency instead of the usual
+latency, to emulate slow outliers. Faults can be injected: with error_rate > 0 that share of requests fails
+with one of error_statuses (429s carry Retry-After when retry_after is set).
+"""
+
+import asyncio
+import json
+import random
+import re
+from typing import Dict, Optional, Sequence
+
+import httpx
+
+
+class FakeUpstream:
+    def __init__(
+        self,
+        total_items: int = 23,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        lane_totals: Optional[Dict[str, int]] = None,
+        seed: int = 0,
+        error_rate: float = 0.0,
+        error_statuses: Sequence[int] = (429, 503),
+        retry_after: Optional[float] = None,
+        tail_rate: float = 0.0,
+        tail_latency: float = 1.0,
+    ):
+        self.total_items = total_items
+        self.latency = latency
+        self.jitter = jitter
+        self.lane_totals = lane_totals or {}
+        self.random = random.Random(seed)
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.errors = 0
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def lane_of(self, request: httpx.Request) -> str:
+        if request.method == "POST":
+            payload = json.loads(request.content or b"{}")
+            return f"{payload.get('portOfLoading')}-{payload.get('portOfDischarge')}"
+        params = request.url.params
+        return f"{params.get('placeOfLoading')}-{params.get('placeOfDischarge')}"
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            if self.tail_rate and self.random.random() < self.tail_rate:
+                delay = self.tail_latency
+            await asyncio.sleep(delay)
+            if self.error_rate and self.random.random() < self.error_rate:
+                return self.fault()
+            return self.page(request)
+        finally:
+            self.in_flight -= 1
+
+    def fault(self) -> httpx.Response:
+        self.errors += 1
+        status = self.random.choice(self.error_statuses)
+        headers = {}
+        if status == 429 and self.retry_after is not None:
+            headers["retry-after"] = str(self.retry_after)
+        return httpx.Response(status, json={"error": "injected"}, headers=headers)
+
+    def page(self, request: httpx.Request) -> httpx.Response:
+        lane = self.lane_of(request)
+        total = self.lane_totals.get(lane, self.total_items)
+        match = re.fullmatch(r"(\d+)-(\d+)", request.headers.get("range", ""))
+        start, end = (int(match[1]), int(match[2])) if match else (0, total - 1)
+        if total == 0 or start >= total:
+            return httpx.Response(416 if total else 204, json=[])
+        end = min(end, total - 1)
+        items = [{"lane": lane, "item": i} for i in range(start, end + 1)]
+        status = 206 if end < total - 1 or start > 0 else 200
+        return httpx.Response(
+            status,
+            json=items,
+            headers={
+                "content-range": f"{start}-{end}/{total}",
+                "cma-func-explain": "fake upstream",
+            },
+        )
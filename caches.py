@@ -0,0 +1,448 @@
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+)
+
+
+class LRUCache:
+    """Small bounded least-recently-used mapping"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        if self.maxsize <= 0:
+            return
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+def strong_etag(body: bytes) -> str:
+    """Strong entity tag derived from the exact response bytes"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against an entity tag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # If-None-Match uses weak comparison
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def json_size(value: Any) -> int:
+    """Approximate memory cost of a JSON-like value: its encoded length"""
+    return len(json.dumps(value, separators=(",", ":"), default=str))
+
+
+class DiskCache:
+    """
+    SQLite file holding cached JSON values across restarts.
+
+    Values are grouped by namespace and keyed by string. Each row records
+    when the value was fetched and when it expires; expired rows are purged
+    and, past `max_bytes`, the oldest rows are evicted. Calls block on disk
+    I/O, so async code runs them in a thread (see SingleFlightCache).
+    """
+
+    PURGE_EVERY = 100  # writes between sweeps for expired rows
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL,"
+            " stored_at REAL NOT NULL, expires_at REAL NOT NULL,"
+            " size INTEGER NOT NULL, PRIMARY KEY (namespace, key))"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at)"
+        )
+        self._db.commit()
+        self.writes = 0
+        self.purge()
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[Any, float]]:
+        """(value, stored_at) for key if it has not expired"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value, stored_at FROM entries"
+                " WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(
+        self, namespace: str, key: str, value: Any, stored_at: float, expires_at: float
+    ) -> None:
+        encoded = json.dumps(value, separators=(",", ":"), default=str)
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                (namespace, key, encoded, stored_at, expires_at, len(encoded)),
+            )
+            self._db.commit()
+            self.writes += 1
+        if self.writes % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def load(self, namespace: str) -> List[Tuple[str, Any, float]]:
+        """Unexpired (key, value, stored_at) rows of a namespace, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, value, stored_at FROM entries"
+                " WHERE namespace = ? AND expires_at > ? ORDER BY stored_at",
+                (namespace, time.time()),
+            ).fetchall()
+        return [(key, json.loads(value), stored_at) for key, value, stored_at in rows]
+
+    def purge(self) -> None:
+        """Drop expired rows, then the oldest rows while over max_bytes"""
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM entries WHERE expires_at <= ?", (time.time(),)
+            )
+            total = self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                cursor = self._db.execute(
+                    "SELECT namespace, key, size FROM entries ORDER BY stored_at"
+                )
+                doomed = []
+                for namespace, key, size in cursor:
+                    if excess <= 0:
+                        break
+                    doomed.append((namespace, key))
+                    excess -= size
+                self._db.executemany(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?", doomed
+                )
+            self._db.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"path": self.path, "entries": count, "bytes": total}
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    stored_at: float  # time.time() when the value was fetched
+    size: int
+
+
+class SingleFlightCache:
+    """
+    In-process TTL cache bounded by approximate size in bytes.
+
+    get_or_fetch() coalesces concurrent misses on the same key into one
+    in-flight fetch: the first caller starts it and every other caller awaits
+    the same task. The fetch is shielded, so a caller that disconnects does
+    not cancel it for the others. Failures are not cached.
+
+    With a stale window, an entry older than the TTL but within ttl + stale
+    is still served at once while a single background fetch refreshes it
+    (stale-while-revalidate). A failed refresh leaves the stale entry.
+
+    With a DiskCache (string keys only), stored values are also written to
+    disk under `namespace` in a background thread, misses check the disk
+    before fetching (a stale disk entry is served and refreshed like a
+    stale one in memory), and warm() reloads memory from disk after a
+    restart.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        max_bytes: int,
+        sizeof: Callable[[Any], int] = json_size,
+        stale: float = 0.0,
+        disk: Optional[DiskCache] = None,
+        namespace: str = "",
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.stale = max(0.0, stale)
+        self.total_bytes = 0
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refresh_failures = 0
+        self.disk = disk
+        self.namespace = namespace
+        self.disk_hits = 0
+        self._disk_writes: Set[asyncio.Future] = set()
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_bytes > 0
+
+    def age(self, key: Hashable) -> Optional[float]:
+        """Seconds since key's value was fetched, None if it is not cached"""
+        entry = self._entries.get(key)
+        return None if entry is None else time.time() - entry.stored_at
+
+    def get_entry(self, key: Hashable, max_age: Optional[float] = None):
+        """Entry for key if younger than max_age (default: the TTL)"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry.stored_at > (self.ttl if max_age is None else max_age):
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def put(
+        self,
+        key: Hashable,
+        value: Any,
+        stored_at: Optional[float] = None,
+        persist: bool = True,
+    ):
+        if not self.enabled:
+            return
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        self.discard(key)
+        entry = CacheEntry(value, time.time() if stored_at is None else stored_at, size)
+        self._entries[key] = entry
+        self.total_bytes += size
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+        if persist and self.disk is not None:
+            self._persist(key, entry)
+
+    def _persist(self, key: Hashable, entry: CacheEntry) -> None:
+        """Write an entry to disk in a thread, without waiting for it"""
+        try:
+            write = asyncio.ensure_future(
+                asyncio.to_thread(
+                    self.disk.put,
+                    self.namespace,
+                    key,
+                    entry.value,
+                    entry.stored_at,
+                    entry.stored_at + self.ttl + self.stale,
+                )
+            )
+        except RuntimeError:  # no running event loop
+            return
+
+        def done(task: asyncio.Future) -> None:
+            self._disk_writes.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                print(f"✗ Disk cache write failed: {task.exception()}")
+
+        self._disk_writes.add(write)
+        write.add_done_callback(done)
+
+    async def flush(self) -> None:
+        """Wait for pending disk writes"""
+        if self._disk_writes:
+            await asyncio.gather(*self._disk_writes, return_exceptions=True)
+
+    async def warm(self) -> int:
+        """Load unexpired entries from disk; returns how many were loaded"""
+        if self.disk is None or not self.enabled:
+            return 0
+        rows = await asyncio.to_thread(self.disk.load, self.namespace)
+        loaded = 0
+        for key, value, stored_at in rows:
+            current = self._entries.get(key)
+            if current is not None and current.stored_at >= stored_at:
+                continue
+            self.put(key, value, stored_at, persist=False)
+            loaded += 1
+        return loaded
+
+    def discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry.size
+
+    def fetch_once(self, key: Hashable, fetch: Callable[[], Awaitable]) -> asyncio.Task:
+        """
+        The in-flight fetch for key, starting one if none is running.
+
+        The task resolves to (value, stored_at), the time the value was fetched.
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return task
+
+        async def run():
+            stale = False
+            try:
+                if self.disk is not None and key not in self._entries:
+                    stored = await asyncio.to_thread(self.disk.get, self.namespace, key)
+                    age = None if stored is None else time.time() - stored[1]
+                    if age is not None and age <= self.ttl + self.stale:
+                        self.put(key, stored[0], stored[1], persist=False)
+                        # Serve a stale value only if memory kept it, so the
+                        # refresh below goes upstream instead of back to disk
+                        if age <= self.ttl or key in self._entries:
+                            self.disk_hits += 1
+                            stale = age > self.ttl
+                            return stored
+                value = await fetch()
+                stored_at = time.time()
+                self.put(key, value, stored_at)
+                return value, stored_at
+            finally:
+                self._in_flight.pop(key, None)
+                if stale:
+                    # Served stale from disk: revalidate as lookup() does
+                    self.stale_hits += 1
+                    self.refresh(key, fetch)
+
+        task = asyncio.ensure_future(run())
+        self._in_flight[key] = task
+        return task
+
+    def refresh(self, key: Hashable, fetch: Callable[[], Awaitable]) -> bool:
+        """Refetch key in the background unless a fetch is already running"""
+        if key in self._in_flight:
+            return False
+
+        def done(task: asyncio.Task) -> None:
+            if not task.cancelled() and task.exception() is not None:
+                self.refresh_failures += 1
+                print(f"✗ Background refresh failed: {task.exception()}")
+
+        self.fetch_once(key, fetch).add_done_callback(done)
+        return True
+
+    def lookup(
+        self, key: Hashable, fetch: Callable[[], Awaitable]
+    ) -> Optional[Tuple[Any, Dict]]:
+        """
+        Cached (value, info) for key, or None on a miss.
+
+        A stale entry is returned as is and refreshed in the background.
+        """
+        entry = self.get_entry(key, max_age=self.ttl + self.stale)
+        if entry is None:
+            return None
+        if time.time() - entry.stored_at <= self.ttl:
+            self.hits += 1
+            return entry.value, cache_info(
+                True, entry.stored_at, coalesced=False, stale=False
+            )
+        self.stale_hits += 1
+        self.refresh(key, fetch)
+        return entry.value, cache_info(
+            True, entry.stored_at, coalesced=False, stale=True
+        )
+
+    async def get_or_fetch(
+        self, key: Hashable, fetch: Callable[[], Awaitable]
+    ) -> Tuple[Any, Dict]:
+        """
+        Cached value for key, fetching it on a miss.
+
+        Returns (value, info) where info reports the hit, whether the value
+        is stale, whether the caller shared another caller's fetch, and the
+        age of the value in seconds.
+        """
+        cached = self.lookup(key, fetch)
+        if cached is not None:
+            return cached
+
+        self.misses += 1
+        shared = key in self._in_flight
+        started = time.time()
+        # A value read back from disk keeps its original fetch time
+        value, stored_at = await asyncio.shield(self.fetch_once(key, fetch))
+        return value, cache_info(
+            stored_at < started,
+            stored_at,
+            coalesced=shared,
+            stale=time.time() - stored_at > self.ttl,
+        )
+
+    def stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "refresh_failures": self.refresh_failures,
+            "disk_hits": self.disk_hits,
+        }
+
+
+def cache_info(hit: bool, stored_at: float, **extra) -> Dict:
+    """Cache details reported in proxy response metadata"""
+    return {
+        "hit": hit,
+        "age_seconds": round(max(0.0, time.time() - stored_at), 3),
+        **extra,
+    }
@@ -0,0 +1,118 @@
+"""
+Compile the port directory into a memory-mappable binary file.
+
+Reads the curated code,city CSV and, optionally, the UN/LOCODE code list
+CSVs published by UNECE (e.g. "2024-2 UNLOCODE CodeListPart1.csv" ...
+Part3). Curated names win over UN/LOCODE names for the same code, and
+UN/LOCODE coordinates are kept unless the CSV has its own. The API
+prefers the compiled file over the CSV whenever it is at least as new.
+
+Usage:
+    python compile_ports.py
+    python compile_ports.py --unlocode CodeListPart1.csv CodeListPart2.csv CodeListPart3.csv
+"""
+
+import argparse
+import csv
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from ports import PORTS_PATH, PortDirectory, compiled_path_for, read_ports_csv
+
+# UN/LOCODE code list columns: Change, Country, Location, Name, NameWoDiacritics,
+# Subdivision, Status, Function, Date, IATA, Coordinates, Remarks
+UNLOCODE_CHANGE, UNLOCODE_COUNTRY, UNLOCODE_LOCATION, UNLOCODE_NAME = 0, 1, 2, 3
+UNLOCODE_COORDINATES = 10
+
+# Degrees and minutes, e.g. "5155N 00430E"
+COORDINATES_PATTERN = re.compile(r"^(\d{2})(\d{2})([NS])\s+(\d{3})(\d{2})([EW])$")
+
+
+def parse_coordinates(value: str) -> Optional[Tuple[float, float]]:
+    """UN/LOCODE coordinates as decimal (lat, lon), or None if absent or malformed"""
+    match = COORDINATES_PATTERN.match(value.strip())
+    if not match:
+        return None
+    lat_deg, lat_min, north_south, lon_deg, lon_min, east_west = match.groups()
+    lat = int(lat_deg) + int(lat_min) / 60
+    lon = int(lon_deg) + int(lon_min) / 60
+    if lat > 90 or lon > 180:
+        return None
+    return (
+        -lat if north_south == "S" else lat,
+        -lon if east_west == "W" else lon,
+    )
+
+
+def read_unlocode(path: Path) -> Iterator[Tuple]:
+    """
+    (code, name[, lat, lon]) of every location in a UN/LOCODE code list CSV.
+
+    Country header rows (no location) and entries marked for removal
+    ('X' in the change column) are skipped.
+    """
+    try:
+        text = path.read_text(encoding="utf-8")
+    except UnicodeDecodeError:
+        # Releases before 2023 are published in ISO 8859-1
+        text = path.read_text(encoding="latin-1")
+    for row in csv.reader(text.splitlines()):
+        if len(row) <= UNLOCODE_NAME or not row[UNLOCODE_LOCATION].strip():
+            continue
+        if row[UNLOCODE_CHANGE].strip() == "X":
+            continue
+        code = row[UNLOCODE_COUNTRY].strip() + row[UNLOCODE_LOCATION].strip()
+        position = None
+        if len(row) > UNLOCODE_COORDINATES:
+            position = parse_coordinates(row[UNLOCODE_COORDINATES])
+        yield (code, row[UNLOCODE_NAME], *(position or ()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the port directory into a binary file"
+    )
+    parser.add_argument(
+        "--csv", type=Path, default=PORTS_PATH, help="Curated code,city CSV"
+    )
+    parser.add_argument(
+        "--unlocode",
+        type=Path,
+        nargs="*",
+        default=[],
+        help="UN/LOCODE code list CSVs to include",
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="File to write (default: next to the CSV, .locode suffix)",
+    )
+    args = parser.parse_args()
+    output = args.output or compiled_path_for(args.csv)
+
+    for path in [args.csv, *args.unlocode]:
+        if not path.exists():
+            print(f"✗ File not found at {path}")
+            sys.exit(1)
+
+    start_time = time.perf_counter()
+    pairs = []
+    for path in args.unlocode:
+        pairs.extend(read_unlocode(path))
+    pairs.extend(read_ports_csv(args.csv))
+    directory = PortDirectory.from_pairs(pairs)
+    directory.save(output)
+
+    print(
+        f"✓ Compiled {len(directory)} locations "
+        f"({len(directory.grid)} with coordinates) to {output} "
+        f"({output.stat().st_size / 1e6:.1f} MB, {time.perf_counter() - start_time:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
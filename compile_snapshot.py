@@ -0,0 +1,55 @@
+"""
+Compile the Qlik Sense CSV export into a memory-mappable binary snapshot.
+
+The API prefers the snapshot over the CSV whenever the snapshot is at least
+as new, so startup memory-maps the values matrix instead of parsing the CSV.
+
+Usage:
+    python compile_snapshot.py
+    python compile_snapshot.py --csv path/to/export.csv --output path/to/export.snapshot
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from store import AvailabilityStore, snapshot_path_for
+
+DEFAULT_CSV_PATH = Path(__file__).resolve().parent / "Qlik Sense Port Pairs SpotOn.csv"
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compile the port pairs CSV into a binary snapshot"
+    )
+    parser.add_argument(
+        "--csv", type=Path, default=DEFAULT_CSV_PATH, help="CSV export to compile"
+    )
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=None,
+        help="Snapshot file to write (default: next to the CSV, .snapshot suffix)",
+    )
+    args = parser.parse_args()
+    output = args.output or snapshot_path_for(args.csv)
+
+    if not args.csv.exists():
+        print(f"✗ CSV file not found at {args.csv}")
+        sys.exit(1)
+
+    start_time = time.perf_counter()
+    store = AvailabilityStore.from_csv(args.csv)
+    parse_time = time.perf_counter() - start_time
+    store.save_snapshot(output)
+    total_time = time.perf_counter() - start_time
+
+    print(
+        f"✓ Compiled {len(store)} port pairs x {len(store.date_labels)} dates "
+        f"to {output} (parse {parse_time:.2f}s, total {total_time:.2f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
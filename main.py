@@ -1,12 +1,58 @@
-from fastapi import FastAPI, HTTPException, Query
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-import pandas as pd
+from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+import asyncio
+import hashlib
+import hmac
+import numpy as np
 import os
 import json
-import requests
+import time
+import httpx
+from datetime import date, timedelta
+from enum import Enum
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from caches import (
+    DiskCache,
+    SingleFlightCache,
+    cache_info,
+    etag_matches,
+    strong_etag,
+)
+from offers import merge_offers
+from ports import (
+    PortDirectory,
+    lookup_cities,
+    normalize_code,
+    parse_ports_param,
+    port_directory,
+    unknown_codes,
+)
+from prefetch import prefetcher
+from routes import find_routes
+from store import (
+    AvailabilityStore,
+    row_means,
+    snapshot_path_for,
+    split_pair,
+    threshold_mask,
+    to_json_values,
+    top_k,
+)
+from upstream import (
+    ROUTINGS_URL,
+    SPOTON_SEARCH_URL,
+    Paginator,
+    UpstreamUnavailable,
+    create_client,
+    page_hedger,
+    upstream_governor,
+    upstream_scheduler,
+)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -24,760 +70,449 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global variable to store the dataframe
-df = None
-
-# Port code to city name mapping (UN/LOCODE standard)
-# Expanded from UN/LOCODE 2024-2 database with 511 port locations worldwide
-# All port codes are without spaces as per standard usage
-PORT_TO_CITY = {
-    # United Arab Emirates
-    "AEAJM": "Ajman",
-    "AEAUH": "Abu Dhabi",
-    "AEDXB": "Dubai",
-    "AEFUJ": "Fujairah",
-    "AEJEA": "Jebel Ali",
-    "AEKHL": "Khalifa Port",
-    "AESHJ": "Sharjah",
-    # Angola
-    "AOLAD": "Luanda",
-    "AOLOB": "Lobito",
-    # Argentina
-    "ARBHI": "Bahia Blanca",
-    "ARBUE": "Buenos Aires",
-    "ARROS": "Rosario",
-    "ARZAE": "Zarate",
-    # Australia
-    "AUADL": "Adelaide",
-    "AUBNE": "Brisbane",
-    "AUDPO": "Darwin",
-    "AUFRE": "Fremantle",
-    "AUMEL": "Melbourne",
-    "AUNCL": "Newcastle",
-    "AUPER": "Perth",
-    "AUPTL": "Port Lincoln",
-    "AUSYD": "Sydney",
-    "AUTOW": "Townsville",
-    # Aruba
-    "AWAUA": "Aruba",
-    # Barbados
-    "BBBGI": "Bridgetown",
-    # Bangladesh
-    "BDCGP": "Chittagong",
-    "BDDAC": "Dhaka",
-    # Belgium
-    "BEANR": "Antwerp",
-    "BEBRU": "Brussels",
-    "BEOST": "Oostende",
-    "BEZEE": "Zeebrugge",
-    # Bahrain
-    "BHBAH": "Bahrain",
-    "BHKBS": "Khalifa Bin Salman",
-    # Benin
-    "BJCOO": "Cotonou",
-    # Bermuda
-    "BMBDA": "Bermuda",
-    # Bolivia
-    "BOLVB": "La Paz",
-    # Brazil
-    "BRBEL": "Belem",
-    "BRFOR": "Fortaleza",
-    "BRGRU": "Guaruja",
-    "BRIGU": "Iguassu",
-    "BRITJ": "Itajai",
-    "BRMAO": "Manaus",
-    "BRPNG": "Paranagua",
-    "BRREC": "Recife",
-    "BRRIO": "Rio de Janeiro",
-    "BRSFS": "Sao Francisco do Sul",
-    "BRSJP": "Sao Jose dos Pinhais",
-    "BRSSA": "Salvador",
-    "BRSSZ": "Santos",
-    "BRSUA": "Suape",
-    "BRVDC": "Vitoria",
-    # Bahamas
-    "BSFPO": "Freeport",
-    "BSNAS": "Nassau",
-    # Canada
-    "CAHAL": "Halifax",
-    "CAMTR": "Montreal",
-    "CAPRI": "Prince Rupert",
-    "CAQBC": "Quebec",
-    "CASJS": "Saint John",
-    "CATOR": "Toronto",
-    "CAVAN": "Vancouver",
-    "CAVIC": "Victoria",
-    # Congo
-    "CGPNR": "Pointe Noire",
-    # Ivory Coast
-    "CIABJ": "Abidjan",
-    "CIVRR": "San Pedro",
-    # Chile
-    "CLARI": "Arica",
-    "CLIQQ": "Iquique",
-    "CLLQN": "Lirquen",
-    "CLSAI": "San Antonio",
-    "CLSCL": "Santiago",
-    "CLTCO": "Talcahuano",
-    "CLVAP": "Valparaiso",
-    # Cameroon
-    "CMDLA": "Douala",
-    "CMYAO": "Yaounde",
-    # China
-    "CNBHZ": "Beihai",
-    "CNCAN": "Guangzhou",
-    "CNCHI": "Chiwan",
-    "CNDLC": "Dalian",
-    "CNDOC": "Dongguan",
-    "CNFOC": "Fuzhou",
-    "CNHAK": "Haikou",
-    "CNHUA": "Huangpu",
-    "CNHUI": "Huizhou",
-    "CNJIA": "Jiangmen",
-    "CNJIN": "Jinzhou",
-    "CNJIU": "Jiujiang",
-    "CNLIU": "Liuheng",
-    "CNLYG": "Lianyungang",
-    "CNNAN": "Nansha",
-    "CNNGB": "Ningbo",
-    "CNNKG": "Nanjing",
-    "CNQZH": "Quanzhou",
-    "CNSHA": "Shanghai",
-    "CNSHG": "Shanghai",
-    "CNSHK": "Shekou",
-    "CNSWA": "Shantou",
-    "CNSZX": "Shenzhen",
-    "CNTAI": "Taicang",
-    "CNTAO": "Qingdao",
-    "CNTXG": "Tianjin Xingang",
-    "CNWEI": "Weihai",
-    "CNWUH": "Wuhan",
-    "CNXMN": "Xiamen",
-    "CNYAN": "Yantai",
-    "CNYTN": "Yantian",
-    "CNZHA": "Zhapu",
-    "CNZHZ": "Zhenjiang",
-    "CNZJG": "Zhanjiang",
-    "CNZUH": "Zhuhai",
-    # Colombia
-    "COBAQ": "Barranquilla",
-    "COBOG": "Bogota",
-    "COBUN": "Buenaventura",
-    "COCTG": "Cartagena",
-    "COSTR": "Santa Marta",
-    # Costa Rica
-    "CRCLD": "Caldera",
-    "CRLIM": "Puerto Limon",
-    "CRSJO": "San Jose",
-    # Cuba
-    "CUHAV": "Havana",
-    "CUMOA": "Moa",
-    # Curacao
-    "CWWIL": "Willemstad",
-    # Cyprus
-    "CYLMS": "Limassol",
-    "CYNIC": "Nicosia",
-    # Germany
-    "DEBRE": "Bremen",
-    "DEBRV": "Bremerhaven",
-    "DEEMB": "Emden",
-    "DEHAM": "Hamburg",
-    "DEKEL": "Kiel",
-    "DELBC": "Lubeck",
-    "DEROS": "Rostock",
-    "DEWVN": "Wilhelmshaven",
-    # Djibouti
-    "DJJIB": "Djibouti",
-    # Denmark
-    "DKAAR": "Aarhus",
-    "DKCPH": "Copenhagen",
-    # Dominican Republic
-    "DOCAU": "Caucedo",
-    "DOSDQ": "Santo Domingo",
-    # Algeria
-    "DZAAE": "Annaba",
-    "DZALG": "Algiers",
-    "DZORN": "Oran",
-    # Ecuador
-    "ECGYE": "Guayaquil",
-    "ECMEC": "Manta",
-    "ECUIO": "Quito",
-    # Estonia
-    "EETLL": "Tallinn",
-    # Egypt
-    "EGALY": "Alexandria",
-    "EGCAI": "Cairo",
-    "EGDAM": "Damietta",
-    "EGPSD": "Port Said",
-    "EGSOK": "Sokhna",
-    # Spain
-    "ESALG": "Algeciras",
-    "ESBCN": "Barcelona",
-    "ESBIO": "Bilbao",
-    "ESLPA": "Las Palmas",
-    "ESMAD": "Madrid",
-    "ESMAL": "Malaga",
-    "ESSCQ": "Santiago de Compostela",
-    "ESSVQ": "Seville",
-    "ESVLC": "Valencia",
-    # Ethiopia
-    "ETADD": "Addis Ababa",
-    # Finland
-    "FIHAM": "Hamina",
-    "FIHEL": "Helsinki",
-    "FIKTK": "Kotka",
-    "FITUR": "Turku",
-    # Fiji
-    "FJSUV": "Suva",
-    # Faroe Islands
-    "FOTHO": "Torshavn",
-    # France
-    "FRBAY": "Bayonne",
-    "FRBOD": "Bordeaux",
-    "FRDKK": "Dunkirk",
-    "FRFOS": "Fos-sur-Mer",
-    "FRLEH": "Le Havre",
-    "FRLYO": "Lyon",
-    "FRMRS": "Marseille",
-    "FRNTE": "Nantes",
-    "FRPAR": "Paris",
-    "FRSRG": "Strasbourg",
-    # Gabon
-    "GALIB": "Libreville",
-    "GAPOG": "Port Gentil",
-    # United Kingdom
-    "GBBEL": "Belfast",
-    "GBFXT": "Felixstowe",
-    "GBGRG": "Grangemouth",
-    "GBHUL": "Hull",
-    "GBLGP": "London Gateway",
-    "GBLIV": "Liverpool",
-    "GBLON": "London",
-    "GBSOU": "Southampton",
-    "GBTHP": "Thamesport",
-    "GBTIL": "Tilbury",
-    # French Guiana
-    "GFCAY": "Cayenne",
-    # Ghana
-    "GHACC": "Accra",
-    "GHTEM": "Tema",
-    # Greenland
-    "GLGOH": "Nuuk",
-    # Gambia
-    "GMBJL": "Banjul",
-    # Guinea
-    "GNCKR": "Conakry",
-    # Greece
-    "GRATH": "Athens",
-    "GRHER": "Heraklion",
-    "GRPIR": "Piraeus",
-    "GRTHE": "Thessaloniki",
-    # Guatemala
-    "GTGUA": "Guatemala City",
-    "GTQUE": "Quetzal",
-    # Guam
-    "GUGUM": "Guam",
-    # Guyana
-    "GYGEO": "Georgetown",
-    # Hong Kong
-    "HKHKG": "Hong Kong",
-    # Honduras
-    "HNPCO": "Puerto Cortes",
-    "HNTGU": "Tegucigalpa",
-    # Croatia
-    "HRRJK": "Rijeka",
-    "HRZAG": "Zagreb",
-    # Indonesia
-    "IDBDJ": "Banjarmasin",
-    "IDBLW": "Belawan",
-    "IDBPN": "Balikpapan",
-    "IDBTM": "Batam",
-    "IDJKT": "Jakarta",
-    "IDMKS": "Makassar",
-    "IDPDK": "Padang",
-    "IDPLG": "Palembang",
-    "IDPNK": "Pontianak",
-    "IDSRG": "Semarang",
-    "IDSUB": "Surabaya",
-    "IDTPP": "Tanjung Priok",
-    # Ireland
-    "IECORK": "Cork",
-    "IEDUB": "Dublin",
-    # Israel
-    "ILASD": "Ashdod",
-    "ILETH": "Eilat",
-    "ILHFA": "Haifa",
-    "ILTLV": "Tel Aviv",
-    # India
-    "INAHD": "Ahmedabad",
-    "INBLR": "Bangalore",
-    "INCCU": "Kolkata",
-    "INCHE": "Chennai",
-    "INCOK": "Kochi",
-    "INDEL": "Delhi",
-    "INHYD": "Hyderabad",
-    "INHZA": "Hazira",
-    "INIXE": "Mangalore",
-    "INJAI": "Jaipur",
-    "INKAN": "Kandla",
-    "INKNU": "Kanpur",
-    "INMUN": "Mumbai",
-    "INMUN1": "Mundra",
-    "INNSA": "Nhava Sheva",
-    "INPAV": "Pipavav",
-    "INPUN": "Pune",
-    "INSUR": "Surat",
-    "INTUT": "Tuticorin",
-    "INVTZ": "Visakhapatnam",
-    # Iraq
-    "IQBGW": "Baghdad",
-    "IQBSR": "Basra",
-    "IQUMQ": "Umm Qasr",
-    # Iran
-    "IRBND": "Bandar Abbas",
-    "IRBUX": "Bushehr",
-    "IRKHO": "Khorramshahr",
-    "IRTHR": "Tehran",
-    # Iceland
-    "ISREY": "Reykjavik",
-    # Italy
-    "ITGIT": "Gioia Tauro",
-    "ITGOA": "Genoa",
-    "ITLIV": "Livorno",
-    "ITMIL": "Milan",
-    "ITNAP": "Naples",
-    "ITROM": "Rome",
-    "ITSAL": "Salerno",
-    "ITSPE": "La Spezia",
-    "ITTRN": "Trieste",
-    "ITTRS": "Taranto",
-    "ITVCE": "Venice",
-    # Jamaica
-    "JMKIN": "Kingston",
-    "JMMBT": "Montego Bay",
-    # Jordan
-    "JOAMM": "Amman",
-    "JOAQJ": "Aqaba",
-    # Japan
-    "JPCHI": "Chiba",
-    "JPFUK": "Fukuoka",
-    "JPHIJ": "Hiroshima",
-    "JPHKT": "Hakata",
-    "JPKAN": "Kanazawa",
-    "JPKIT": "Kitakyushu",
-    "JPKSZ": "Shimizu",
-    "JPMOJ": "Moji",
-    "JPNAH": "Naha",
-    "JPNGO": "Nagoya",
-    "JPNIS": "Niigata",
-    "JPOKA": "Okinawa",
-    "JPOSA": "Osaka",
-    "JPSZE": "Sendai",
-    "JPTOY": "Toyama",
-    "JPTYO": "Tokyo",
-    "JPUKB": "Kobe",
-    "JPYOK": "Yokohama",
-    # Kenya
-    "KEMBA": "Mombasa",
-    "KENBO": "Nairobi",
-    # Cambodia
-    "KHKOS": "Sihanoukville",
-    "KHPNH": "Phnom Penh",
-    # South Korea
-    "KRICH": "Incheon",
-    "KRKWN": "Gwangyang",
-    "KRMKP": "Mokpo",
-    "KRPTK": "Pyeongtaek",
-    "KRPUS": "Busan",
-    "KRSUW": "Suwon",
-    "KRULS": "Ulsan",
-    # Kuwait
-    "KWKWI": "Kuwait City",
-    "KWSWK": "Shuwaikh",
-    # Cayman Islands
-    "KYGEC": "Grand Cayman",
-    # Lebanon
-    "LBBEY": "Beirut",
-    "LBTYR": "Tyre",
-    # Sri Lanka
-    "LKCMB": "Colombo",
-    "LKGAL": "Galle",
-    # Liberia
-    "LRMLW": "Monrovia",
-    # Lithuania
-    "LTKLJ": "Klaipeda",
-    "LTVNO": "Vilnius",
-    # Latvia
-    "LVRIX": "Riga",
-    "LVVEN": "Ventspils",
-    # Libya
-    "LYBEN": "Benghazi",
-    "LYTIP": "Tripoli",
-    # Morocco
-    "MAAGG": "Agadir",
-    "MACAS": "Casablanca",
-    "MARAB": "Rabat",
-    "MATNG": "Tangier",
-    # Madagascar
-    "MGTMY": "Antananarivo",
-    "MGTNR": "Toamasina",
-    # Myanmar
-    "MMMDY": "Mandalay",
-    "MMRGN": "Yangon",
-    # Macau
-    "MOMFM": "Macau",
-    # Mauritania
-    "MRNKC": "Nouakchott",
-    # Malta
-    "MTMLA": "Marsaxlokk",
-    "MTVAL": "Valletta",
-    # Mauritius
-    "MUPLU": "Port Louis",
-    # Mexico
-    "MXATM": "Altamira",
-    "MXLZC": "Lazaro Cardenas",
-    "MXMAN": "Manzanillo",
-    "MXMEX": "Mexico City",
-    "MXPVM": "Progreso",
-    "MXSZA": "Salina Cruz",
-    "MXTAM": "Tampico",
-    "MXVER": "Veracruz",
-    "MXZLO": "Manzanillo Colima",
-    # Malaysia
-    "MYBTU": "Bintulu",
-    "MYJHB": "Johor Bahru",
-    "MYKCH": "Kuching",
-    "MYKUA": "Kuantan",
-    "MYKUL": "Kuala Lumpur",
-    "MYLDU": "Lahad Datu",
-    "MYMTW": "Miri",
-    "MYPEN": "Penang",
-    "MYPKG": "Port Klang",
-    "MYSBW": "Sibu",
-    "MYTPP": "Tanjung Pelepas",
-    # Mozambique
-    "MZBEW": "Beira",
-    "MZMPM": "Maputo",
-    # Namibia
-    "NAWDH": "Walvis Bay",
-    "NAWVB": "Windhoek",
-    # New Caledonia
-    "NCNOU": "Noumea",
-    # Nigeria
-    "NGAPP": "Apapa",
-    "NGLKK": "Lagos",
-    "NGPHC": "Port Harcourt",
-    "NGTIN": "Tin Can Island",
-    # Nicaragua
-    "NICOR": "Corinto",
-    "NIMGA": "Managua",
-    # Netherlands
-    "NLAMS": "Amsterdam",
-    "NLMOE": "Moerdijk",
-    "NLRTM": "Rotterdam",
-    "NLVLI": "Vlissingen",
-    # Norway
-    "NOBGO": "Bergen",
-    "NOKRS": "Kristiansand",
-    "NOOSL": "Oslo",
-    "NOSVG": "Stavanger",
-    "NOTRD": "Trondheim",
-    # New Zealand
-    "NZAKL": "Auckland",
-    "NZCHC": "Christchurch",
-    "NZLYT": "Lyttelton",
-    "NZTRG": "Tauranga",
-    "NZWLG": "Wellington",
-    # Oman
-    "OMMCT": "Muscat",
-    "OMSLL": "Salalah",
-    "OMSOH": "Sohar",
-    "OMSUZ": "Suwaiq",
-    # Panama
-    "PABAL": "Balboa",
-    "PACTB": "Cristobal",
-    "PAMIT": "Manzanillo International Terminal",
-    "PAPAC": "Panama City",
-    # Peru
-    "PECLL": "Callao",
-    "PELIM": "Lima",
-    "PEPAI": "Paita",
-    # French Polynesia
-    "PFPPT": "Papeete",
-    # Papua New Guinea
-    "PGLAE": "Lae",
-    "PGPOM": "Port Moresby",
-    # Philippines
-    "PHBCD": "Bacolod",
-    "PHCEB": "Cebu",
-    "PHCGY": "Cagayan de Oro",
-    "PHDVO": "Davao",
-    "PHILO": "Iloilo",
-    "PHMNL": "Manila",
-    "PHSBX": "Subic Bay",
-    "PHZAM": "Zamboanga",
-    # Pakistan
-    "PKBQM": "Karachi",
-    "PKGWD": "Gwadar",
-    "PKISB": "Islamabad",
-    "PKKHI": "Karachi",
-    "PKLHE": "Lahore",
-    # Poland
-    "PLGDN": "Gdansk",
-    "PLGDY": "Gdynia",
-    "PLSZZ": "Szczecin",
-    "PLWAW": "Warsaw",
-    # Puerto Rico
-    "PRPON": "Ponce",
-    "PRSJU": "San Juan",
-    # Portugal
-    "PTLEI": "Leixoes",
-    "PTLIS": "Lisbon",
-    "PTOPO": "Porto",
-    "PTSET": "Setubal",
-    "PTSIE": "Sines",
-    # Paraguay
-    "PYASU": "Asuncion",
-    # Qatar
-    "QADOH": "Doha",
-    "QAHMD": "Hamad Port",
-    # Reunion
-    "RERUN": "Reunion",
-    # Russia
-    "RUKLT": "Kaliningrad",
-    "RULED": "St Petersburg",
-    "RUMOW": "Moscow",
-    "RUMUR": "Murmansk",
-    "RUNUS": "Novorossiysk",
-    "RUULU": "Ulyanovsk",
-    "RUVVO": "Vladivostok",
-    # Saudi Arabia
-    "SADMM": "Dammam",
-    "SAJED": "Jeddah",
-    "SAJUB": "Jubail",
-    "SARAJB": "King Abdullah Port",
-    "SARIY": "Riyadh",
-    "SARUH": "Ras Al Khair",
-    # Solomon Islands
-    "SBHIR": "Honiara",
-    # Seychelles
-    "SCMAW": "Mahe",
-    # Sweden
-    "SEGOT": "Gothenburg",
-    "SEHEL": "Helsingborg",
-    "SEMAL": "Malmo",
-    "SESTO": "Stockholm",
-    # Singapore
-    "SGSIN": "Singapore",
-    # Slovenia
-    "SIKOP": "Koper",
-    "SILJU": "Ljubljana",
-    # Sierra Leone
-    "SLFNA": "Freetown",
-    # Senegal
-    "SNDKR": "Dakar",
-    # Somalia
-    "SOMGQ": "Mogadishu",
-    # Suriname
-    "SRPBM": "Paramaribo",
-    # El Salvador
-    "SVAQJ": "Acajutla",
-    "SVSAL": "San Salvador",
-    # Syria
-    "SYLAT": "Latakia",
-    "SYTAR": "Tartus",
-    # Togo
-    "TGLFW": "Lome",
-    # Thailand
-    "THBKK": "Bangkok",
-    "THLCH": "Laem Chabang",
-    "THPHU": "Phuket",
-    "THSGZ": "Songkhla",
-    # Tunisia
-    "TNBIZ": "Bizerte",
-    "TNSFA": "Sfax",
-    "TNTUN": "Tunis",
-    # Turkey
-    "TRALI": "Aliaga",
-    "TRAMB": "Ambarli",
-    "TRGEM": "Gemlik",
-    "TRIST": "Istanbul",
-    "TRIZM": "Izmir",
-    "TRMER": "Mersin",
-    # Trinidad & Tobago
-    "TTPAW": "Port of Spain",
-    # Taiwan
-    "TWHUA": "Hualien",
-    "TWKEL": "Keelung",
-    "TWKHH": "Kaohsiung",
-    "TWTPE": "Taipei",
-    "TWTXG": "Taichung",
-    # Tanzania
-    "TZDAR": "Dar es Salaam",
-    "TZZNZ": "Zanzibar",
-    # United States
-    "USATL": "Atlanta",
-    "USBAL": "Baltimore",
-    "USBOS": "Boston",
-    "USCHI": "Chicago",
-    "USCHS": "Charleston",
-    "USDET": "Detroit",
-    "USDFW": "Dallas",
-    "USFLL": "Fort Lauderdale",
-    "USHOU": "Houston",
-    "USJAX": "Jacksonville",
-    "USLAX": "Los Angeles",
-    "USLGB": "Long Beach",
-    "USMIA": "Miami",
-    "USMOB": "Mobile",
-    "USMSY": "New Orleans",
-    "USNYC": "New York",
-    "USOAK": "Oakland",
-    "USORF": "Norfolk",
-    "USPDX": "Portland",
-    "USPHL": "Philadelphia",
-    "USSAN": "San Diego",
-    "USSAV": "Savannah",
-    "USSEA": "Seattle",
-    "USSFO": "San Francisco",
-    "USTAC": "Tacoma",
-    "USTPA": "Tampa",
-    "USWIL": "Wilmington",
-    # Uruguay
-    "UYMVD": "Montevideo",
-    # Venezuela
-    "VECCS": "Caracas",
-    "VELGR": "La Guaira",
-    "VEMCB": "Maracaibo",
-    "VEPBL": "Puerto Cabello",
-    # British Virgin Islands
-    "VGTOV": "Tortola",
-    # US Virgin Islands
-    "VISTT": "St Thomas",
-    # Vietnam
-    "VNCAN": "Can Tho",
-    "VNDAD": "Da Nang",
-    "VNHAN": "Hanoi",
-    "VNHPH": "Haiphong",
-    "VNHUI": "Hue",
-    "VNNHA": "Nha Trang",
-    "VNQNI": "Qui Nhon",
-    "VNSGN": "Ho Chi Minh City",
-    "VNVUT": "Vung Tau",
-    # Vanuatu
-    "VUVLI": "Port Vila",
-    # Samoa
-    "WSAPW": "Apia",
-    # Yemen
-    "YEADE": "Aden",
-    "YEHOD": "Hodeidah",
-    # South Africa
-    "ZACPT": "Cape Town",
-    "ZADUR": "Durban",
-    "ZAELS": "East London",
-    "ZAJNB": "Johannesburg",
-    "ZANGQ": "Ngqura",
-    "ZAPLZ": "Port Elizabeth",
-}
-
-
-def load_data():
-    """Load the CSV data on startup"""
-    global df
+# Global availability store (float32 matrix + port pair index).
+# Reloads replace the reference in one assignment; handlers read it once.
+store: Optional[AvailabilityStore] = None
+
+CSV_PATH = Path(__file__).resolve().parent / "Qlik Sense Port Pairs SpotOn.csv"
+
+# Compiled by compile_snapshot.py; preferred over the CSV when newer
+SNAPSHOT_PATH = snapshot_path_for(CSV_PATH)
+
+# Seconds between checks of the data files for changes (0 disables the watcher)
+DATA_WATCH_INTERVAL = float(os.environ.get("DATA_WATCH_INTERVAL", "30"))
+
+# Upper bound on port pairs accepted by POST /port-pairs/batch
+BATCH_MAX_PAIRS = int(os.environ.get("BATCH_MAX_PAIRS", "5000"))
+
+# Upper bound on k for /rankings
+RANKINGS_MAX_K = int(os.environ.get("RANKINGS_MAX_K", "1000"))
+
+# Upper bound on port pairs returned per page by /query
+QUERY_MAX_LIMIT = int(os.environ.get("QUERY_MAX_LIMIT", "1000"))
+
+# Upper bound on codes accepted by POST /port-to-city/batch
+PORT_TO_CITY_BATCH_MAX = int(os.environ.get("PORT_TO_CITY_BATCH_MAX", "100000"))
+
+# Upper bound on results returned by /ports/search and /ports/{code}/nearby
+PORTS_SEARCH_MAX_LIMIT = int(os.environ.get("PORTS_SEARCH_MAX_LIMIT", "100"))
+
+# Largest radius in km accepted by /ports/{code}/nearby and pair alternatives
+PORTS_NEARBY_MAX_KM = float(os.environ.get("PORTS_NEARBY_MAX_KM", "1000"))
+
+# Bearer token required by /admin endpoints (unset disables them)
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# File signatures of the CSV and snapshot the current store was built from
+data_signature = None
+
+# Serializes reloads so two parses never race to swap the store
+reload_lock = asyncio.Lock()
+
+# Shared CMA CGM client (connection pool), opened on startup
+http_client: Optional[httpx.AsyncClient] = None
+
+# Optional SQLite file behind the quote and schedule caches so they survive
+# restarts (unset disables), and its size cap
+PROXY_CACHE_PATH = os.environ.get("PROXY_CACHE_PATH")
+PROXY_CACHE_MAX_BYTES = int(os.environ.get("PROXY_CACHE_MAX_BYTES", str(256 << 20)))
+proxy_disk_cache = (
+    DiskCache(PROXY_CACHE_PATH, PROXY_CACHE_MAX_BYTES) if PROXY_CACHE_PATH else None
+)
+
+# /proxy quote cache: seconds a quote stays fresh (0 disables) and its size cap
+QUOTE_CACHE_TTL = float(os.environ.get("QUOTE_CACHE_TTL", "300"))
+QUOTE_CACHE_MAX_BYTES = int(os.environ.get("QUOTE_CACHE_MAX_BYTES", str(64 << 20)))
+quote_cache = SingleFlightCache(
+    QUOTE_CACHE_TTL, QUOTE_CACHE_MAX_BYTES, disk=proxy_disk_cache, namespace="quotes"
+)
+
+# /proxy-schedule cache: seconds routings stay fresh (0 disables), seconds
+# after that they are still served while refreshed in the background, size cap
+SCHEDULE_CACHE_TTL = float(os.environ.get("SCHEDULE_CACHE_TTL", "900"))
+SCHEDULE_CACHE_STALE = float(os.environ.get("SCHEDULE_CACHE_STALE", "21600"))
+SCHEDULE_CACHE_MAX_BYTES = int(
+    os.environ.get("SCHEDULE_CACHE_MAX_BYTES", str(32 << 20))
+)
+schedule_cache = SingleFlightCache(
+    SCHEDULE_CACHE_TTL,
+    SCHEDULE_CACHE_MAX_BYTES,
+    stale=SCHEDULE_CACHE_STALE,
+    disk=proxy_disk_cache,
+    namespace="schedules",
+)
+
+# Largest streamed proxy result kept in memory to fill the cache; larger
+# results are streamed without being buffered and are not cached
+STREAM_CACHE_MAX_ITEMS = int(os.environ.get("STREAM_CACHE_MAX_ITEMS", "2000"))
+
+# POST /proxy/batch: lanes accepted per call and lanes of one call run at once
+PROXY_BATCH_MAX_LANES = int(os.environ.get("PROXY_BATCH_MAX_LANES", "500"))
+PROXY_BATCH_LANE_CONCURRENCY = int(os.environ.get("PROXY_BATCH_LANE_CONCURRENCY", "10"))
+
+# Longest departure-date window accepted by /proxy/calendar, in days
+PROXY_CALENDAR_MAX_DAYS = int(os.environ.get("PROXY_CALENDAR_MAX_DAYS", "62"))
+
+
+def file_signature(path: Path):
+    """(mtime_ns, size) of a file, or None if it does not exist"""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def source_signature():
+    """Signatures of the CSV and its snapshot, used to detect changes"""
+    return (file_signature(CSV_PATH), file_signature(SNAPSHOT_PATH))
+
+
+def load_data(warm: bool = False) -> Dict:
+    """
+    Load the data into a new store and swap it in.
+
+    The compiled snapshot is memory-mapped when it is at least as new as the
+    CSV; otherwise the CSV is parsed. The swap is a single reference
+    assignment, so requests that already hold the previous store finish
+    against it and nothing is ever unavailable. With warm=True the derived
+    aggregates are built before the swap.
+    """
+    global store, data_signature
     try:
-        # Get the directory where this script is located
-        base_dir = Path(__file__).resolve().parent
-        csv_path = base_dir / "Qlik Sense Port Pairs SpotOn.csv"
-
-        if not csv_path.exists():
-            raise FileNotFoundError(f"CSV file not found at {csv_path}")
-
-        df = pd.read_csv(
-            csv_path,
-            skiprows=1,
-            delimiter=";",
-            index_col="POL-POD Booked",
+        signature = source_signature()
+        csv_sig, snapshot_sig = signature
+        if csv_sig is None and snapshot_sig is None:
+            raise FileNotFoundError(f"CSV file not found at {CSV_PATH}")
+
+        start_time = time.perf_counter()
+        new_store = None
+        source = "csv"
+        if snapshot_sig is not None and (
+            csv_sig is None or snapshot_sig[0] >= csv_sig[0]
+        ):
+            try:
+                new_store = AvailabilityStore.from_snapshot(SNAPSHOT_PATH)
+                source = "snapshot"
+            except Exception as e:
+                if csv_sig is None:
+                    raise
+                print(f"✗ Could not open snapshot, parsing CSV instead: {e}")
+        if new_store is None:
+            new_store = AvailabilityStore.from_csv(CSV_PATH)
+        parse_time = time.perf_counter() - start_time
+        if warm:
+            new_store.warm()
+
+        store = new_store
+        data_signature = signature
+        print(
+            f"✓ Data loaded successfully from {source}: {len(new_store)} port pairs, "
+            f"{len(new_store.date_labels)} dates in {parse_time:.3f}s"
         )
-        print(f"✓ Data loaded successfully: {len(df)} port pairs")
+        return {
+            "source": source,
+            "port_pairs_count": len(new_store),
+            "dates_count": len(new_store.date_labels),
+            "parse_time_seconds": round(parse_time, 3),
+        }
     except Exception as e:
         print(f"✗ Error loading data: {e}")
         raise
 
 
+async def reload_data() -> Dict:
+    """Reload the data in the threadpool without blocking the event loop"""
+    async with reload_lock:
+        return await run_in_threadpool(load_data, True)
+
+
+async def watch_data_file():
+    """Poll the CSV and snapshot and reload once a change has settled"""
+    pending = data_signature
+    failed = None
+    while True:
+        await asyncio.sleep(DATA_WATCH_INTERVAL)
+        current = source_signature()
+
+        if current in (data_signature, failed):
+            pending = current
+            continue
+        if current != pending:
+            # Still being written; wait for it to stop changing
+            pending = current
+            continue
+
+        print("↻ Data files changed on disk, reloading")
+        try:
+            await reload_data()
+        except Exception as e:
+            failed = current
+            print(f"✗ Reload failed, still serving previous data: {e}")
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared upstream client, created on first use if startup has not run"""
+    global http_client
+    if http_client is None:
+        http_client = create_client()
+    return http_client
+
+
+def get_store() -> AvailabilityStore:
+    """Current store snapshot, or 503 if data has never been loaded"""
+    snapshot = store
+    if snapshot is None:
+        raise HTTPException(
+            status_code=503, detail="Service unavailable - data not loaded"
+        )
+    return snapshot
+
+
+async def warm_proxy_caches():
+    """Reload cached quotes and schedules from disk after a restart"""
+    try:
+        quotes = await quote_cache.warm()
+        schedules = await schedule_cache.warm()
+        print(
+            f"✓ Warmed proxy caches from disk: {quotes} quotes, {schedules} schedules"
+        )
+    except Exception as e:
+        print(f"✗ Could not warm proxy caches from disk: {e}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Load data when the application starts"""
     load_data()
+    # Build aggregates in the background so startup is not held up by them
+    app.state.store_warmup = asyncio.create_task(run_in_threadpool(store.warm))
+    if DATA_WATCH_INTERVAL > 0:
+        app.state.data_watcher = asyncio.create_task(watch_data_file())
+    if proxy_disk_cache is not None:
+        app.state.cache_warmup = asyncio.create_task(warm_proxy_caches())
+    if prefetcher.enabled:
+        app.state.prefetcher = asyncio.create_task(prefetcher.run())
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background tasks and close upstream connections"""
+    global http_client
+    # Wait for the tasks to stop so none still uses the disk cache once closed
+    tasks = [
+        task
+        for name in ("store_warmup", "cache_warmup", "data_watcher", "prefetcher")
+        if (task := getattr(app.state, name, None)) is not None
+    ]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if http_client is not None:
+        await http_client.aclose()
+        http_client = None
+    if proxy_disk_cache is not None:
+        await quote_cache.flush()
+        await schedule_cache.flush()
+        proxy_disk_cache.close()
 
 
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
+    endpoints = {
+        "/health": "Health check endpoint",
+        "/admin/reload": "Reload the CSV data without downtime (POST)",
+        "/port-pairs": "Get list of all available port pairs",
+        "/port-pairs/{port_pair}": "Get data for a specific port pair",
+        "/port-pairs/batch": "Get data for many port pairs in one call (POST)",
+        "/dates": "Get list of all available dates",
+        "/rollups/{level}/{code}": "Aggregate availability by origin, destination or their country",
+        "/search": "Search port pairs by origin and/or destination",
+        "/query": "Port pairs whose availability passes a threshold over a date window",
+        "/rankings": "Top-K port pairs by availability on a date or date range",
+        "/routes": "Direct and one- or two-hub routes between two ports, ranked by availability",
+        "/port-to-city": "Convert port codes to city names (string or array)",
+        "/port-to-city/batch": "Convert many port codes to city names in input order (POST)",
+        "/ports/search": "Find ports by city name or code, tolerating typos",
+        "/ports/by-city": "Port codes of a city",
+        "/proxy": "Proxy to CMA CGM SpotOn API for live quotes",
+        "/proxy/batch": "Live quotes for many lanes, streamed as each lane finishes (POST)",
+        "/proxy/calendar": "Live quotes for a lane across a departure-date window, cheapest per date",
+        "/proxy-schedule": "Proxy to CMA CGM Route API for schedule/routing information",
+    }
+    # Radius searches need port coordinates, which ports.csv does not have
+    if len(port_directory().grid):
+        endpoints["/ports/{code}/nearby"] = "Locations within a radius of a port"
+        endpoints["/port-pairs/{port_pair}/alternatives"] = (
+            "Loaded pairs between ports near the POL and POD, ranked by availability"
+        )
     return {
         "message": "Welcome to Port Pairs SpotOn API",
         "version": "1.0.0",
-        "endpoints": {
-            "/health": "Health check endpoint",
-            "/port-pairs": "Get list of all available port pairs",
-            "/port-pairs/{port_pair}": "Get data for a specific port pair",
-            "/dates": "Get list of all available dates",
-            "/search": "Search port pairs by origin and/or destination",
-            "/port-to-city": "Convert port codes to city names (string or array)",
-            "/proxy": "Proxy to CMA CGM SpotOn API for live quotes",
-            "/proxy-schedule": "Proxy to CMA CGM Route API for schedule/routing information",
-        },
+        "endpoints": endpoints,
     }
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    if df is None:
+    snapshot = get_store()
+
+    return {
+        "status": "healthy",
+        "data_loaded": True,
+        "port_pairs_count": len(snapshot),
+        "upstream": {**upstream_governor.stats(), "hedging": page_hedger.stats()},
+        "prefetch": prefetcher.stats(),
+    }
+
+
+def check_admin_token(authorization: Optional[str]):
+    """
+    Reject admin calls without 'Authorization: Bearer <ADMIN_TOKEN>'.
+
+    Admin endpoints do not exist (404) unless ADMIN_TOKEN is set.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(
+        token.strip().encode("utf-8"), ADMIN_TOKEN.encode("utf-8")
+    ):
         raise HTTPException(
-            status_code=503, detail="Service unavailable - data not loaded"
+            status_code=401,
+            detail="Invalid admin token",
+            headers={"WWW-Authenticate": "Bearer"},
         )
 
-    return {"status": "healthy", "data_loaded": True, "port_pairs_count": len(df)}
+
+@app.post("/admin/reload")
+async def admin_reload(
+    authorization: Optional[str] = Header(
+        None, description="Bearer <ADMIN_TOKEN>; disabled unless ADMIN_TOKEN is set"
+    ),
+):
+    """
+    Re-read the CSV and swap the new data in without downtime.
+
+    The file is parsed off the event loop; requests keep being served from
+    the current data until the new store is ready. If parsing fails the
+    current data stays in place.
+    """
+    check_admin_token(authorization)
+    try:
+        stats = await reload_data()
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Reload failed, still serving previous data: {str(e)}",
+        )
+    return {"status": "reloaded", **stats}
 
 
 @app.get("/port-pairs")
 async def get_all_port_pairs() -> List[str]:
     """Get list of all available port pairs"""
-    if df is None:
-        raise HTTPException(
-            status_code=503, detail="Service unavailable - data not loaded"
-        )
+    snapshot = get_store()
+
+    return snapshot.pairs
 
-    return df.index.tolist()
+
+def serialize_json(content) -> bytes:
+    """Encode a response body the same way FastAPI's JSONResponse does"""
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def resolve_columns(
+    snapshot: AvailabilityStore,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    last: Optional[int] = None,
+) -> slice:
+    """Column slice for a from/to window, optionally narrowed to its last N dates"""
+    try:
+        columns = snapshot.date_slice(date_from, date_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if last is not None:
+        columns = slice(max(columns.start, columns.stop - last), columns.stop)
+    return columns
+
+
+def port_pair_body(
+    snapshot: AvailabilityStore, port_pair: str, columns: Optional[slice] = None
+):
+    """
+    Serialized (body, etag) for a port pair, or None if it is not loaded.
+
+    Bodies are built once per snapshot and date window and then served from
+    the snapshot's LRU cache.
+    """
+    if columns is None:
+        columns = slice(0, len(snapshot.date_labels))
+    key = (port_pair, columns.start, columns.stop)
+    cached = snapshot.response_cache.get(key)
+    if cached is not None:
+        return cached
+
+    row = snapshot.row(port_pair)
+    if row is None:
+        return None
+
+    # Array of single-key dictionaries in column order (already chronological)
+    values = to_json_values(snapshot.values[row, columns])
+    data_array = [
+        {date: value} for date, value in zip(snapshot.date_labels[columns], values)
+    ]
+    body = serialize_json({"port_pair": port_pair, "data": data_array})
+
+    cached = (body, strong_etag(body))
+    snapshot.response_cache.put(key, cached)
+    return cached
+
+
+def cached_json_response(request: Request, body: bytes, etag: str) -> Response:
+    """Serve pre-serialized JSON, answering 304 when the client's ETag matches"""
+    headers = {"ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.get("/port-pairs/{port_pair}")
-async def get_port_pair_data(port_pair: str):
+async def get_port_pair_data(
+    port_pair: str,
+    request: Request,
+    date_from: Optional[date] = Query(
+        None, alias="from", description="First date to include (YYYY-MM-DD)"
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="Last date to include (YYYY-MM-DD)"
+    ),
+    last: Optional[int] = Query(
+        None, ge=1, description="Only the last N dates (within from/to if given)"
+    ),
+):
     """
     Get booking data for a specific port pair.
 
     Example: /port-pairs/BJCOO-BRPEC
+    Date window: /port-pairs/BJCOO-BRPEC?from=2025-11-01&to=2025-12-31 or ?last=4
 
     Returns empty data array if port pair not found.
+    Responses carry an ETag; send it back in If-None-Match to get a 304.
     """
-    if df is None:
-        raise HTTPException(
-            status_code=503, detail="Service unavailable - data not loaded"
-        )
+    snapshot = get_store()
+    columns = resolve_columns(snapshot, date_from, date_to, last)
 
     try:
-        # Try to get the data for the port pair
-        data = df.loc[port_pair]
-
-        # Convert to array of dictionaries in column order (already chronological)
-        data_array = []
-        for date in data.index:
-            data_array.append({date: data[date]})
-
-        result = {"port_pair": port_pair, "data": data_array}
+        cached = port_pair_body(snapshot, port_pair, columns)
+        if cached is not None:
+            return cached_json_response(request, *cached)
 
-        return result
-    except KeyError:
         # Return empty data instead of raising error
         return {
             "port_pair": port_pair,
@@ -789,28 +524,244 @@ async def get_port_pair_data(port_pair: str):
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 
+def located_directory() -> PortDirectory:
+    """The port directory, or 503 if it was loaded without any coordinates"""
+    directory = port_directory()
+    if not len(directory.grid):
+        raise HTTPException(
+            status_code=503,
+            detail="No coordinate data loaded; compile the port directory with "
+            "UN/LOCODE coordinates (see compile_ports.py)",
+        )
+    return directory
+
+
+def nearby_codes(directory: PortDirectory, code: str, km: float) -> Dict[str, float]:
+    """A normalized port code (0 km) and the codes within km of it, 404 if unlocated"""
+    row = directory.row_of(code)
+    if row is None or directory.coordinates(row) is None:
+        raise HTTPException(
+            status_code=404, detail=f"No coordinates known for '{code}'"
+        )
+    near = {code: 0.0}
+    for other, distance in directory.nearby(row, km):
+        near[directory.code(other)] = distance
+    return near
+
+
+@app.get("/port-pairs/{port_pair}/alternatives")
+async def get_port_pair_alternatives(
+    port_pair: str,
+    km: float = Query(
+        150, gt=0, le=PORTS_NEARBY_MAX_KM, description="Radius around POL and POD"
+    ),
+    date_from: Optional[date] = Query(
+        None, alias="from", description="Rank on mean availability from this date"
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="Rank on mean availability up to this date"
+    ),
+    last: Optional[int] = Query(
+        None, ge=1, description="Only the last N dates (within from/to if given)"
+    ),
+    limit: int = Query(20, ge=1, le=RANKINGS_MAX_K),
+):
+    """
+    Loaded port pairs between ports near the POL and ports near the POD.
+
+    Example: /port-pairs/NLRTM-CNSHA/alternatives?km=150&from=2025-11-01
+
+    Candidates pair the POL or any location within km of it with the POD
+    or any location within km of it. Needs port coordinates: 503 if none
+    are loaded, 404 if the POL or POD has none. Only pairs present in the loaded data
+    are returned, ranked by mean availability over the date window (all
+    dates by default), highest first, then by the total detour in km.
+    """
+    snapshot = get_store()
+    codes = split_pair(port_pair)
+    if codes is None:
+        raise HTTPException(
+            status_code=400, detail=f"Invalid port pair '{port_pair}', expected POL-POD"
+        )
+    columns = resolve_columns(snapshot, date_from, date_to, last)
+    if columns.start == columns.stop:
+        raise HTTPException(
+            status_code=400, detail="No date columns in the requested range"
+        )
+
+    directory = located_directory()
+    pol, pod = (normalize_code(code) for code in codes)
+    near_pols = nearby_codes(directory, pol, km)
+    near_pods = nearby_codes(directory, pod, km)
+    rows = snapshot.lanes_between(near_pols, near_pods)
+    scores = row_means(snapshot.values[rows, columns])
+    pols = [snapshot.pols[row] for row in rows.tolist()]
+    pods = [snapshot.pods[row] for row in rows.tolist()]
+    pol_km = np.array([near_pols[code] for code in pols], dtype=np.float64)
+    pod_km = np.array([near_pods[code] for code in pods], dtype=np.float64)
+    detour = pol_km + pod_km
+
+    original = np.array([a == pol and b == pod for a, b in zip(pols, pods)], bool)
+    availability = to_json_values(scores[original][:1])
+    rows, scores, detour = rows[~original], scores[~original], detour[~original]
+    pol_km, pod_km = pol_km[~original], pod_km[~original]
+    # Highest availability first, pairs without values last
+    order = np.lexsort((detour, np.where(np.isnan(scores), np.inf, -scores)))[:limit]
+
+    return {
+        "port_pair": port_pair,
+        "availability": availability[0] if availability else None,
+        "km": km,
+        "dates": snapshot.date_labels[columns],
+        "nearby": {"pol": len(near_pols) - 1, "pod": len(near_pods) - 1},
+        "alternatives": [
+            {
+                "port_pair": snapshot.pairs[row],
+                "pol": snapshot.pols[row],
+                "pol_city": directory.get(snapshot.pols[row], ""),
+                "pol_km": round(float(pol_km[i]), 1),
+                "pod": snapshot.pods[row],
+                "pod_city": directory.get(snapshot.pods[row], ""),
+                "pod_km": round(float(pod_km[i]), 1),
+                "availability": value,
+            }
+            for i, row, value in zip(
+                order.tolist(),
+                rows[order].tolist(),
+                to_json_values(scores[order]),
+            )
+        ],
+    }
+
+
+class PortPairBatchRequest(BaseModel):
+    port_pairs: List[str] = Field(..., description="Port pairs, e.g. ['BJCOO-BRPEC']")
+    date_from: Optional[date] = Field(
+        None, alias="from", description="First date to include (YYYY-MM-DD)"
+    )
+    date_to: Optional[date] = Field(
+        None, alias="to", description="Last date to include (YYYY-MM-DD)"
+    )
+
+
+@app.post("/port-pairs/batch")
+async def get_port_pairs_batch(batch: PortPairBatchRequest):
+    """
+    Get booking data for many port pairs in one call.
+
+    Body: {"port_pairs": ["BJCOO-BRPEC", "CNSHA-NLRTM"], "from": "2025-11-01", "to": "2025-12-31"}
+
+    Returns a shared date header and one value row per requested pair, in
+    request order. Pairs that are not loaded get a null row and are listed
+    in 'not_found'.
+    """
+    snapshot = get_store()
+
+    if len(batch.port_pairs) > BATCH_MAX_PAIRS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many port pairs: {len(batch.port_pairs)} (max {BATCH_MAX_PAIRS})",
+        )
+
+    columns = resolve_columns(snapshot, batch.date_from, batch.date_to)
+
+    matrix, found = snapshot.gather(batch.port_pairs, columns)
+    found_rows = iter(to_json_values(matrix))
+    values = [next(found_rows) if hit else None for hit in found.tolist()]
+
+    return {
+        "dates": snapshot.date_labels[columns],
+        "port_pairs": batch.port_pairs,
+        "values": values,
+        "not_found": [
+            pair for pair, hit in zip(batch.port_pairs, found.tolist()) if not hit
+        ],
+    }
+
+
+class RollupLevel(str, Enum):
+    origin = "origin"
+    destination = "destination"
+    origin_country = "origin-country"
+    destination_country = "destination-country"
+
+
+@app.get("/rollups/{level}/{code}")
+async def get_rollup(
+    level: RollupLevel,
+    code: str,
+    date_from: Optional[date] = Query(
+        None, alias="from", description="First date to include (YYYY-MM-DD)"
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="Last date to include (YYYY-MM-DD)"
+    ),
+    last: Optional[int] = Query(
+        None, ge=1, description="Only the last N dates (within from/to if given)"
+    ),
+):
+    """
+    Aggregate availability across all port pairs sharing a POL or POD.
+
+    Examples:
+    /rollups/origin/CNSHA - every pair loading at CNSHA
+    /rollups/destination/NLRTM - every pair discharging at NLRTM
+    /rollups/origin-country/CN - every pair loading in China (UN/LOCODE prefix)
+    /rollups/destination-country/BR?from=2025-11-01&to=2025-12-31
+
+    Returns per-date mean, min and max availability plus the number of pairs
+    with a value on each date. Aggregates are computed once per data load.
+    """
+    snapshot = get_store()
+    columns = resolve_columns(snapshot, date_from, date_to, last)
+
+    rollup = snapshot.rollups[level.value]
+    code = code.strip().upper()
+    group = rollup.index.get(code)
+    if group is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No port pairs found for {level.value} '{code}'",
+        )
+
+    return {
+        "level": level.value,
+        "code": code,
+        "port_pairs_count": int(rollup.pairs_count[group]),
+        "dates": snapshot.date_labels[columns],
+        "count": rollup.count[group, columns].tolist(),
+        "mean": to_json_values(rollup.mean[group, columns]),
+        "min": to_json_values(rollup.min[group, columns]),
+        "max": to_json_values(rollup.max[group, columns]),
+    }
+
+
 @app.get("/dates")
 async def get_dates() -> List[str]:
     """Get list of all available dates (column names)"""
-    if df is None:
-        raise HTTPException(
-            status_code=503, detail="Service unavailable - data not loaded"
-        )
+    snapshot = get_store()
 
-    return df.columns.tolist()
+    return snapshot.date_labels
 
 
 @app.get("/search")
-async def search_port_pairs(origin: str = None, destination: str = None):
+async def search_port_pairs(
+    origin: str = None,
+    destination: str = None,
+    limit: Optional[int] = Query(
+        None, ge=1, description="Maximum number of results (default: all)"
+    ),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+):
     """
-    Search port pairs by origin and/or destination code.
+    Search port pairs by origin and/or destination code prefix.
 
     Example: /search?origin=CIABJ or /search?destination=BRPEC
+    Paginate with limit/offset: /search?origin=CN&limit=50&offset=100
+
+    'count' is the total number of matches before pagination.
     """
-    if df is None:
-        raise HTTPException(
-            status_code=503, detail="Service unavailable - data not loaded"
-        )
+    snapshot = get_store()
 
     if not origin and not destination:
         raise HTTPException(
@@ -818,26 +769,313 @@ async def search_port_pairs(origin: str = None, destination: str = None):
             detail="Please provide at least one of 'origin' or 'destination' parameter",
         )
 
-    port_pairs = df.index.tolist()
-    filtered_pairs = []
-
-    for pair in port_pairs:
-        parts = pair.split("-")
-        if len(parts) >= 2:
-            pol = parts[0].strip()
-            pod = "-".join(parts[1:]).strip()  # Handle cases with multiple dashes
-            match = True
-            if origin and not pol.upper().startswith(origin.upper()):
-                match = False
-            if destination and not pod.upper().startswith(destination.upper()):
-                match = False
-            if match:
-                filtered_pairs.append(pair)
+    rows = snapshot.search(origin, destination)
+    page = rows[offset:] if limit is None else rows[offset : offset + limit]
+    pairs = snapshot.pairs
 
     return {
         "query": {"origin": origin, "destination": destination},
-        "results": filtered_pairs,
-        "count": len(filtered_pairs),
+        "results": [pairs[row] for row in page.tolist()],
+        "count": len(rows),
+        "offset": offset,
+        "limit": limit,
+    }
+
+
+class Comparison(str, Enum):
+    lt = "lt"
+    gt = "gt"
+    between = "between"
+
+
+class Aggregation(str, Enum):
+    any = "any"
+    all = "all"
+    mean = "mean"
+
+
+@app.get("/query")
+async def query_port_pairs(
+    op: Comparison = Query(
+        ..., description="lt (below value), gt (above value) or between value and upper"
+    ),
+    value: float = Query(..., description="Threshold, or lower bound for 'between'"),
+    upper: Optional[float] = Query(None, description="Upper bound for 'between'"),
+    aggregate: Aggregation = Query(
+        Aggregation.any,
+        description="Match pairs where any date, all dates or the window mean qualify",
+    ),
+    origin: Optional[str] = Query(None, description="POL code prefix filter"),
+    destination: Optional[str] = Query(None, description="POD code prefix filter"),
+    date_from: Optional[date] = Query(
+        None, alias="from", description="Start date (inclusive, YYYY-MM-DD)"
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="End date (inclusive, YYYY-MM-DD)"
+    ),
+    limit: int = Query(
+        100, ge=1, le=QUERY_MAX_LIMIT, description="Maximum number of results"
+    ),
+    offset: int = Query(0, ge=0, description="Number of results to skip"),
+):
+    """
+    Port pairs whose availability passes a threshold over a date window.
+
+    Examples:
+    /query?origin=CNSHA&op=lt&value=20&from=2025-11-01&to=2025-11-30
+    /query?destination=NL&op=between&value=40&upper=60&aggregate=all
+    /query?op=gt&value=90&aggregate=mean&limit=50&offset=50
+
+    'lt' and 'gt' are strict, 'between' includes both bounds. With
+    aggregate=any a pair matches if at least one date qualifies, with all
+    if every date does (missing values never qualify), with mean if its
+    mean over the window does. Each result lists the qualifying dates with
+    their values and the window mean. Pairs come back in file order;
+    'count' is the total number of matches before pagination.
+    """
+    snapshot = get_store()
+
+    if op == Comparison.between:
+        if upper is None or upper < value:
+            raise HTTPException(
+                status_code=400,
+                detail="op=between needs 'upper' greater than or equal to 'value'",
+            )
+    elif upper is not None:
+        raise HTTPException(
+            status_code=400, detail="'upper' only applies to op=between"
+        )
+
+    columns = resolve_columns(snapshot, date_from, date_to)
+    if columns.start == columns.stop:
+        raise HTTPException(
+            status_code=400, detail="No date columns in the requested range"
+        )
+    if origin or destination:
+        rows = snapshot.search(origin, destination)
+        block = snapshot.values[rows, columns]
+    else:
+        rows = None
+        block = snapshot.values[:, columns]
+
+    # One boolean mask over the whole block, reduced per pair
+    mask = threshold_mask(block, op.value, value, upper)
+    if aggregate == Aggregation.any:
+        matched = mask.any(axis=1)
+    elif aggregate == Aggregation.all:
+        matched = mask.all(axis=1)
+    else:
+        matched = threshold_mask(row_means(block), op.value, value, upper)
+    hits = np.flatnonzero(matched)
+    page = hits[offset : offset + limit]
+
+    # Qualifying cells of the page, grouped back per pair
+    page_block = block[page]
+    cell_rows, cell_columns = np.nonzero(mask[page])
+    cells = to_json_values(page_block[cell_rows, cell_columns])
+    cell_columns = cell_columns.tolist()
+    bounds = np.searchsorted(cell_rows, np.arange(len(page) + 1)).tolist()
+    labels = snapshot.date_labels[columns]
+    dates = [
+        [
+            {labels[column]: cell}
+            for column, cell in zip(cell_columns[start:end], cells[start:end])
+        ]
+        for start, end in zip(bounds, bounds[1:])
+    ]
+    page_rows = page if rows is None else rows[page]
+
+    return {
+        "query": {
+            "op": op.value,
+            "value": value,
+            "upper": upper,
+            "aggregate": aggregate.value,
+            "origin": origin,
+            "destination": destination,
+            "from": date_from,
+            "to": date_to,
+        },
+        "dates": labels,
+        "results": [
+            {"port_pair": snapshot.pairs[row], "mean": mean, "dates": pair_dates}
+            for row, mean, pair_dates in zip(
+                page_rows.tolist(), to_json_values(row_means(page_block)), dates
+            )
+        ],
+        "count": len(hits),
+        "offset": offset,
+        "limit": limit,
+    }
+
+
+class RankingOrder(str, Enum):
+    highest = "highest"
+    lowest = "lowest"
+
+
+def scoring_columns(
+    snapshot: AvailabilityStore,
+    date_on: Optional[date],
+    date_from: Optional[date],
+    date_to: Optional[date],
+) -> slice:
+    """Columns to score pairs on: the column covering 'date', or a from/to window"""
+    if date_on is not None and (date_from is not None or date_to is not None):
+        raise HTTPException(
+            status_code=400,
+            detail="Provide either 'date' or a 'from'/'to' range, not both",
+        )
+    if date_on is not None:
+        column = snapshot.column_for(date_on)
+        if column is None:
+            raise HTTPException(
+                status_code=400, detail=f"No date column covers {date_on}"
+            )
+        return slice(column, column + 1)
+    if date_from is not None or date_to is not None:
+        columns = resolve_columns(snapshot, date_from, date_to)
+        if columns.start == columns.stop:
+            raise HTTPException(
+                status_code=400, detail="No date columns in the requested range"
+            )
+        return columns
+    raise HTTPException(
+        status_code=400,
+        detail="Please provide 'date' or a 'from'/'to' range",
+    )
+
+
+@app.get("/rankings")
+async def get_rankings(
+    date_on: Optional[date] = Query(
+        None,
+        alias="date",
+        description="Rank on the date column covering this day (YYYY-MM-DD)",
+    ),
+    date_from: Optional[date] = Query(
+        None, alias="from", description="Rank on mean availability from this date"
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="Rank on mean availability up to this date"
+    ),
+    k: int = Query(
+        50, ge=1, le=RANKINGS_MAX_K, description="Number of port pairs to return"
+    ),
+    order: RankingOrder = Query(
+        RankingOrder.highest, description="Return the highest or lowest availability"
+    ),
+    origin: Optional[str] = Query(None, description="POL code prefix filter"),
+    destination: Optional[str] = Query(None, description="POD code prefix filter"),
+):
+    """
+    Top-K port pairs by availability on a date or across a date range.
+
+    Examples:
+    /rankings?date=2025-11-17&k=50
+    /rankings?date=2025-11-17&k=20&order=lowest&origin=CN
+    /rankings?from=2025-11-01&to=2025-11-30&destination=NLRTM
+
+    With 'date' the pairs are ranked on the date column covering that day
+    (the last column on or before it, if the day is within one column period
+    of it; 400 otherwise). With from/to they are ranked on their mean
+    availability over the window. Pairs without a value are skipped.
+    Uses partial selection, so only the returned K are sorted.
+    """
+    snapshot = get_store()
+
+    columns = scoring_columns(snapshot, date_on, date_from, date_to)
+    if origin or destination:
+        rows = snapshot.search(origin, destination)
+        block = snapshot.values[rows, columns]
+    else:
+        rows = None
+        block = snapshot.values[:, columns]
+
+    scores = row_means(block)
+    best = top_k(scores, k, largest=order == RankingOrder.highest)
+    best_rows = best if rows is None else rows[best]
+    values = to_json_values(scores[best])
+
+    return {
+        "query": {
+            "date": date_on,
+            "from": date_from,
+            "to": date_to,
+            "origin": origin,
+            "destination": destination,
+            "order": order.value,
+            "k": k,
+        },
+        "dates": snapshot.date_labels[columns],
+        "results": [
+            {"port_pair": snapshot.pairs[row], "availability": value}
+            for row, value in zip(best_rows.tolist(), values)
+        ],
+        "candidates": int(np.count_nonzero(~np.isnan(scores))),
+    }
+
+
+@app.get("/routes")
+async def get_routes(
+    origin: str = Query(..., min_length=1, description="POL code, e.g. CNSHA"),
+    destination: str = Query(..., min_length=1, description="POD code, e.g. NLRTM"),
+    date_on: Optional[date] = Query(
+        None,
+        alias="date",
+        description="Weigh lanes on the date column covering this day (YYYY-MM-DD)",
+    ),
+    date_from: Optional[date] = Query(
+        None,
+        alias="from",
+        description="Weigh lanes on mean availability from this date",
+    ),
+    date_to: Optional[date] = Query(
+        None, alias="to", description="Weigh lanes on mean availability up to this date"
+    ),
+    max_hops: int = Query(
+        2, ge=0, le=2, description="Most transshipment hubs on a route"
+    ),
+    limit: int = Query(10, ge=1, le=RANKINGS_MAX_K),
+):
+    """
+    Routes from origin to destination, direct or via one or two hubs.
+
+    Examples:
+    /routes?origin=CNSHA&destination=NLRTM&date=2025-11-17
+    /routes?origin=CNSHA&destination=NLRTM&from=2025-11-01&to=2025-11-30&max_hops=1
+
+    Each lane weighs its availability on the date (or its mean over the
+    from/to window), and a route is as available as its weakest leg.
+    Routes are ranked on that, then on fewer hubs. Only loaded port pairs
+    are used as legs.
+    """
+    snapshot = get_store()
+    columns = scoring_columns(snapshot, date_on, date_from, date_to)
+    routes = find_routes(snapshot, origin, destination, columns, max_hops, limit)
+    if routes is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"'{origin}' or '{destination}' is not in any loaded port pair",
+        )
+    return {
+        "origin": origin.upper(),
+        "destination": destination.upper(),
+        "dates": snapshot.date_labels[columns],
+        "max_hops": max_hops,
+        "routes": [
+            {
+                "hubs": route.ports[1:-1],
+                "availability": to_json_values(np.array([route.availability]))[0],
+                "legs": [
+                    {"port_pair": snapshot.pairs[row], "availability": value}
+                    for row, value in zip(
+                        route.rows, to_json_values(np.array(route.legs))
+                    )
+                ],
+            }
+            for route in routes
+        ],
     }
 
 
@@ -866,7 +1104,7 @@ async def port_to_city(
 
     If a single string is provided, returns just the city name as a string.
     If multiple values are provided (array), returns an array of city names (strings).
-    Unknown ports will return "Unknown".
+    Unknown ports return an empty string; empty codes in an array are skipped.
     Special value "none" (case-insensitive) returns an empty string.
 
     Examples:
@@ -883,70 +1121,352 @@ async def port_to_city(
       Returns: ""
     """
 
-    # Handle special case: 'none' returns empty string
-    if isinstance(ports, str) and ports.lower() == "none":
-        return {"cities": ""}
+    port_list = parse_ports_param(ports)
 
-    # Handle different input formats
-    port_list = []
+    if len(port_list) == 1:
+        # Single port - return just the city name as a string
+        port_upper = normalize_code(port_list[0])
+        if port_upper == "NONE":
+            return {"cities": ""}
+        return {"cities": port_directory().get(port_upper, "")}
 
-    print(f"DEBUG - Received ports: {ports}")
-    print(f"DEBUG - Type: {type(ports)}")
+    # Multiple ports - return array of city names, skipping empty codes
+    cities = lookup_cities(port_list, port_directory())
+    return {"cities": [city for city in cities if city is not None]}
 
-    if isinstance(ports, str):
-        # Check if it's a JSON array string
-        if ports.startswith("[") and ports.endswith("]"):
-            print(f"DEBUG - Detected JSON array string")
-            try:
-                # Parse JSON array
-                port_list = json.loads(ports)
-                print(f"DEBUG - Successfully parsed: {port_list}")
-                if not isinstance(port_list, list):
-                    port_list = [ports]
-            except json.JSONDecodeError as e:
-                # If parsing fails, treat as single port
-                print(f"DEBUG - JSON parsing failed: {e}")
-                port_list = [ports]
-        else:
-            # Single port string
-            print(f"DEBUG - Single port string")
-            port_list = [ports]
-    else:
-        # Already a list (from multiple query params or FastAPI parsing)
-        print(f"DEBUG - Already a list")
-        # Check if it's a list with one element that's a JSON string
-        if (
-            len(ports) == 1
-            and isinstance(ports[0], str)
-            and ports[0].startswith("[")
-            and ports[0].endswith("]")
-        ):
-            print(f"DEBUG - List contains one JSON string element, parsing it")
-            try:
-                port_list = json.loads(ports[0])
-                print(f"DEBUG - Successfully parsed from list element: {port_list}")
-            except json.JSONDecodeError as e:
-                print(f"DEBUG - JSON parsing from list element failed: {e}")
-                port_list = ports
-        else:
-            port_list = ports
 
-    print(f"DEBUG - Final port_list: {port_list}, length: {len(port_list)}")
+class PortToCityBatchRequest(BaseModel):
+    ports: List[str] = Field(..., description="Port codes, e.g. ['CNYTN', 'NLRTM']")
+
+
+@app.post("/port-to-city/batch")
+async def port_to_city_batch(batch: PortToCityBatchRequest):
+    """
+    Convert many port codes to city names in one call.
+
+    Body: {"ports": ["CNYTN", "NLRTM", "CNYTN"]}
+
+    Returns one city per code in input order ("" for unknown or blank
+    codes) and the distinct unknown codes in 'not_found'. Repeated codes
+    are resolved once.
+    """
+    if len(batch.ports) > PORT_TO_CITY_BATCH_MAX:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many ports: {len(batch.ports)} (max {PORT_TO_CITY_BATCH_MAX})",
+        )
+    directory = port_directory()
+    cities = lookup_cities(batch.ports, directory)
+    return {
+        "cities": [city or "" for city in cities],
+        "not_found": unknown_codes(batch.ports, directory),
+    }
+
+
+@app.get("/ports/search")
+async def search_ports(
+    q: str = Query(..., min_length=1, description="City name or code, or its start"),
+    limit: int = Query(10, ge=1, le=PORTS_SEARCH_MAX_LIMIT),
+):
+    """
+    Find locations by city name or code.
+
+    Ranks an exact code, exact city names, city names starting with q,
+    codes starting with q, then city names within one or two typos of
+    starting with q. Accents and case are ignored.
+
+    Example: /ports/search?q=rotter
+    """
+    return {"query": q, "results": port_directory().search(q, limit)}
+
+
+@app.get("/ports/by-city")
+async def ports_by_city(
+    city: str = Query(..., min_length=1, description="City name, e.g. 'Rotterdam'")
+):
+    """Every code whose location is named city (accents and case ignored)"""
+    return {"city": city, "ports": port_directory().codes_for(city)}
+
+
+@app.get("/ports/{code}/nearby")
+async def get_nearby_ports(
+    code: str,
+    km: float = Query(150, gt=0, le=PORTS_NEARBY_MAX_KM, description="Radius in km"),
+    limit: int = Query(20, ge=1, le=PORTS_SEARCH_MAX_LIMIT),
+):
+    """
+    Locations within km of a port, nearest first.
+
+    Example: /ports/NLRTM/nearby?km=150
+
+    Needs coordinates, which come from the UN/LOCODE code list compiled
+    into the port directory (see compile_ports.py): 503 if none are loaded.
+    """
+    directory = located_directory()
+    row = directory.row_of(code)
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Unknown port code '{code}'")
+    position = directory.coordinates(row)
+    if position is None:
+        raise HTTPException(
+            status_code=404, detail=f"No coordinates known for '{code}'"
+        )
+    return {
+        "code": directory.code(row),
+        "city": directory.name(row),
+        "lat": round(position[0], 4),
+        "lon": round(position[1], 4),
+        "km": km,
+        "results": [
+            {
+                "code": directory.code(other),
+                "city": directory.name(other),
+                "country": directory.code(other)[:2],
+                "distance_km": round(distance, 1),
+            }
+            for other, distance in directory.nearby(row, km, limit)
+        ],
+    }
 
-    # Process the ports
-    if len(port_list) == 1:
-        # Single port - return just the city name as a string
-        port_upper = port_list[0].strip().upper()
-        return {"cities": PORT_TO_CITY.get(port_upper, "")}
-    else:
-        # Multiple ports - return array of city names
-        result = []
-        for port_code in port_list:
-            port_upper = port_code.strip().upper()
-            if port_upper:  # Skip empty strings
-                result.append(PORT_TO_CITY.get(port_upper, ""))
-        print(result)
-        return {"cities": result}
+
+def upstream_http_exception(e: Exception) -> HTTPException:
+    """Map a failed CMA CGM call to the HTTPException returned to the caller"""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, UpstreamUnavailable):
+        return HTTPException(
+            status_code=503,
+            detail=f"CMA CGM API temporarily unavailable: {str(e)}",
+            headers={"Retry-After": str(max(1, round(e.retry_after)))},
+        )
+    if isinstance(e, httpx.HTTPStatusError):
+        return HTTPException(
+            status_code=e.response.status_code,
+            detail=f"CMA CGM API error: {e.response.text}",
+        )
+    if isinstance(e, httpx.RequestError):
+        return HTTPException(
+            status_code=503, detail=f"Failed to connect to CMA CGM API: {str(e)}"
+        )
+    return HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+def resolve_bearer_token(token: Optional[str]) -> str:
+    """Get token from parameter or environment variable, 401 if neither is set"""
+    bearer_token = token or os.environ.get("CMA_CGM_TOKEN")
+    if not bearer_token:
+        raise HTTPException(
+            status_code=401,
+            detail="No authentication token provided. Use 'token' parameter or set CMA_CGM_TOKEN environment variable.",
+        )
+    return bearer_token
+
+
+def parse_equipments(requested_equipments: str) -> List:
+    """Parse the requestedEquipments JSON string, 400 if it is malformed"""
+    try:
+        return json.loads(requested_equipments)
+    except json.JSONDecodeError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid requestedEquipments format. Must be a valid JSON array.",
+        )
+
+
+def spoton_payload(
+    port_of_loading: str,
+    port_of_discharge: str,
+    departure_date: str,
+    requested_equipments: List,
+) -> Dict:
+    """Build the SpotOn search request payload"""
+    return {
+        "departureDate": departure_date,
+        "portOfLoading": port_of_loading,
+        "portOfDischarge": port_of_discharge,
+        "locationCodificationType": "UNLOCODE",
+        "spotDDSMConditionsOnly": False,
+        "requestedEquipments": requested_equipments,
+    }
+
+
+def quote_cache_key(payload: Dict, behalf_of: str, bearer_token: str) -> str:
+    """
+    Cache key for a SpotOn search: the normalized payload and behalfOf.
+
+    Port codes are upper-cased and JSON keys sorted so equivalent requests
+    share an entry. The token is hashed into the key so a cached quote is
+    only served to callers presenting the same credentials.
+    """
+    normalized = {
+        **payload,
+        "portOfLoading": payload["portOfLoading"].strip().upper(),
+        "portOfDischarge": payload["portOfDischarge"].strip().upper(),
+        "departureDate": payload["departureDate"].strip(),
+        "behalfOf": behalf_of.strip(),
+        "token": hashlib.sha256(bearer_token.encode("utf-8")).hexdigest(),
+    }
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+def aggregation_metadata(
+    paginator: Paginator, total_items: int, elapsed_time: float, status="complete"
+) -> Dict:
+    """Proxy response metadata for a pagination run"""
+    print(f"Total aggregation time: {elapsed_time:.2f}s, Total items: {total_items}")
+    return {
+        "total_items": total_items,
+        "aggregation_time_seconds": round(elapsed_time, 2),
+        "initial_content_range": paginator.content_range,
+        "cma_func_explain": paginator.cma_func_explain,
+        "status": status,
+        "pagination": paginator.stats(),
+    }
+
+
+def aggregated_response(paginator: Paginator, data: List, elapsed_time: float) -> Dict:
+    """Proxy response body for a completed pagination run"""
+    return {
+        "data": data,
+        "metadata": aggregation_metadata(paginator, len(data), elapsed_time),
+    }
+
+
+def ndjson_line(value) -> bytes:
+    return json.dumps(value, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def stream_result(result: Dict, **extra_metadata) -> StreamingResponse:
+    """Stream an already aggregated proxy result as NDJSON"""
+
+    async def body():
+        for item in result["data"]:
+            yield ndjson_line(item)
+        yield ndjson_line({"metadata": {**result["metadata"], **extra_metadata}})
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+
+async def stream_pages(
+    paginator: Paginator,
+    on_complete: Optional[Callable[[Dict], None]] = None,
+    max_buffered: int = STREAM_CACHE_MAX_ITEMS,
+    **extra_metadata,
+) -> StreamingResponse:
+    """
+    Stream a pagination run as NDJSON: one line per item as each page lands.
+
+    The last line is {"metadata": {...}}. The first page is awaited before
+    the response starts, so upstream errors on it still map to a proper HTTP
+    status; a later page failing ends the stream with status "error" in the
+    metadata line. Items are only kept in memory when on_complete needs the
+    aggregated result (e.g. to fill a cache), and only up to max_buffered
+    items: past that, buffering stops and on_complete is not called, so a
+    large result is streamed in bounded memory and simply not cached.
+    """
+    start_time = time.time()
+    pages = paginator.pages()
+    try:
+        first_page = await pages.__anext__()
+    except StopAsyncIteration:
+        first_page = (0, [])
+    except Exception as e:
+        await pages.aclose()
+        raise upstream_http_exception(e)
+
+    async def body():
+        collected = (
+            [first_page] if on_complete and len(first_page[1]) <= max_buffered else None
+        )
+        total_items = len(first_page[1])
+        try:
+            for item in first_page[1]:
+                yield ndjson_line(item)
+            async for start, items in pages:
+                total_items += len(items)
+                if collected is not None:
+                    if total_items > max_buffered:
+                        collected = None
+                    else:
+                        collected.append((start, items))
+                for item in items:
+                    yield ndjson_line(item)
+        except Exception as e:
+            error = upstream_http_exception(e)
+            metadata = aggregation_metadata(
+                paginator, total_items, time.time() - start_time, status="error"
+            )
+            metadata["error"] = {
+                "status_code": error.status_code,
+                "detail": error.detail,
+            }
+            yield ndjson_line({"metadata": {**metadata, **extra_metadata}})
+            return
+        finally:
+            await pages.aclose()
+
+        elapsed_time = time.time() - start_time
+        metadata = aggregation_metadata(paginator, total_items, elapsed_time)
+        if collected is not None:
+            collected.sort(key=lambda page: page[0])
+            data = [item for _, items in collected for item in items]
+            on_complete({"data": data, "metadata": metadata})
+        yield ndjson_line({"metadata": {**metadata, **extra_metadata}})
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def cache_streamed(
+    cache: SingleFlightCache, key: str, fetch: Callable, lane: str, result: Dict
+) -> None:
+    """Cache a completed streamed result and let the prefetcher refresh it"""
+    cache.put(key, result)
+    prefetcher.succeeded(cache, key, fetch, lane)
+
+
+def spoton_lane(payload: Dict) -> str:
+    return f"spoton:{payload['portOfLoading']}-{payload['portOfDischarge']}".upper()
+
+
+def spoton_paginator(payload: Dict, behalf_of: str, bearer_token: str) -> Paginator:
+    """Paginator over the SpotOn search results for one payload"""
+    params = {"behalfOf": behalf_of}
+    headers = {
+        "Authorization": f"Bearer {bearer_token}",
+        "Content-Type": "application/json",
+    }
+    client = get_http_client()
+
+    async def make_request(range_header: str):
+        """Helper function to make a single request with a specific range."""
+        response = await upstream_governor.send(
+            SPOTON_SEARCH_URL,
+            lambda: client.post(
+                SPOTON_SEARCH_URL,
+                params=params,
+                headers={**headers, "Range": range_header},
+                json=payload,
+            ),
+        )
+        response.raise_for_status()
+        return response
+
+    return Paginator(make_request, spoton_lane(payload))
+
+
+async def fetch_spoton_quotes(payload: Dict, behalf_of: str, bearer_token: str) -> Dict:
+    """
+    Run one SpotOn search against CMA CGM and aggregate every result page.
+
+    Raises httpx errors; callers map them with upstream_http_exception().
+    """
+    start_time = time.time()
+    paginator = spoton_paginator(payload, behalf_of, bearer_token)
+    data = await paginator.fetch_all()
+    return aggregated_response(paginator, data, time.time() - start_time)
 
 
 @app.get("/proxy")
@@ -963,6 +1483,10 @@ async def proxy_spoton_request(
         None,
         description="Optional Bearer token (if not provided, uses environment variable)",
     ),
+    stream: bool = Query(
+        False,
+        description="Stream results as NDJSON as each page arrives, metadata last",
+    ),
 ):
     """
     Proxy endpoint to query CMA CGM SpotOn API with automatic pagination.
@@ -970,144 +1494,320 @@ async def proxy_spoton_request(
     Makes POST requests to the CMA CGM API and aggregates all results in parallel.
     If there are multiple pages of results, fetches them concurrently for better performance.
 
+    Aggregated quotes are cached for QUOTE_CACHE_TTL seconds per normalized
+    search, and identical concurrent searches share one upstream fetch.
+    metadata.cache reports the hit, the age of the data and coalescing.
+
+    With stream=true the response is NDJSON: one line per quote as soon as
+    its page arrives, then a final {"metadata": {...}} line.
+
     Example:
     /proxy?portOfLoading=ESBIO&portOfDischarge=BRSSZ&departureDate=2025-11-15&requestedEquipments=[{"numberOfContainers":5,"weightPerContainer":18000,"equipmentGroupIsoCode":"40GP"}]&behalfOf=API0001734
     """
-    import concurrent.futures
-    import time
+    equipment_list = parse_equipments(requestedEquipments)
+
+    bearer_token = resolve_bearer_token(token)
+
+    # Build the request payload
+    payload = spoton_payload(
+        portOfLoading, portOfDischarge, departureDate, equipment_list
+    )
+
+    key = quote_cache_key(payload, behalfOf, bearer_token)
+
+    def fetch():
+        return fetch_spoton_quotes(payload, behalfOf, bearer_token)
+
+    fetch = prefetcher.track(quote_cache, key, fetch, spoton_lane(payload))
+
+    if stream:
+        cached = quote_cache.lookup(key, fetch)
+        if cached is not None:
+            return stream_result(cached[0], cache=cached[1])
+        return await stream_pages(
+            spoton_paginator(payload, behalfOf, bearer_token),
+            on_complete=(
+                (
+                    lambda result: cache_streamed(
+                        quote_cache, key, fetch, spoton_lane(payload), result
+                    )
+                )
+                if quote_cache.enabled
+                else None
+            ),
+            cache=cache_info(False, time.time(), coalesced=False, stale=False),
+        )
 
-    # Parse requestedEquipments JSON string
     try:
-        equipment_list = json.loads(requestedEquipments)
-    except json.JSONDecodeError:
+        result, cache = await quote_cache.get_or_fetch(key, fetch)
+    except Exception as e:
+        raise upstream_http_exception(e)
+
+    return {"data": result["data"], "metadata": {**result["metadata"], "cache": cache}}
+
+
+class ProxyLane(BaseModel):
+    portOfLoading: str = Field(..., description="Port of loading (e.g., ESBIO)")
+    portOfDischarge: str = Field(..., description="Port of discharge (e.g., BRSSZ)")
+    departureDate: str = Field(..., description="Departure date (YYYY-MM-DD)")
+    requestedEquipments: List[Dict[str, Any]] = Field(
+        ...,
+        description='e.g. [{"numberOfContainers":5,"weightPerContainer":18000,"equipmentGroupIsoCode":"40GP"}]',
+    )
+
+
+class ProxyBatchRequest(BaseModel):
+    lanes: List[ProxyLane] = Field(..., description="Searches to run")
+    behalfOf: str = Field(..., description="BehalfOf identifier (e.g., API0001734)")
+    token: Optional[str] = Field(
+        None,
+        description="Optional Bearer token (if not provided, uses environment variable)",
+    )
+
+
+@app.post("/proxy/batch")
+async def proxy_spoton_batch(batch: ProxyBatchRequest):
+    """
+    Run many SpotOn searches in one call and stream each lane's quotes as it finishes.
+
+    Body: {"behalfOf": "API0001734", "lanes": [{"portOfLoading": "ESBIO",
+    "portOfDischarge": "BRSSZ", "departureDate": "2025-11-15",
+    "requestedEquipments": [...]}, ...]}
+
+    The response is NDJSON with one line per lane in completion order:
+    {"index": i, "lane": {...}, "data": [...], "metadata": {...}}, or
+    {"index": i, "lane": {...}, "error": {...}} if that lane failed. A final
+    {"metadata": {...}} line summarizes the batch.
+
+    Every upstream page request, from this and every other proxy call, goes
+    through one scheduler capped at UPSTREAM_MAX_IN_FLIGHT requests that
+    hands out slots round-robin across lanes. At most
+    PROXY_BATCH_LANE_CONCURRENCY lanes of a batch run at once so early lanes
+    finish early. Lanes share the /proxy quote cache.
+    """
+    if len(batch.lanes) > PROXY_BATCH_MAX_LANES:
         raise HTTPException(
             status_code=400,
-            detail="Invalid requestedEquipments format. Must be a valid JSON array.",
+            detail=f"Too many lanes: {len(batch.lanes)} (max {PROXY_BATCH_MAX_LANES})",
         )
+    bearer_token = resolve_bearer_token(batch.token)
+    start_time = time.time()
+    lane_slots = asyncio.Semaphore(max(1, PROXY_BATCH_LANE_CONCURRENCY))
+
+    async def run_lane(index: int, lane: ProxyLane) -> Dict:
+        payload = spoton_payload(
+            lane.portOfLoading,
+            lane.portOfDischarge,
+            lane.departureDate,
+            lane.requestedEquipments,
+        )
+        key = quote_cache_key(payload, batch.behalfOf, bearer_token)
+        line = {"index": index, "lane": lane.model_dump()}
+        async with lane_slots:
+            try:
+                result, cache = await quote_cache.get_or_fetch(
+                    key,
+                    lambda: fetch_spoton_quotes(payload, batch.behalfOf, bearer_token),
+                )
+            except Exception as e:
+                error = upstream_http_exception(e)
+                line["error"] = {
+                    "status_code": error.status_code,
+                    "detail": error.detail,
+                }
+                return line
+        line["data"] = result["data"]
+        line["metadata"] = {**result["metadata"], "cache": cache}
+        return line
+
+    async def body():
+        # Started here so the lanes live exactly as long as the response body
+        tasks = [
+            asyncio.ensure_future(run_lane(index, lane))
+            for index, lane in enumerate(batch.lanes)
+        ]
+        failed = 0
+        try:
+            for finished in asyncio.as_completed(tasks):
+                line = await finished
+                failed += "error" in line
+                yield ndjson_line(line)
+        finally:
+            for task in tasks:
+                task.cancel()
 
-    # Get token from parameter or environment variable
-    bearer_token = token or os.environ.get("CMA_CGM_TOKEN")
-    if not bearer_token:
+        elapsed_time = time.time() - start_time
+        print(
+            f"Batch of {len(tasks)} lanes done in {elapsed_time:.2f}s, {failed} failed"
+        )
+        yield ndjson_line(
+            {
+                "metadata": {
+                    "lanes": len(tasks),
+                    "succeeded": len(tasks) - failed,
+                    "failed": failed,
+                    "aggregation_time_seconds": round(elapsed_time, 2),
+                    "scheduler": upstream_scheduler.stats(),
+                }
+            }
+        )
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
+
+
+@app.get("/proxy/calendar")
+async def proxy_spoton_calendar(
+    portOfLoading: str = Query(..., description="Port of loading (e.g., ESBIO)"),
+    portOfDischarge: str = Query(..., description="Port of discharge (e.g., BRSSZ)"),
+    date_from: date = Query(
+        ..., alias="from", description="First departure date (YYYY-MM-DD)"
+    ),
+    date_to: date = Query(
+        ..., alias="to", description="Last departure date (YYYY-MM-DD)"
+    ),
+    requestedEquipments: str = Query(
+        ...,
+        description='JSON array of equipment requests, e.g., [{"numberOfContainers":5,"weightPerContainer":18000,"equipmentGroupIsoCode":"40GP"}]',
+    ),
+    behalfOf: str = Query(..., description="BehalfOf identifier (e.g., API0001734)"),
+    token: Optional[str] = Query(
+        None,
+        description="Optional Bearer token (if not provided, uses environment variable)",
+    ),
+):
+    """
+    Price calendar for one lane: a SpotOn search per departure date in from..to.
+
+    The per-date searches run concurrently through the same paginated,
+    cached path as /proxy. Offers returned under several dates are listed
+    once, with the dates they appeared under, sorted by price.
+
+    Returns 'calendar' (per date: offer count and minimum price, or the
+    error for that date), 'offers' and 'metadata'. Fails only if every
+    date fails.
+
+    Example:
+    /proxy/calendar?portOfLoading=ESBIO&portOfDischarge=BRSSZ&from=2025-11-01&to=2025-12-15&requestedEquipments=[{"numberOfContainers":1,"equipmentGroupIsoCode":"40GP"}]&behalfOf=API0001734
+    """
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="'to' must not be before 'from'")
+    days = (date_to - date_from).days + 1
+    if days > PROXY_CALENDAR_MAX_DAYS:
         raise HTTPException(
-            status_code=401,
-            detail="No authentication token provided. Use 'token' parameter or set CMA_CGM_TOKEN environment variable.",
+            status_code=400,
+            detail=f"Date window too long: {days} days (max {PROXY_CALENDAR_MAX_DAYS})",
         )
+    equipment_list = parse_equipments(requestedEquipments)
+    bearer_token = resolve_bearer_token(token)
+    start_time = time.time()
 
-    # Build the request payload
-    payload = {
-        "departureDate": departureDate,
-        "portOfLoading": portOfLoading,
-        "portOfDischarge": portOfDischarge,
-        "locationCodificationType": "UNLOCODE",
-        "spotDDSMConditionsOnly": False,
-        "requestedEquipments": equipment_list,
+    async def search(day: str):
+        payload = spoton_payload(portOfLoading, portOfDischarge, day, equipment_list)
+        key = quote_cache_key(payload, behalfOf, bearer_token)
+        return await quote_cache.get_or_fetch(
+            key, lambda: fetch_spoton_quotes(payload, behalfOf, bearer_token)
+        )
+
+    dates = [(date_from + timedelta(days=i)).isoformat() for i in range(days)]
+    outcomes = await asyncio.gather(
+        *(search(day) for day in dates), return_exceptions=True
+    )
+
+    results = {}
+    errors = {}
+    cache_hits = 0
+    for day, outcome in zip(dates, outcomes):
+        if isinstance(outcome, BaseException):
+            errors[day] = upstream_http_exception(outcome)
+            continue
+        result, cache = outcome
+        results[day] = result["data"]
+        cache_hits += cache["hit"]
+    if not results:
+        raise next(iter(errors.values()))
+
+    merged = merge_offers(results)
+    calendar = {entry["departure_date"]: entry for entry in merged["calendar"]}
+    for day, error in errors.items():
+        calendar[day] = {
+            "departure_date": day,
+            "offer_count": 0,
+            "min_price": None,
+            "error": {"status_code": error.status_code, "detail": error.detail},
+        }
+
+    elapsed_time = time.time() - start_time
+    total_offers = sum(len(offers) for offers in results.values())
+    print(
+        f"Calendar {portOfLoading}-{portOfDischarge}: {days} dates, "
+        f"{len(merged['offers'])} unique offers in {elapsed_time:.2f}s"
+    )
+    return {
+        "calendar": [calendar[day] for day in dates],
+        "offers": merged["offers"],
+        "metadata": {
+            "dates": days,
+            "failed_dates": len(errors),
+            "total_offers": total_offers,
+            "unique_offers": len(merged["offers"]),
+            "cache_hits": cache_hits,
+            "aggregation_time_seconds": round(elapsed_time, 2),
+        },
     }
 
-    url = "https://apis.cma-cgm.net/pricing/commercial/instantquote/v2/spotOn/search"
-    params = {"behalfOf": behalfOf}
 
-    def make_request(range_header: str):
+def schedule_cache_key(params: Dict, bearer_token: str) -> str:
+    """
+    Cache key for a Route API search: the normalized query params.
+
+    As with quotes, the token is hashed into the key so cached routings are
+    only served to callers presenting the same credentials.
+    """
+    normalized = {
+        **params,
+        "placeOfLoading": params["placeOfLoading"].strip().upper(),
+        "placeOfDischarge": params["placeOfDischarge"].strip().upper(),
+        "token": hashlib.sha256(bearer_token.encode("utf-8")).hexdigest(),
+    }
+    return json.dumps(normalized, sort_keys=True, separators=(",", ":"))
+
+
+def schedule_lane(params: Dict) -> str:
+    return f"schedule:{params['placeOfLoading']}-{params['placeOfDischarge']}".upper()
+
+
+def schedule_paginator(params: Dict, bearer_token: str) -> Paginator:
+    """Paginator over the Route API routings for one set of query params"""
+    headers = {
+        "Authorization": f"Bearer {bearer_token}",
+        "Content-Type": "application/json",
+    }
+    client = get_http_client()
+
+    async def make_request(range_header: str):
         """Helper function to make a single request with a specific range."""
-        headers = {
-            "Authorization": f"Bearer {bearer_token}",
-            "Range": range_header,
-            "Content-Type": "application/json",
-        }
-        response = requests.post(
-            url, params=params, headers=headers, json=payload, timeout=30
+        response = await upstream_governor.send(
+            ROUTINGS_URL,
+            lambda: client.get(
+                ROUTINGS_URL, params=params, headers={**headers, "Range": range_header}
+            ),
         )
         response.raise_for_status()
         return response
 
-    start_time = time.time()
-
-    try:
-        # Make initial request to get first page and determine total results
-        print(f"Making initial request with Range: 0-4")
-        initial_response = make_request("0-4")
-
-        all_data = initial_response.json()
-        content_range = initial_response.headers.get("content-range")
-        status_code = initial_response.status_code
-        cma_func_explain = initial_response.headers.get("cma-func-explain")
-
-        print(f"Initial response: status={status_code}, content-range={content_range}")
-
-        # Check if there are more pages (status 206 = Partial Content)
-        if status_code == 206 and content_range:
-            # Parse content-range header: "0-4/15" means items 0-4 out of 15 total
-            parts = content_range.split("/")
-            if len(parts) == 2:
-                total_items = int(parts[1])
-                current_end = int(parts[0].split("-")[1])
-
-                print(f"Total items: {total_items}, got up to: {current_end}")
-
-                # Calculate remaining ranges to fetch (5 items per request)
-                remaining_ranges = []
-                start = current_end + 1
-                while start < total_items:
-                    end = min(
-                        start + 4, total_items - 1
-                    )  # Max 5 items per request (0-4)
-                    remaining_ranges.append(f"{start}-{end}")
-                    start = end + 1
-
-                print(
-                    f"Need to fetch {len(remaining_ranges)} more pages: {remaining_ranges}"
-                )
+    return Paginator(make_request, schedule_lane(params))
 
-                # Fetch remaining pages in parallel
-                if remaining_ranges:
-                    with concurrent.futures.ThreadPoolExecutor(
-                        max_workers=5
-                    ) as executor:
-                        future_to_range = {
-                            executor.submit(make_request, range_header): range_header
-                            for range_header in remaining_ranges
-                        }
-
-                        for future in concurrent.futures.as_completed(future_to_range):
-                            range_header = future_to_range[future]
-                            try:
-                                response = future.result()
-                                page_data = response.json()
-                                all_data.extend(page_data)
-                                print(
-                                    f"Fetched range {range_header}: {len(page_data)} items"
-                                )
-                            except Exception as e:
-                                print(f"Error fetching range {range_header}: {e}")
-                                raise
 
-        elapsed_time = time.time() - start_time
-        print(
-            f"Total aggregation time: {elapsed_time:.2f}s, Total items: {len(all_data)}"
-        )
-
-        # Return aggregated results with metadata
-        return {
-            "data": all_data,
-            "metadata": {
-                "total_items": len(all_data),
-                "aggregation_time_seconds": round(elapsed_time, 2),
-                "initial_content_range": content_range,
-                "cma_func_explain": cma_func_explain,
-                "status": "complete",
-            },
-        }
+async def fetch_schedule(params: Dict, bearer_token: str) -> Dict:
+    """
+    Run one Route API search against CMA CGM and aggregate every result page.
 
-    except requests.exceptions.HTTPError as e:
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail=f"CMA CGM API error: {e.response.text}",
-        )
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(
-            status_code=503, detail=f"Failed to connect to CMA CGM API: {str(e)}"
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    Raises httpx errors; callers map them with upstream_http_exception().
+    """
+    start_time = time.time()
+    paginator = schedule_paginator(params, bearer_token)
+    data = await paginator.fetch_all()
+    return aggregated_response(paginator, data, time.time() - start_time)
 
 
 @app.get("/proxy-schedule")
@@ -1126,6 +1826,10 @@ async def proxy_schedule_request(
         None,
         description="Optional Bearer token (if not provided, uses environment variable)",
     ),
+    stream: bool = Query(
+        False,
+        description="Stream results as NDJSON as each page arrives, metadata last",
+    ),
 ):
     """
     Proxy endpoint to query CMA CGM Route API for schedule/routing information with automatic pagination.
@@ -1137,19 +1841,18 @@ async def proxy_schedule_request(
     /proxy-schedule?placeOfLoading=ESBIO&placeOfDischarge=BRSSZ
     /proxy-schedule?placeOfLoading=CNSHA&placeOfDischarge=NLRTM&departureDate=2025-11-15
     /proxy-schedule?placeOfLoading=CNSHA&placeOfDischarge=NLRTM&departureDate=2025-11-15&arrivalDate=2025-12-31
-    """
-    import concurrent.futures
-    import time
 
-    # Get token from parameter or environment variable
-    bearer_token = token or os.environ.get("CMA_CGM_TOKEN")
-    if not bearer_token:
-        raise HTTPException(
-            status_code=401,
-            detail="No authentication token provided. Use 'token' parameter or set CMA_CGM_TOKEN environment variable.",
-        )
+    Routings are cached per normalized search for SCHEDULE_CACHE_TTL
+    seconds. For SCHEDULE_CACHE_STALE seconds after that the cached routings
+    are still returned immediately while one background fetch refreshes
+    them. metadata.cache reports the hit, whether the data is stale and its
+    age in seconds.
+
+    With stream=true the response is NDJSON: one line per routing as soon as
+    its page arrives, then a final {"metadata": {...}} line.
+    """
+    bearer_token = resolve_bearer_token(token)
 
-    url = "https://apis.cma-cgm.net/vesseloperation/route/v2/routings"
     params = {
         "placeOfLoading": placeOfLoading,
         "placeOfDischarge": placeOfDischarge,
@@ -1162,132 +1865,37 @@ async def proxy_schedule_request(
     if arrivalDate:
         params["arrivalDate"] = arrivalDate
 
-    def make_request(range_header: str = None):
-        """Helper function to make a single request with an optional range."""
-        headers = {
-            "Authorization": f"Bearer {bearer_token}",
-            "Content-Type": "application/json",
-        }
-        if range_header:
-            headers["Range"] = range_header
+    key = schedule_cache_key(params, bearer_token)
 
-        response = requests.get(url, params=params, headers=headers, timeout=30)
-        response.raise_for_status()
-        return response
+    def fetch():
+        return fetch_schedule(params, bearer_token)
 
-    start_time = time.time()
+    fetch = prefetcher.track(schedule_cache, key, fetch, schedule_lane(params))
 
-    try:
-        # Make initial request to get first page and determine total results
-        print(f"Making initial request with Range: 0-4")
-        initial_response = make_request("0-4")
-
-        all_data = initial_response.json()
-        content_range = initial_response.headers.get("content-range")
-        status_code = initial_response.status_code
-        cma_func_explain = initial_response.headers.get("cma-func-explain")
-
-        print(f"Initial response: status={status_code}, content-range={content_range}")
-
-        # Handle both array and object responses
-        if not isinstance(all_data, list):
-            # If response is not a list, wrap it or handle accordingly
-            if isinstance(all_data, dict):
-                # If it's a dict, check if it contains a data/list field
-                if "data" in all_data and isinstance(all_data["data"], list):
-                    all_data = all_data["data"]
-                else:
-                    # Single object response, convert to list
-                    all_data = [all_data]
-            else:
-                all_data = [all_data]
-
-        # Check if there are more pages (status 206 = Partial Content)
-        if status_code == 206 and content_range:
-            # Parse content-range header: "0-4/15" means items 0-4 out of 15 total
-            parts = content_range.split("/")
-            if len(parts) == 2:
-                total_items = int(parts[1])
-                current_end = int(parts[0].split("-")[1])
-
-                print(f"Total items: {total_items}, got up to: {current_end}")
-
-                # Calculate remaining ranges to fetch (5 items per request)
-                remaining_ranges = []
-                start = current_end + 1
-                while start < total_items:
-                    end = min(
-                        start + 4, total_items - 1
-                    )  # Max 5 items per request (0-4)
-                    remaining_ranges.append(f"{start}-{end}")
-                    start = end + 1
-
-                print(
-                    f"Need to fetch {len(remaining_ranges)} more pages: {remaining_ranges}"
+    if stream:
+        cached = schedule_cache.lookup(key, fetch)
+        if cached is not None:
+            return stream_result(cached[0], cache=cached[1])
+        return await stream_pages(
+            schedule_paginator(params, bearer_token),
+            on_complete=(
+                (
+                    lambda result: cache_streamed(
+                        schedule_cache, key, fetch, schedule_lane(params), result
+                    )
                 )
-
-                # Fetch remaining pages in parallel
-                if remaining_ranges:
-                    with concurrent.futures.ThreadPoolExecutor(
-                        max_workers=5
-                    ) as executor:
-                        future_to_range = {
-                            executor.submit(make_request, range_header): range_header
-                            for range_header in remaining_ranges
-                        }
-
-                        for future in concurrent.futures.as_completed(future_to_range):
-                            range_header = future_to_range[future]
-                            try:
-                                response = future.result()
-                                page_data = response.json()
-
-                                # Handle different response formats
-                                if not isinstance(page_data, list):
-                                    if (
-                                        isinstance(page_data, dict)
-                                        and "data" in page_data
-                                    ):
-                                        page_data = page_data["data"]
-                                    else:
-                                        page_data = [page_data]
-
-                                all_data.extend(page_data)
-                                print(
-                                    f"Fetched range {range_header}: {len(page_data)} items"
-                                )
-                            except Exception as e:
-                                print(f"Error fetching range {range_header}: {e}")
-                                raise
-
-        elapsed_time = time.time() - start_time
-        print(
-            f"Total aggregation time: {elapsed_time:.2f}s, Total items: {len(all_data)}"
+                if schedule_cache.enabled
+                else None
+            ),
+            cache=cache_info(False, time.time(), coalesced=False, stale=False),
         )
 
-        # Return aggregated results with metadata
-        return {
-            "data": all_data,
-            "metadata": {
-                "total_items": len(all_data),
-                "aggregation_time_seconds": round(elapsed_time, 2),
-                "initial_content_range": content_range,
-                "cma_func_explain": cma_func_explain,
-                "status": "complete",
-            },
-        }
-
-    except requests.exceptions.HTTPError as e:
-        raise HTTPException(
-            status_code=e.response.status_code,
-            detail=f"CMA CGM API error: {e.response.text}",
-        )
-    except requests.exceptions.RequestException as e:
-        raise HTTPException(
-            status_code=503, detail=f"Failed to connect to CMA CGM API: {str(e)}"
-        )
+    try:
+        result, cache = await schedule_cache.get_or_fetch(key, fetch)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+        raise upstream_http_exception(e)
+
+    return {"data": result["data"], "metadata": {**result["metadata"], "cache": cache}}
 
 
 if __name__ == "__main__":
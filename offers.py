@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+# Top-level offer fields that identify the same offer across searches, first
+# match wins
+OFFER_ID_FIELDS = tuple(
+    os.environ.get("SPOTON_OFFER_ID_FIELDS", "offerId,quoteLineId").split(",")
+)
+
+# Top-level offer fields holding its total price, first match wins. Nested
+# charges are never read, so a per-charge amount cannot pass for the total
+PRICE_FIELDS = tuple(
+    os.environ.get("SPOTON_PRICE_FIELDS", "totalPrice,totalAmount").split(",")
+)
+
+
+def offer_key(offer: Any) -> str:
+    """
+    Identity of an offer for de-duplication.
+
+    Uses the first id field present; otherwise a hash of the offer's
+    canonical JSON, so identical offers returned for different requested
+    departure dates collapse into one.
+    """
+    if isinstance(offer, dict):
+        for field in OFFER_ID_FIELDS:
+            value = offer.get(field)
+            if value not in (None, ""):
+                return f"{field}:{value}"
+    canonical = json.dumps(offer, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _as_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return None
+
+
+def offer_price(offer: Any) -> Optional[float]:
+    """
+    Total price of an offer from its top-level price fields, or None.
+
+    A price field may hold a number or an {"amount": ...} object.
+    """
+    if not isinstance(offer, dict):
+        return None
+    for field in PRICE_FIELDS:
+        value = offer.get(field)
+        if isinstance(value, dict):
+            value = value.get("amount", value.get("value"))
+        number = _as_number(value)
+        if number is not None:
+            return number
+    return None
+
+
+def merge_offers(results: Dict[str, List]) -> Dict:
+    """
+    Merge the offers of several searches keyed by requested departure date.
+
+    Returns a per-date summary (offer count and minimum price) and the
+    de-duplicated offers sorted by price, each listing the dates under which
+    it was returned.
+    """
+    merged: Dict[str, Dict] = {}
+    calendar = []
+    for day, offers in results.items():
+        prices = []
+        for offer in offers:
+            key = offer_key(offer)
+            entry = merged.get(key)
+            if entry is None:
+                entry = {"departure_dates": [], "price": offer_price(offer)}
+                entry["offer"] = offer
+                merged[key] = entry
+            if day not in entry["departure_dates"]:
+                entry["departure_dates"].append(day)
+            if entry["price"] is not None:
+                prices.append(entry["price"])
+        calendar.append(
+            {
+                "departure_date": day,
+                "offer_count": len(offers),
+                "min_price": min(prices) if prices else None,
+            }
+        )
+
+    unique = sorted(
+        merged.values(),
+        key=lambda entry: (entry["price"] is None, entry["price"] or 0.0),
+    )
+    return {"calendar": calendar, "offers": unique}
@@ -0,0 +1,613 @@
+import csv
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+import unicodedata
+from functools import cached_property
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+# Port directory served by /port-to-city and /ports/*: a code,city CSV or a
+# directory compiled by compile_ports.py (.locode). A compiled file next to
+# the CSV is preferred whenever it is at least as new.
+PORTS_PATH = Path(
+    os.environ.get("PORTS_PATH", Path(__file__).resolve().parent / "ports.csv")
+)
+
+# Compiled directory layout: magic, little-endian u64 header length, JSON
+# header describing the arrays, then each array aligned to PORTS_ALIGN
+PORTS_MAGIC = b"SPOTLOC1"
+PORTS_ALIGN = 64
+
+# Fuzzy search: candidates ranked by shared trigrams that are edit-checked
+FUZZY_CANDIDATES = 64
+
+# Nearby search: mean Earth radius and the size of the lat/lon grid cells
+EARTH_RADIUS_KM = 6371.0088
+GRID_CELL_DEGREES = 1.0
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def compiled_path_for(csv_path) -> Path:
+    """Conventional location of the compiled directory for a ports CSV"""
+    return Path(csv_path).with_suffix(".locode")
+
+
+def read_ports_csv(csv_path) -> Iterator[Tuple]:
+    """
+    Rows of a code,city[,lat,lon] CSV with a header row.
+
+    Yields (code, city), or (code, city, lat, lon) where the optional
+    decimal-degree coordinates are filled in.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 4 and row[2].strip() and row[3].strip():
+                yield row[0], row[1], float(row[2]), float(row[3])
+            elif len(row) >= 2:
+                yield row[0], row[1]
+
+
+def normalize_code(code) -> str:
+    """Port codes are matched trimmed and upper-cased"""
+    return (code if isinstance(code, str) else str(code)).strip().upper()
+
+
+def fold_name(name: str) -> str:
+    """Search key of a place name: ASCII, lower-case, words split by single spaces"""
+    ascii_name = (
+        unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    )
+    return " ".join(_NON_ALNUM.sub(" ", ascii_name.lower()).split())
+
+
+def trigrams(key: str) -> List[str]:
+    """Overlapping 3-grams of a folded name, with a leading pad for its start"""
+    padded = " " + key
+    return [padded[i : i + 3] for i in range(max(1, len(padded) - 2))]
+
+
+def prefix_distance(query: str, key: str, limit: int) -> int:
+    """
+    Fewest edits turning query into some prefix of key, or limit + 1 if
+    that takes more than limit edits.
+
+    Only the diagonal band of the edit matrix within limit of the
+    diagonal is computed, and it stops as soon as a whole row exceeds it.
+    """
+    key = key[: len(query) + limit]
+    over = limit + 1
+    previous = list(range(len(key) + 1))
+    for i, char in enumerate(query, 1):
+        current = [i] + [over] * len(key)
+        start, end = max(1, i - limit), min(len(key), i + limit)
+        for j in range(start, end + 1):
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char != key[j - 1]),
+            )
+        if min(current[start - 1 : end + 1]) > limit:
+            return over
+        previous = current
+    return min(min(previous), over)
+
+
+def max_typos(query: str) -> int:
+    """Edits tolerated by fuzzy search for a query of this length"""
+    return 0 if len(query) < 3 else 1 if len(query) < 6 else 2
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between points given in degrees (vectorized)"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class GeoGrid:
+    """
+    Points bucketed into fixed lat/lon cells for radius queries.
+
+    Cell ids (lat band x number of lon columns + lon column) are sorted
+    once, so the cells overlapping a query's bounding box are a few
+    contiguous runs found by binary search. Only the points in those runs
+    get an exact great-circle distance.
+    """
+
+    def __init__(
+        self, lat: np.ndarray, lon: np.ndarray, cell: float = GRID_CELL_DEGREES
+    ):
+        self.cell = cell
+        self.bands = int(np.ceil(180 / cell))
+        self.columns = int(np.ceil(360 / cell))
+        rows = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+        lat, lon = lat[rows].astype(np.float64), lon[rows].astype(np.float64)
+        cells = self._band(lat) * self.columns + self._column(lon)
+        order = np.argsort(cells, kind="stable")
+        self.cells = cells[order]
+        self.rows = rows[order]
+        self.lat = lat[order]
+        self.lon = lon[order]
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _band(self, lat):
+        return np.clip(((lat + 90) // self.cell).astype(np.int64), 0, self.bands - 1)
+
+    def _column(self, lon):
+        return np.clip(((lon + 180) // self.cell).astype(np.int64), 0, self.columns - 1)
+
+    def _column_runs(self, lon: float, span: float) -> List[Tuple[int, int]]:
+        """Inclusive lon column ranges within span degrees of lon, across ±180"""
+        first = int((lon - span + 180) // self.cell)
+        last = int((lon + span + 180) // self.cell)
+        if last - first + 1 >= self.columns:
+            return [(0, self.columns - 1)]
+        if first < 0:
+            return [(first + self.columns, self.columns - 1), (0, last)]
+        if last >= self.columns:
+            return [(first, self.columns - 1), (0, last - self.columns)]
+        return [(first, last)]
+
+    def within(
+        self, lat: float, lon: float, km: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, distances in km) of the points within km of lat/lon, unordered"""
+        lat_span = np.degrees(km / EARTH_RADIUS_KM)
+        low, high = max(-90.0, lat - lat_span), min(90.0, lat + lat_span)
+        widest = max(abs(low), abs(high))
+        # Longitude degrees shrink towards the poles; near them take every column
+        lon_span = (
+            360.0
+            if widest >= 89.0
+            else min(360.0, lat_span / np.cos(np.radians(widest)))
+        )
+        bands = np.arange(
+            int(self._band(np.float64(low))), int(self._band(np.float64(high))) + 1
+        )
+        runs = self._column_runs(lon, lon_span)
+        starts = np.concatenate([bands * self.columns + first for first, _ in runs])
+        ends = np.concatenate([bands * self.columns + last for _, last in runs])
+        lo = np.searchsorted(self.cells, starts, side="left")
+        hi = np.searchsorted(self.cells, ends, side="right")
+        if not len(lo) or not (hi > lo).any():
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        candidates = np.concatenate(
+            [np.arange(start, end) for start, end in zip(lo.tolist(), hi.tolist())]
+        )
+        distances = haversine_km(lat, lon, self.lat[candidates], self.lon[candidates])
+        keep = distances <= km
+        return self.rows[candidates[keep]], distances[keep]
+
+
+class PortDirectory:
+    """
+    UN/LOCODE code to city directory, held as flat NumPy arrays.
+
+    codes        sorted codes (fixed-width bytes); row i is codes[i]
+    name_offsets names[name_offsets[i]:name_offsets[i + 1]] is row i's UTF-8 name
+    keys         folded names, sorted, with key_rows mapping them to rows
+    grams        sorted distinct name trigrams; gram_rows[gram_offsets[g]:
+                 gram_offsets[g + 1]] lists the rows containing gram g
+    lat, lon     coordinates in decimal degrees, NaN where unknown
+
+    Lookups binary-search the sorted arrays, so a compiled directory can be
+    memory-mapped as is: nothing is parsed or hashed when it is opened and
+    only the pages a lookup touches become resident.
+    """
+
+    ARRAYS = (
+        "codes",
+        "name_offsets",
+        "names",
+        "keys",
+        "key_rows",
+        "grams",
+        "gram_offsets",
+        "gram_rows",
+        "lat",
+        "lon",
+    )
+
+    def __init__(self, **arrays: np.ndarray):
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.code_width = self.codes.dtype.itemsize
+        # Slicing a memoryview is much cheaper than slicing the array
+        self._name_bytes = memoryview(self.names)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    @classmethod
+    def from_pairs(cls, pairs: Iterable[Tuple]) -> "PortDirectory":
+        """
+        Build from (code, city) or (code, city, lat, lon) tuples.
+
+        For a repeated code the last city wins, and the last coordinates
+        given, so pairs without coordinates can rename a located code.
+        """
+        mapping, positions = {}, {}
+        for code, city, *position in pairs:
+            code = normalize_code(code)
+            if code:
+                mapping[code] = city.strip()
+                if position:
+                    positions[code] = position
+        codes = sorted(mapping)
+        nowhere = (np.nan, np.nan)
+        lat, lon = (
+            np.array([positions.get(code, nowhere) for code in codes], dtype="<f4")
+            .reshape(-1, 2)
+            .T
+        )
+        encoded = [mapping[code].encode("utf-8") for code in codes]
+        name_offsets = np.zeros(len(codes) + 1, dtype="<u4")
+        np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+
+        folded = [fold_name(mapping[code]) for code in codes]
+        keys = np.array([key.encode("ascii") for key in folded], dtype=np.bytes_)
+        key_rows = np.argsort(keys, kind="stable").astype("<i4")
+
+        gram_list, row_list = [], []
+        for row, key in enumerate(folded):
+            distinct = set(trigrams(key)) if key else ()
+            gram_list.extend(distinct)
+            row_list.extend([row] * len(distinct))
+        gram_values = np.array([gram.encode("ascii") for gram in gram_list], "S3")
+        gram_row_values = np.array(row_list, dtype="<i4")
+        order = np.lexsort((gram_row_values, gram_values))
+        grams, starts = np.unique(gram_values[order], return_index=True)
+        gram_offsets = np.append(starts, len(order)).astype("<u4")
+
+        return cls(
+            codes=np.array([code.encode("ascii") for code in codes], dtype=np.bytes_),
+            name_offsets=name_offsets,
+            names=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            keys=keys[key_rows],
+            key_rows=key_rows,
+            grams=grams,
+            gram_offsets=gram_offsets,
+            gram_rows=gram_row_values[order],
+            lat=np.ascontiguousarray(lat),
+            lon=np.ascontiguousarray(lon),
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path) -> "PortDirectory":
+        return cls.from_pairs(read_ports_csv(csv_path))
+
+    @classmethod
+    def from_compiled(cls, path) -> "PortDirectory":
+        """
+        Memory-map a directory written by save().
+
+        Every array is a read-only view of one mapping of the file, so pages
+        are loaded by the OS on first access and can be dropped again under
+        memory pressure.
+        """
+        with open(path, "rb") as f:
+            if f.read(len(PORTS_MAGIC)) != PORTS_MAGIC:
+                raise ValueError(f"{path} is not a compiled port directory")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        data_offset = _data_offset(header_len)
+        arrays = {}
+        for name in cls.ARRAYS:
+            if name not in header["arrays"]:
+                # Compiled before coordinates were stored
+                arrays[name] = np.full(header["arrays"]["codes"][1], np.nan, "<f4")
+                continue
+            dtype, length, offset = header["arrays"][name]
+            arrays[name] = (
+                np.frombuffer(
+                    mapped, dtype=dtype, count=length, offset=data_offset + offset
+                )
+                if length
+                else np.empty(0, dtype=dtype)
+            )
+        return cls(**arrays)
+
+    @classmethod
+    def open(cls, path) -> "PortDirectory":
+        """
+        Open a compiled directory or a CSV.
+
+        For a CSV, its compiled sibling is used instead when it is at least
+        as new.
+        """
+        path = Path(path)
+        if path.suffix != ".locode":
+            compiled = compiled_path_for(path)
+            if compiled.exists() and (
+                not path.exists() or compiled.stat().st_mtime >= path.stat().st_mtime
+            ):
+                path = compiled
+        if path.suffix == ".locode":
+            return cls.from_compiled(path)
+        return cls.from_csv(path)
+
+    def save(self, path) -> None:
+        """
+        Write the directory for from_compiled().
+
+        The file is written next to the target and renamed into place, so a
+        running server never sees a half-written directory.
+        """
+        path = Path(path)
+        layout, offset = {}, 0
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            layout[name] = [array.dtype.str, len(array), offset]
+            offset = _align(offset + array.nbytes)
+        encoded = json.dumps({"arrays": layout}).encode("utf-8")
+        data_offset = _data_offset(len(encoded))
+
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(PORTS_MAGIC)
+            f.write(struct.pack("<Q", len(encoded)))
+            f.write(encoded)
+            for name in self.ARRAYS:
+                f.write(b"\0" * (data_offset + layout[name][2] - f.tell()))
+                f.write(np.ascontiguousarray(getattr(self, name)).tobytes())
+        os.replace(tmp_path, path)
+
+    def code(self, row: int) -> str:
+        return self.codes[row].decode("ascii")
+
+    def name(self, row: int) -> str:
+        start, end = self.name_offsets[row], self.name_offsets[row + 1]
+        return str(self._name_bytes[start:end], "utf-8")
+
+    def coordinates(self, row: int) -> Optional[Tuple[float, float]]:
+        lat, lon = float(self.lat[row]), float(self.lon[row])
+        return (lat, lon) if np.isfinite(lat) and np.isfinite(lon) else None
+
+    @cached_property
+    def grid(self) -> GeoGrid:
+        """Spatial index of the located rows, built on the first nearby query"""
+        return GeoGrid(self.lat, self.lon)
+
+    def nearby(
+        self, row: int, km: float, limit: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """
+        (row, distance in km) of the other locations within km of row's,
+        nearest first. Empty if row has no coordinates.
+        """
+        position = self.coordinates(row)
+        if position is None:
+            return []
+        rows, distances = self.grid.within(*position, km)
+        others = rows != row
+        rows, distances = rows[others], distances[others]
+        order = np.lexsort((rows, distances))[:limit]
+        return list(zip(rows[order].tolist(), distances[order].tolist()))
+
+    def row_of(self, code: str) -> Optional[int]:
+        """Row of a code (normalized here), or None if unknown"""
+        row = self._row(normalize_code(code))
+        return row if row >= 0 else None
+
+    def _row(self, code: str) -> int:
+        """Row of a normalized code, or -1"""
+        key = code.encode("ascii", "replace")
+        if not key or len(key) > self.code_width:
+            return -1
+        row = int(np.searchsorted(self.codes, key))
+        return row if row < len(self.codes) and self.codes[row] == key else -1
+
+    def rows(self, codes: List[str]) -> np.ndarray:
+        """Rows of many normalized codes at once, -1 where unknown"""
+        if not len(self.codes) or not codes:
+            return np.full(len(codes), -1, dtype=np.int64)
+        keys = np.array(
+            [
+                code.encode("ascii", "replace") if len(code) <= self.code_width else b""
+                for code in codes
+            ],
+            dtype=self.codes.dtype,
+        )
+        rows = np.minimum(np.searchsorted(self.codes, keys), len(self.codes) - 1)
+        return np.where((self.codes[rows] == keys) & (keys != b""), rows, -1)
+
+    def __contains__(self, code: str) -> bool:
+        return self._row(code) >= 0
+
+    def get(self, code: str, default: Optional[str] = None) -> Optional[str]:
+        row = self._row(code)
+        return self.name(row) if row >= 0 else default
+
+    def get_many(self, codes: List[str], default: str = "") -> List[str]:
+        rows = self.rows(codes)
+        found = rows >= 0
+        starts = np.where(found, self.name_offsets[rows], 0).tolist()
+        ends = np.where(found, self.name_offsets[rows + 1], 0).tolist()
+        names = self._name_bytes
+        return [
+            str(names[start:end], "utf-8") if ok else default
+            for ok, start, end in zip(found.tolist(), starts, ends)
+        ]
+
+    def _key_range(self, key: str, prefix: bool = False) -> Tuple[int, int]:
+        encoded = key.encode("ascii")
+        upper = encoded + b"\xff" if prefix else encoded
+        return (
+            int(np.searchsorted(self.keys, encoded, side="left")),
+            int(np.searchsorted(self.keys, upper, side="right")),
+        )
+
+    def codes_for(self, city: str) -> List[str]:
+        """Codes of every location named city (accents and case ignored)"""
+        key = fold_name(city)
+        if not key:
+            return []
+        start, end = self._key_range(key)
+        return sorted(self.code(row) for row in self.key_rows[start:end].tolist())
+
+    def _fuzzy_rows(self, key: str, typos: int) -> List[Tuple[int, int]]:
+        """(distance, row) of names within typos edits of starting with key"""
+        query_grams = np.array(
+            sorted({gram.encode("ascii") for gram in trigrams(key)}), "S3"
+        )
+        starts = np.searchsorted(self.grams, query_grams)
+        found = np.minimum(starts, max(len(self.grams) - 1, 0))
+        hits = [
+            self.gram_rows[self.gram_offsets[g] : self.gram_offsets[g + 1]]
+            for g, ok in zip(
+                found.tolist(), (self.grams[found] == query_grams).tolist()
+            )
+            if ok
+        ]
+        if not hits:
+            return []
+        rows, shared = np.unique(np.concatenate(hits), return_counts=True)
+        # Each edit disturbs at most three of the query's trigrams
+        keep = shared >= max(1, len(query_grams) - 3 * typos)
+        rows, shared = rows[keep], shared[keep]
+        best = np.argsort(-shared, kind="stable")[:FUZZY_CANDIDATES]
+        matches = []
+        for row in rows[best].tolist():
+            distance = prefix_distance(key, fold_name(self.name(row)), typos)
+            if distance <= typos:
+                matches.append((distance, row))
+        return sorted(matches)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict]:
+        """
+        Locations matching query, best first.
+
+        Ranks an exact code, then cities named query, then cities starting
+        with it, then codes starting with it, then cities within one or
+        two typos (by query length) of starting with it.
+        """
+        results: Dict[int, str] = {}
+
+        def add(rows: Iterable[int], match: str) -> None:
+            for row in rows:
+                if len(results) >= limit:
+                    return
+                results.setdefault(row, match)
+
+        code = normalize_code(query)
+        key = fold_name(query)
+        if code:
+            add([row for row in [self._row(code)] if row >= 0], "code")
+        if key:
+            start, end = self._key_range(key)
+            add(self.key_rows[start : min(end, start + limit)].tolist(), "city")
+            start, end = self._key_range(key, prefix=True)
+            add(self.key_rows[start : min(end, start + 2 * limit)].tolist(), "prefix")
+        if code.isalnum() and len(code) < self.code_width:
+            encoded = code.encode("ascii", "replace")
+            start = int(np.searchsorted(self.codes, encoded))
+            end = int(np.searchsorted(self.codes, encoded + b"\xff", side="right"))
+            add(range(start, min(end, start + limit)), "code_prefix")
+        typos = max_typos(key)
+        if len(results) < limit and typos and len(self.grams):
+            add([row for _, row in self._fuzzy_rows(key, typos)], "fuzzy")
+
+        return [
+            {
+                "code": self.code(row),
+                "city": self.name(row),
+                "country": self.code(row)[:2],
+                "match": match,
+            }
+            for row, match in results.items()
+        ]
+
+
+def _align(offset: int) -> int:
+    return -(-offset // PORTS_ALIGN) * PORTS_ALIGN
+
+
+def _data_offset(header_len: int) -> int:
+    """Byte offset of the first array, aligned to PORTS_ALIGN"""
+    return _align(len(PORTS_MAGIC) + 8 + header_len)
+
+
+_directory: Optional[PortDirectory] = None
+_directory_lock = threading.Lock()
+
+
+def port_directory() -> PortDirectory:
+    """The directory at PORTS_PATH, opened on first use"""
+    global _directory
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                start_time = time.perf_counter()
+                _directory = PortDirectory.open(PORTS_PATH)
+                print(
+                    f"✓ Port directory opened: {len(_directory)} locations in "
+                    f"{time.perf_counter() - start_time:.3f}s"
+                )
+    return _directory
+
+
+def parse_ports_param(ports: Union[str, List[str]]) -> List[str]:
+    """
+    Port codes from the /port-to-city 'ports' query parameter.
+
+    Accepts a single code, repeated params, or one JSON array string such
+    as '["CNYTN","NLRTM"]'. A value that only looks like an array but does
+    not parse is kept as a single code.
+    """
+    if isinstance(ports, str):
+        ports = [ports]
+    if len(ports) == 1:
+        value = ports[0]
+        if value[:1] == "[" and value[-1:] == "]":
+            try:
+                parsed = json.loads(value)
+            except json.JSONDecodeError:
+                return ports
+            if isinstance(parsed, list):
+                return [code if isinstance(code, str) else str(code) for code in parsed]
+    return ports
+
+
+def lookup_cities(
+    codes: Iterable[str], directory: PortDirectory
+) -> List[Optional[str]]:
+    """
+    City for each code in input order: "" if unknown, None if blank.
+
+    Each distinct code is normalized once and all of them are resolved in
+    one vectorized binary search; the results are then spread back over
+    the input with a single map(), so large inputs with repeated codes
+    cost little more than their unique codes.
+    """
+    codes = codes if isinstance(codes, list) else list(codes)
+    resolved = dict.fromkeys(codes)
+    normalized = [normalize_code(code) for code in resolved]
+    for code, key, city in zip(resolved, normalized, directory.get_many(normalized)):
+        resolved[code] = city if key else None
+    return list(map(resolved.__getitem__, codes))
+
+
+def unknown_codes(codes: Iterable[str], directory: PortDirectory) -> List[str]:
+    """Distinct normalized non-blank codes missing from directory, first seen first"""
+    distinct = dict.fromkeys(normalize_code(code) for code in dict.fromkeys(codes))
+    distinct.pop("", None)
+    normalized = list(distinct)
+    rows = directory.rows(normalized).tolist()
+    return [code for code, row in zip(normalized, rows) if row < 0]
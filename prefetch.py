@@ -0,0 +1,242 @@
+import asyncio
+import heapq
+import math
+import os
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+from caches import SingleFlightCache
+from upstream import (
+    UPSTREAM_PAGE_SIZE,
+    UPSTREAM_RATE_LIMIT,
+    LaneHistory,
+    TokenBucket,
+    lane_history,
+)
+
+# Hottest proxy searches kept fresh in the background (0 disables)
+PREFETCH_TOP_N = int(os.environ.get("PREFETCH_TOP_N", "50"))
+
+# Seconds between prefetch rounds
+PREFETCH_INTERVAL = float(os.environ.get("PREFETCH_INTERVAL", "30"))
+
+# Refresh a cached search once it has used this share of its cache TTL
+PREFETCH_AHEAD = float(os.environ.get("PREFETCH_AHEAD", "0.8"))
+
+# Share of UPSTREAM_RATE_LIMIT that prefetching may use
+PREFETCH_BUDGET_SHARE = float(os.environ.get("PREFETCH_BUDGET_SHARE", "0.2"))
+
+# Seconds for a search's popularity to halve, and searches tracked at most
+POPULARITY_HALF_LIFE = float(os.environ.get("POPULARITY_HALF_LIFE", "3600"))
+POPULARITY_MAX_TRACKED = int(os.environ.get("POPULARITY_MAX_TRACKED", "5000"))
+
+# Popularity a search needs to be prefetched. Hits decay with
+# POPULARITY_HALF_LIFE, so 1.5 takes at least two hits within one half-life
+PREFETCH_MIN_SCORE = float(os.environ.get("PREFETCH_MIN_SCORE", "1.5"))
+
+
+class DecayingCounter:
+    """
+    Access counts that halve every `half_life` seconds.
+
+    Each key keeps (score, updated); a hit decays the stored score to now
+    and adds one, so recent traffic dominates without periodic sweeps.
+    Beyond `max_keys`, the coldest half is forgotten.
+    """
+
+    def __init__(self, half_life: float, max_keys: int):
+        self.decay = math.log(2) / max(half_life, 1e-9)
+        self.max_keys = max(1, max_keys)
+        self._scores: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._scores
+
+    def _decayed(self, score: float, updated: float, now: float) -> float:
+        return score * math.exp(-self.decay * (now - updated))
+
+    def hit(self, key: Hashable, weight: float = 1.0) -> None:
+        now = time.monotonic()
+        score, updated = self._scores.get(key, (0.0, now))
+        self._scores[key] = (self._decayed(score, updated, now) + weight, now)
+        if len(self._scores) > self.max_keys:
+            self._prune(now)
+
+    def drop_below(self, floor: float, now: Optional[float] = None) -> None:
+        """Forget keys whose current score is below floor"""
+        now = time.monotonic() if now is None else now
+        self._scores = {
+            key: (score, updated)
+            for key, (score, updated) in self._scores.items()
+            if self._decayed(score, updated, now) >= floor
+        }
+
+    def _prune(self, now: float) -> None:
+        keep = self.top(self.max_keys // 2, now)
+        self._scores = {key: (score, now) for key, score in keep}
+
+    def top(self, n: int, now: Optional[float] = None) -> List[Tuple[Hashable, float]]:
+        """The n highest (key, current score) pairs, highest first"""
+        now = time.monotonic() if now is None else now
+        return heapq.nlargest(
+            n,
+            (
+                (key, self._decayed(score, updated, now))
+                for key, (score, updated) in self._scores.items()
+            ),
+            key=lambda item: item[1],
+        )
+
+
+class PrefetchTarget(NamedTuple):
+    cache: SingleFlightCache
+    fetch: Callable[[], Awaitable]
+    lane: str  # Paginator lane, used to estimate the cost in pages
+
+
+class Prefetcher:
+    """
+    Keeps the most requested proxy searches cached ahead of expiry.
+
+    Handlers call track() for every search they serve and fetch through the
+    wrapper it returns; a search becomes a prefetch target once a fetch of
+    it succeeds, and stops being one when a fetch fails. Each round,
+    searches whose popularity fell below `min_score` are forgotten, and
+    the `top_n` most popular remaining ones whose cached value is missing
+    or older than `ahead` x the cache TTL are refreshed through the cache's
+    single-flight fetch. Refreshes spend tokens from a bucket refilled at
+    `rate` pages per second, one per expected page of the lane, so
+    prefetching stays within its share of the upstream rate budget.
+    """
+
+    def __init__(
+        self,
+        top_n: int = PREFETCH_TOP_N,
+        interval: float = PREFETCH_INTERVAL,
+        ahead: float = PREFETCH_AHEAD,
+        rate: float = UPSTREAM_RATE_LIMIT * PREFETCH_BUDGET_SHARE,
+        half_life: float = POPULARITY_HALF_LIFE,
+        max_tracked: int = POPULARITY_MAX_TRACKED,
+        min_score: float = PREFETCH_MIN_SCORE,
+        history: LaneHistory = lane_history,
+        page_size: int = UPSTREAM_PAGE_SIZE,
+    ):
+        self.top_n = top_n
+        self.interval = interval
+        self.ahead = ahead
+        self.budget = TokenBucket(rate, 1)
+        self.popularity = DecayingCounter(half_life, max_tracked)
+        self.min_score = min_score
+        self.history = history
+        self.page_size = max(1, page_size)
+        self.targets: Dict[Tuple[str, Hashable], PrefetchTarget] = {}
+        self.rounds = 0
+        self.refreshed = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_n > 0 and self.interval > 0
+
+    def track(
+        self,
+        cache: SingleFlightCache,
+        key: Hashable,
+        fetch: Callable[[], Awaitable],
+        lane: str,
+    ) -> Callable[[], Awaitable]:
+        """Count a hit on the search; returns fetch wrapped to record its outcome"""
+        if not self.enabled or not cache.enabled:
+            return fetch
+        name = (cache.namespace, key)
+        self.popularity.hit(name)
+
+        async def tracked():
+            try:
+                value = await fetch()
+            except Exception:
+                # Never replay a search that failed, e.g. on expired credentials
+                self.targets.pop(name, None)
+                raise
+            self.succeeded(cache, key, tracked, lane)
+            return value
+
+        return tracked
+
+    def succeeded(
+        self,
+        cache: SingleFlightCache,
+        key: Hashable,
+        fetch: Callable[[], Awaitable],
+        lane: str,
+    ) -> None:
+        """Make a search that was fetched successfully a prefetch target"""
+        name = (cache.namespace, key)
+        if name in self.popularity:
+            self.targets[name] = PrefetchTarget(cache, fetch, lane)
+        if len(self.targets) > len(self.popularity):
+            self._forget_untracked()
+
+    def _forget_untracked(self) -> None:
+        self.targets = {
+            name: target
+            for name, target in self.targets.items()
+            if name in self.popularity
+        }
+
+    def pages(self, lane: str) -> int:
+        """Expected upstream requests for one search of the lane"""
+        total = self.history.expected_total(lane) if self.history else None
+        return max(1, math.ceil(total / self.page_size)) if total else 1
+
+    async def run_once(self) -> int:
+        """One prefetch round; returns how many searches were refreshed"""
+        refreshed = 0
+        now = time.monotonic()
+        self.popularity.drop_below(self.min_score, now)
+        self._forget_untracked()
+        for name, _ in self.popularity.top(self.top_n, now):
+            target = self.targets.get(name)
+            if target is None:
+                continue
+            age = target.cache.age(name[1])
+            if age is not None and age < target.cache.ttl * self.ahead:
+                continue
+            await self.budget.acquire(self.pages(target.lane))
+            if target.cache.refresh(name[1], target.fetch):
+                refreshed += 1
+        self.rounds += 1
+        self.refreshed += refreshed
+        return refreshed
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                refreshed = await self.run_once()
+                if refreshed:
+                    print(f"↻ Prefetched {refreshed} popular proxy searches")
+            except Exception as e:
+                print(f"✗ Prefetch round failed: {e}")
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "tracked": len(self.popularity),
+            "rounds": self.rounds,
+            "refreshed": self.refreshed,
+        }
+
+
+prefetcher = Prefetcher()
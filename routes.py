@@ -0,0 +1,157 @@
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from store import AvailabilityStore, row_means
+
+
+class Route(NamedTuple):
+    ports: List[str]  # origin, hubs..., destination
+    rows: List[int]  # matrix row of each leg
+    legs: List[float]  # availability of each leg
+    availability: float  # of the weakest leg
+
+
+def _ranges(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, end) for each pair, without a Python loop"""
+    counts = ends - starts
+    total = int(counts.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(total)
+
+
+def find_routes(
+    snapshot: AvailabilityStore,
+    origin: str,
+    destination: str,
+    columns: slice,
+    max_hubs: int = 2,
+    limit: int = 10,
+) -> Optional[List[Route]]:
+    """
+    Best routes from origin to destination via at most max_hubs (0-2) hubs.
+
+    A leg weighs its availability on the selected date columns (the mean
+    if there are several) and a route is as available as its weakest leg.
+    Routes are ranked by that, then by fewer hubs, then by the mean of
+    their legs; legs without a value rule a route out and no port is
+    visited twice. Returns None if either port has no lanes at all.
+
+    Each route length is scored as arrays over the snapshot's lane graph:
+    the lanes out of the origin and into the destination are read once,
+    one-hub routes are the ports both reach, and two-hub routes are the
+    lanes leaving a first-leg port that end at a last-leg port.
+    """
+    graph = snapshot.graph
+    start = graph.port_index.get(origin.upper())
+    end = graph.port_index.get(destination.upper())
+    if start is None or end is None:
+        return None
+    if start == end:
+        return []
+
+    def weights(rows: np.ndarray) -> np.ndarray:
+        return row_means(snapshot.values[rows, columns])
+
+    first_ports, first_rows = graph.lanes_from(start)
+    last_ports, last_rows = graph.lanes_into(end)
+    first_weights, last_weights = weights(first_rows), weights(last_rows)
+
+    # (ports, rows, weights) matrices with one route per row, per hub count
+    candidates = []
+    direct = np.flatnonzero(first_ports == end)
+    candidates.append(
+        (
+            np.stack([np.full(len(direct), start), first_ports[direct]], axis=1),
+            first_rows[direct, None],
+            first_weights[direct, None],
+        )
+    )
+    if max_hubs >= 1:
+        _, firsts, lasts = np.intersect1d(
+            first_ports, last_ports, assume_unique=True, return_indices=True
+        )
+        candidates.append(
+            (
+                np.stack(
+                    [
+                        np.full(len(firsts), start),
+                        first_ports[firsts],
+                        np.full(len(firsts), end),
+                    ],
+                    axis=1,
+                ),
+                np.stack([first_rows[firsts], last_rows[lasts]], axis=1),
+                np.stack([first_weights[firsts], last_weights[lasts]], axis=1),
+            )
+        )
+    if max_hubs >= 2 and len(last_ports):
+        firsts = np.flatnonzero((first_ports != end) & ~np.isnan(first_weights))
+        hubs = first_ports[firsts]
+        lanes = _ranges(graph.out_offsets[hubs], graph.out_offsets[hubs + 1])
+        owners = np.repeat(
+            firsts, graph.out_offsets[hubs + 1] - graph.out_offsets[hubs]
+        )
+        second_hubs = graph.out_targets[lanes]
+        lasts = np.minimum(
+            np.searchsorted(last_ports, second_hubs), len(last_ports) - 1
+        )
+        keep = (
+            (last_ports[lasts] == second_hubs)
+            & (second_hubs != start)
+            & (second_hubs != end)
+            & ~np.isnan(last_weights[lasts])
+        )
+        lanes, owners, lasts = lanes[keep], owners[keep], lasts[keep]
+        middle_rows = graph.out_rows[lanes]
+        candidates.append(
+            (
+                np.stack(
+                    [
+                        np.full(len(lanes), start),
+                        first_ports[owners],
+                        graph.out_targets[lanes],
+                        np.full(len(lanes), end),
+                    ],
+                    axis=1,
+                ),
+                np.stack([first_rows[owners], middle_rows, last_rows[lasts]], axis=1),
+                np.stack(
+                    [
+                        first_weights[owners],
+                        weights(middle_rows),
+                        last_weights[lasts],
+                    ],
+                    axis=1,
+                ),
+            )
+        )
+
+    routes = []
+    for ports, rows, legs in candidates:
+        if not len(legs):
+            continue
+        weakest = legs.min(axis=1)
+        usable = np.flatnonzero(~np.isnan(weakest))
+        best = usable[
+            np.lexsort((-legs[usable].mean(axis=1), -weakest[usable]))[:limit]
+        ]
+        for i in best.tolist():
+            routes.append(
+                Route(
+                    ports=[graph.ports[port] for port in ports[i].tolist()],
+                    rows=rows[i].tolist(),
+                    legs=legs[i].tolist(),
+                    availability=float(weakest[i]),
+                )
+            )
+    routes.sort(
+        key=lambda route: (
+            -route.availability,
+            len(route.legs),
+            -sum(route.legs) / len(route.legs),
+        )
+    )
+    return routes[:limit]
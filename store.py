@@ -0,0 +1,531 @@
+import json
+import os
+import struct
+import numpy as np
+from bisect import bisect_left
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+from caches import LRUCache
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Name of the index column in the Qlik Sense export
+PAIR_COLUMN = "POL-POD Booked"
+
+# Number of pre-serialized /port-pairs/{port_pair} bodies kept per snapshot
+RESPONSE_CACHE_SIZE = int(os.environ.get("PORT_PAIR_CACHE_SIZE", "4096"))
+
+# Compiled snapshot layout: magic, little-endian u64 header length, JSON
+# header, padding to SNAPSHOT_ALIGN, then the float32 values matrix (C order)
+SNAPSHOT_MAGIC = b"SPOTSNP1"
+SNAPSHOT_ALIGN = 64
+
+
+def snapshot_path_for(csv_path) -> Path:
+    """Conventional location of the compiled snapshot for a CSV export"""
+    return Path(csv_path).with_suffix(".snapshot")
+
+
+def split_pair(port_pair: str) -> Optional[Tuple[str, str]]:
+    """Split 'POL-POD' into its codes (extra dashes belong to the POD)"""
+    parts = port_pair.split("-")
+    if len(parts) < 2:
+        return None
+    return parts[0].strip(), "-".join(parts[1:]).strip()
+
+
+def parse_date_labels(labels: List[str]) -> np.ndarray:
+    """Parse date column headers into a datetime64[D] array (NaT if unparseable)"""
+    import pandas as pd
+
+    raw = pd.Series(labels, dtype="object")
+    parsed = pd.to_datetime(raw, format="ISO8601", errors="coerce")
+    if parsed.isna().any():
+        # Qlik exports with European locale settings use day-first dates
+        fallback = pd.to_datetime(raw, dayfirst=True, errors="coerce")
+        parsed = parsed.fillna(fallback)
+    return parsed.to_numpy(dtype="datetime64[D]")
+
+
+def to_json_values(values: np.ndarray) -> list:
+    """
+    Convert a float32 row or matrix to JSON-safe (nested) Python lists.
+
+    Rounding to the 7 significant digits float32 can hold keeps values such
+    as 85.12 from being emitted as 85.12000274658203; missing cells become None.
+    """
+    as_float = values.astype(np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(as_float)))
+    magnitude[~np.isfinite(magnitude)] = 0
+    scale = 10.0 ** (6 - magnitude)
+    as_float = np.round(as_float * scale) / scale
+
+    missing = np.isnan(as_float)
+    if not missing.any():
+        return as_float.tolist()
+    result = as_float.astype(object)
+    result[missing] = None
+    return result.tolist()
+
+
+def top_k(scores: np.ndarray, k: int, largest: bool = True) -> np.ndarray:
+    """
+    Positions of the k best scores, best first, ignoring NaN.
+
+    Uses argpartition so only the selected k are sorted.
+    """
+    candidates = np.flatnonzero(~np.isnan(scores))
+    keyed = -scores[candidates] if largest else scores[candidates]
+    if k < len(candidates):
+        part = np.argpartition(keyed, k - 1)[:k]
+        candidates, keyed = candidates[part], keyed[part]
+    return candidates[np.argsort(keyed, kind="stable")]
+
+
+def row_means(block: np.ndarray) -> np.ndarray:
+    """Mean of each row ignoring NaN (NaN for rows without values)"""
+    if block.shape[1] == 1:
+        return block[:, 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        valid = ~np.isnan(block)
+        return np.where(valid, block, 0).sum(axis=1) / valid.sum(axis=1)
+
+
+def threshold_mask(
+    values: np.ndarray, op: str, value: float, upper: Optional[float] = None
+) -> np.ndarray:
+    """
+    Cells below ('lt') or above ('gt') value, or within [value, upper] ('between').
+
+    Missing cells never match.
+    """
+    if op == "lt":
+        return values < value
+    if op == "gt":
+        return values > value
+    if op == "between":
+        return (values >= value) & (values <= upper)
+    raise ValueError(f"Unknown comparison '{op}'")
+
+
+class PrefixIndex:
+    """Sorted string keys with their row numbers, for bisect prefix lookups"""
+
+    def __init__(self, keys: List[str], rows: List[int]):
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        self.keys: List[str] = [keys[i] for i in order]
+        self.rows: np.ndarray = np.array([rows[i] for i in order], dtype=np.int64)
+
+    def lookup(self, prefix: str) -> np.ndarray:
+        """Rows whose key starts with prefix (unordered)"""
+        lo = bisect_left(self.keys, prefix)
+        hi = bisect_left(self.keys, prefix + "\U0010ffff", lo)
+        return self.rows[lo:hi]
+
+
+class GroupRollup:
+    """
+    Per-date aggregates of the availability matrix grouped by a row key.
+
+    Rows are ordered by group once and reduced with ufunc.reduceat, so each
+    statistic is a single vectorized pass over the matrix. Missing cells are
+    ignored; a group/date with no values has NaN mean/min/max.
+    """
+
+    def __init__(self, keys: List[Optional[str]], values: np.ndarray):
+        rows = np.array(
+            [r for r, key in enumerate(keys) if key is not None], dtype=np.int64
+        )
+        group_keys = np.array([keys[r] for r in rows.tolist()], dtype=str)
+        groups, inverse = np.unique(group_keys, return_inverse=True)
+
+        self.index: Dict[str, int] = {key: i for i, key in enumerate(groups.tolist())}
+        self.pairs_count: np.ndarray = np.bincount(inverse, minlength=len(groups))
+
+        n_dates = values.shape[1]
+        if len(groups) == 0:
+            empty = np.empty((0, n_dates), dtype=np.float32)
+            self.count = np.empty((0, n_dates), dtype=np.int64)
+            self.mean = self.min = self.max = empty
+            return
+
+        order = np.argsort(inverse, kind="stable")
+        block = values[rows[order]]
+        starts = np.concatenate(([0], np.cumsum(self.pairs_count)[:-1]))
+        valid = ~np.isnan(block)
+
+        self.count: np.ndarray = np.add.reduceat(valid, starts, axis=0, dtype=np.int64)
+        totals = np.add.reduceat(
+            np.where(valid, block, 0), starts, axis=0, dtype=np.float64
+        )
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.mean: np.ndarray = (totals / self.count).astype(np.float32)
+        self.min: np.ndarray = np.fmin.reduceat(block, starts, axis=0)
+        self.max: np.ndarray = np.fmax.reduceat(block, starts, axis=0)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.index
+
+
+class LaneGraph:
+    """
+    The port pairs as a directed POL -> POD graph in compressed sparse rows.
+
+    Ports are numbered in sorted code order. The lanes out of port i are
+    positions out_offsets[i]:out_offsets[i + 1] of out_targets (POD port
+    numbers, ascending) and out_rows (their matrix rows); in_offsets,
+    in_sources and in_rows hold the lanes into each port the same way.
+    A repeated pair keeps its first row, as the pair index does.
+    """
+
+    def __init__(self, pols: List[Optional[str]], pods: List[Optional[str]]):
+        lanes: Dict[Tuple[str, str], int] = {}
+        for row, (pol, pod) in enumerate(zip(pols, pods)):
+            if pol and pod and pol != pod:
+                lanes.setdefault((pol, pod), row)
+        self.ports: List[str] = sorted({code for lane in lanes for code in lane})
+        self.port_index: Dict[str, int] = {code: i for i, code in enumerate(self.ports)}
+        sources = np.array([self.port_index[pol] for pol, _ in lanes], dtype=np.int64)
+        targets = np.array([self.port_index[pod] for _, pod in lanes], dtype=np.int64)
+        rows = np.fromiter(lanes.values(), dtype=np.int64, count=len(lanes))
+        self.out_offsets, self.out_targets, self.out_rows = self._compress(
+            sources, targets, rows
+        )
+        self.in_offsets, self.in_sources, self.in_rows = self._compress(
+            targets, sources, rows
+        )
+
+    def __len__(self) -> int:
+        return len(self.out_rows)
+
+    def _compress(self, keys: np.ndarray, values: np.ndarray, rows: np.ndarray):
+        order = np.lexsort((values, keys))
+        offsets = np.zeros(len(self.ports) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=len(self.ports)), out=offsets[1:])
+        return offsets, values[order], rows[order]
+
+    def lanes_from(self, port: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(POD ports, matrix rows) of the lanes out of a port"""
+        lanes = slice(self.out_offsets[port], self.out_offsets[port + 1])
+        return self.out_targets[lanes], self.out_rows[lanes]
+
+    def lanes_into(self, port: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(POL ports, matrix rows) of the lanes into a port"""
+        lanes = slice(self.in_offsets[port], self.in_offsets[port + 1])
+        return self.in_sources[lanes], self.in_rows[lanes]
+
+
+class AvailabilityStore:
+    """
+    Immutable in-memory copy of the port pair availability data.
+
+    Values live in a contiguous float32 matrix (one row per port pair, one
+    column per date) with a precomputed port_pair -> row hash index, so a
+    lookup is a dict hit plus a row view instead of a pandas .loc call.
+
+    Serialized responses are cached on the instance, so replacing the store
+    on reload also invalidates them.
+    """
+
+    def __init__(
+        self,
+        pairs: List[str],
+        date_labels: List[str],
+        values: np.ndarray,
+        dates: Optional[np.ndarray] = None,
+    ):
+        self.pairs: List[str] = [str(pair) for pair in pairs]
+        self.date_labels: List[str] = [str(label) for label in date_labels]
+        self.values: np.ndarray = np.ascontiguousarray(values, dtype=np.float32)
+        if dates is None:
+            dates = parse_date_labels(self.date_labels)
+        self.dates: np.ndarray = np.asarray(dates, dtype="datetime64[D]")
+        # Date windows are found by binary search, which needs every header
+        # to be a date and the columns to be in chronological order
+        self.dates_sorted: bool = not np.isnat(self.dates).any() and bool(
+            np.all(self.dates[1:] >= self.dates[:-1])
+        )
+
+        if self.values.shape != (len(self.pairs), len(self.date_labels)):
+            raise ValueError(
+                f"Values shape {self.values.shape} does not match "
+                f"{len(self.pairs)} port pairs x {len(self.date_labels)} dates"
+            )
+
+        # First occurrence wins if the export contains a duplicated pair
+        self.index: Dict[str, int] = {}
+        for row, pair in enumerate(self.pairs):
+            self.index.setdefault(pair, row)
+
+        # POL/POD codes per row (None for malformed pairs), upper-cased and
+        # indexed once so /search is a range lookup instead of a scan
+        self.pols: List[Optional[str]] = []
+        self.pods: List[Optional[str]] = []
+        searchable_rows: List[int] = []
+        for row, pair in enumerate(self.pairs):
+            codes = split_pair(pair)
+            if codes is None:
+                self.pols.append(None)
+                self.pods.append(None)
+                continue
+            self.pols.append(codes[0].upper())
+            self.pods.append(codes[1].upper())
+            searchable_rows.append(row)
+        self.searchable_rows = np.array(searchable_rows, dtype=np.int64)
+        self.pol_index = PrefixIndex(
+            [self.pols[r] for r in searchable_rows], searchable_rows
+        )
+        self.pod_index = PrefixIndex(
+            [self.pods[r] for r in searchable_rows], searchable_rows
+        )
+
+        self.response_cache = LRUCache(RESPONSE_CACHE_SIZE)
+
+    def __len__(self) -> int:
+        return len(self.pairs)
+
+    def warm(self) -> None:
+        """
+        Build the derived aggregates and the lane graph up front.
+
+        They are cached properties so opening a snapshot stays fast; callers
+        warm a new store off the event loop before or right after publishing it.
+        """
+        self.rollups
+        self.graph
+
+    @cached_property
+    def graph(self) -> LaneGraph:
+        """POL -> POD adjacency of the loaded pairs, for /routes"""
+        return LaneGraph(self.pols, self.pods)
+
+    @cached_property
+    def rollups(self) -> Dict[str, GroupRollup]:
+        """Aggregates by POL, POD and their UN/LOCODE country (first 2 letters)"""
+        return {
+            "origin": GroupRollup(self.pols, self.values),
+            "destination": GroupRollup(self.pods, self.values),
+            "origin-country": GroupRollup(
+                [code[:2] if code else None for code in self.pols], self.values
+            ),
+            "destination-country": GroupRollup(
+                [code[:2] if code else None for code in self.pods], self.values
+            ),
+        }
+
+    def __contains__(self, port_pair: str) -> bool:
+        return port_pair in self.index
+
+    def row(self, port_pair: str) -> Optional[int]:
+        """Row number of a port pair, or None if it is not loaded"""
+        return self.index.get(port_pair)
+
+    def series(self, port_pair: str) -> Optional[np.ndarray]:
+        """Availability values of a port pair (a view into the matrix)"""
+        row = self.index.get(port_pair)
+        if row is None:
+            return None
+        return self.values[row]
+
+    def date_slice(self, start=None, end=None) -> slice:
+        """
+        Column slice covering dates in [start, end] (either bound optional).
+
+        Raises ValueError if the date headers cannot be binary searched.
+        """
+        if start is None and end is None:
+            return slice(0, len(self.date_labels))
+        if not self.dates_sorted:
+            raise ValueError(
+                "Date filtering is unavailable: column headers are not "
+                "chronological dates"
+            )
+        lo = 0
+        hi = len(self.dates)
+        if start is not None:
+            lo = int(np.searchsorted(self.dates, np.datetime64(start, "D"), "left"))
+        if end is not None:
+            hi = int(np.searchsorted(self.dates, np.datetime64(end, "D"), "right"))
+        return slice(lo, max(lo, hi))
+
+    def column_for(self, day) -> Optional[int]:
+        """
+        Column covering a day: the last date column on or before it.
+
+        Returns None if the day precedes the first column, is a full column
+        period (the median spacing of the columns) past the last one, or the
+        headers cannot be binary searched.
+        """
+        if not self.dates_sorted:
+            return None
+        day = np.datetime64(day, "D")
+        position = int(np.searchsorted(self.dates, day, "right"))
+        if position == 0:
+            return None
+        if position == len(self.dates) and day >= self.dates[-1] + self.column_period:
+            return None
+        return position - 1
+
+    @cached_property
+    def column_period(self) -> np.timedelta64:
+        """Typical spacing of the date columns (one day with a single column)"""
+        if len(self.dates) < 2:
+            return np.timedelta64(1, "D")
+        return np.timedelta64(int(np.median(np.diff(self.dates).astype(np.int64))), "D")
+
+    def gather(self, port_pairs: List[str], columns: slice = slice(None)):
+        """
+        Values of many port pairs in one vectorized row gather.
+
+        Returns (matrix, found) where matrix has one row per found pair, in
+        input order, and found is a boolean mask over port_pairs.
+        """
+        rows = np.fromiter(
+            (self.index.get(pair, -1) for pair in port_pairs),
+            dtype=np.int64,
+            count=len(port_pairs),
+        )
+        found = rows >= 0
+        return self.values[rows[found], columns], found
+
+    def search(
+        self, origin: Optional[str] = None, destination: Optional[str] = None
+    ) -> np.ndarray:
+        """
+        Rows whose POL starts with origin and POD starts with destination.
+
+        Matching is case-insensitive; rows come back in file order.
+        """
+        matches = None
+        if origin:
+            matches = self.pol_index.lookup(origin.upper())
+        if destination:
+            pod_rows = self.pod_index.lookup(destination.upper())
+            if matches is None:
+                matches = pod_rows
+            else:
+                return np.intersect1d(matches, pod_rows, assume_unique=True)
+        if matches is None:
+            return self.searchable_rows
+        return np.sort(matches)
+
+    def lanes_between(
+        self, origins: Iterable[str], destinations: Iterable[str]
+    ) -> np.ndarray:
+        """Rows from any of origins to any of destinations (exact codes), in file order"""
+        destinations = {code.upper() for code in destinations}
+        rows = [
+            row
+            for origin in {code.upper() for code in origins}
+            for row in self.pol_index.lookup(origin).tolist()
+            if self.pols[row] == origin and self.pods[row] in destinations
+        ]
+        return np.array(sorted(rows), dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, frame: "pd.DataFrame") -> "AvailabilityStore":
+        """Build a store from a DataFrame indexed by port pair with date columns"""
+        numeric = frame.apply(_coerce_numeric)
+        return cls(
+            pairs=frame.index.astype(str).tolist(),
+            date_labels=frame.columns.astype(str).tolist(),
+            values=numeric.to_numpy(dtype=np.float32, na_value=np.nan),
+        )
+
+    @classmethod
+    def from_csv(cls, csv_path) -> "AvailabilityStore":
+        """Parse a Qlik Sense export (title row, then ';'-delimited table)"""
+        import pandas as pd
+
+        frame = pd.read_csv(
+            csv_path,
+            skiprows=1,
+            delimiter=";",
+            index_col=PAIR_COLUMN,
+        )
+        return cls.from_frame(frame)
+
+    @classmethod
+    def from_snapshot(cls, snapshot_path) -> "AvailabilityStore":
+        """
+        Open a compiled snapshot (see save_snapshot).
+
+        The values matrix is memory-mapped read-only, so it is paged in by
+        the OS on first access instead of being parsed at startup.
+        """
+        with open(snapshot_path, "rb") as f:
+            magic = f.read(len(SNAPSHOT_MAGIC))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{snapshot_path} is not a port pair snapshot")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len))
+
+        shape = tuple(header["shape"])
+        if shape[0] * shape[1] == 0:
+            values = np.empty(shape, dtype=np.float32)
+        else:
+            values = np.memmap(
+                snapshot_path,
+                dtype="<f4",
+                mode="r",
+                offset=_snapshot_values_offset(header_len),
+                shape=shape,
+            )
+        return cls(
+            pairs=header["pairs"],
+            date_labels=header["date_labels"],
+            values=values,
+            dates=np.array(header["dates"], dtype="datetime64[D]"),
+        )
+
+    def save_snapshot(self, snapshot_path) -> None:
+        """
+        Write the store as a compiled snapshot.
+
+        The file is written next to the target and renamed into place, so a
+        running server never sees a half-written snapshot.
+        """
+        snapshot_path = Path(snapshot_path)
+        header = {
+            "shape": list(self.values.shape),
+            "pairs": self.pairs,
+            "date_labels": self.date_labels,
+            "dates": [str(date) for date in self.dates],
+        }
+        encoded = json.dumps(header).encode("utf-8")
+        prefix_len = len(SNAPSHOT_MAGIC) + 8 + len(encoded)
+        padding = _snapshot_values_offset(len(encoded)) - prefix_len
+
+        tmp_path = snapshot_path.with_name(snapshot_path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(SNAPSHOT_MAGIC)
+            f.write(struct.pack("<Q", len(encoded)))
+            f.write(encoded)
+            f.write(b"\0" * padding)
+            f.write(np.ascontiguousarray(self.values, dtype="<f4").tobytes())
+        os.replace(tmp_path, snapshot_path)
+
+
+def _snapshot_values_offset(header_len: int) -> int:
+    """Byte offset of the values matrix, aligned to SNAPSHOT_ALIGN"""
+    prefix_len = len(SNAPSHOT_MAGIC) + 8 + header_len
+    return -(-prefix_len // SNAPSHOT_ALIGN) * SNAPSHOT_ALIGN
+
+
+def _coerce_numeric(column: "pd.Series") -> "pd.Series":
+    """Coerce a column to numbers, tolerating '85%' and '85,5' style cells"""
+    import pandas as pd
+
+    if column.dtype.kind in "biuf":
+        return column
+    cleaned = (
+        column.astype("string")
+        .str.strip()
+        .str.rstrip("%")
+        .str.replace(",", ".", regex=False)
+    )
+    return pd.to_numeric(cleaned, errors="coerce")
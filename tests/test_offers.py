@@ -0,0 +1,40 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from offers import merge_offers, offer_key, offer_price  # noqa: E402
+
+
+def charged_offer(offer_id, total, charge_values):
+    return {
+        "offerId": offer_id,
+        "totalPrice": total,
+        "legs": [{"id": "LEG-1", "charges": [{"value": v} for v in charge_values]}],
+    }
+
+
+def test_nested_charge_values_do_not_pass_for_the_price():
+    offer = charged_offer("A", {"amount": 1500, "currency": "USD"}, [12, 40])
+    assert offer_price(offer) == 1500
+
+    # Without a top-level total the offer has no price, not a charge's value
+    del offer["totalPrice"]
+    assert offer_price(offer) is None
+
+
+def test_nested_ids_do_not_merge_different_offers():
+    first = {"legs": [{"id": "LEG-1"}], "totalPrice": 900}
+    second = {"legs": [{"id": "LEG-1"}], "totalPrice": 1200}
+    assert offer_key(first) != offer_key(second)
+
+    merged = merge_offers({"2025-11-15": [first], "2025-11-22": [second]})
+    assert [entry["price"] for entry in merged["offers"]] == [900, 1200]
+
+
+def test_calendar_min_price_uses_totals():
+    offers = [charged_offer("A", 1500, [5]), charged_offer("B", 1100, [1])]
+    merged = merge_offers({"2025-11-15": offers, "2025-11-22": offers[:1]})
+    assert [day["min_price"] for day in merged["calendar"]] == [1100, 1500]
+    assert merged["offers"][0]["departure_dates"] == ["2025-11-15"]
+    assert merged["offers"][1]["departure_dates"] == ["2025-11-15", "2025-11-22"]
@@ -0,0 +1,754 @@
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import httpx
+
+from caches import LRUCache
+
+SPOTON_SEARCH_URL = (
+    "https://apis.cma-cgm.net/pricing/commercial/instantquote/v2/spotOn/search"
+)
+ROUTINGS_URL = "https://apis.cma-cgm.net/vesseloperation/route/v2/routings"
+
+# Connection pool shared by every upstream call for the app's lifetime
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get("UPSTREAM_MAX_CONNECTIONS", "50"))
+UPSTREAM_MAX_KEEPALIVE = int(os.environ.get("UPSTREAM_MAX_KEEPALIVE", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+
+# Seconds; the read timeout bounds each page, connect is kept shorter
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get("UPSTREAM_CONNECT_TIMEOUT", "10"))
+
+# Maximum pages of one proxy call fetched at the same time
+UPSTREAM_PAGE_CONCURRENCY = int(os.environ.get("UPSTREAM_PAGE_CONCURRENCY", "5"))
+
+# Items requested per Range page
+UPSTREAM_PAGE_SIZE = int(os.environ.get("UPSTREAM_PAGE_SIZE", "5"))
+
+# Pages requested alongside the first one when a lane's result count is known
+UPSTREAM_SPECULATIVE_PAGES = int(os.environ.get("UPSTREAM_SPECULATIVE_PAGES", "4"))
+
+# Upstream page requests in flight across all proxy calls at once
+UPSTREAM_MAX_IN_FLIGHT = int(os.environ.get("UPSTREAM_MAX_IN_FLIGHT", "20"))
+
+# Hedge a page that is slower than this percentile of recent page latencies
+# (0 disables), adding at most this share of extra requests
+UPSTREAM_HEDGE_PERCENTILE = float(os.environ.get("UPSTREAM_HEDGE_PERCENTILE", "0"))
+UPSTREAM_HEDGE_MAX_RATIO = float(os.environ.get("UPSTREAM_HEDGE_MAX_RATIO", "0.1"))
+
+# Recent page latencies kept per API, and the minimum needed before hedging
+UPSTREAM_HEDGE_WINDOW = int(os.environ.get("UPSTREAM_HEDGE_WINDOW", "256"))
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.environ.get("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+
+# Requests per second allowed per upstream host (0 disables) and burst size
+UPSTREAM_RATE_LIMIT = float(os.environ.get("UPSTREAM_RATE_LIMIT", "20"))
+UPSTREAM_RATE_BURST = int(os.environ.get("UPSTREAM_RATE_BURST", "40"))
+
+# Retries per request for retryable failures, with jittered exponential backoff
+UPSTREAM_MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", "3"))
+UPSTREAM_BACKOFF_BASE = float(os.environ.get("UPSTREAM_BACKOFF_BASE", "0.5"))
+UPSTREAM_BACKOFF_MAX = float(os.environ.get("UPSTREAM_BACKOFF_MAX", "10"))
+
+# Consecutive failures that open a host's circuit, and seconds it stays open
+UPSTREAM_BREAKER_THRESHOLD = int(os.environ.get("UPSTREAM_BREAKER_THRESHOLD", "5"))
+UPSTREAM_BREAKER_RESET = float(os.environ.get("UPSTREAM_BREAKER_RESET", "30"))
+
+# Throttling and transient gateway errors; anything else is returned as is
+RETRYABLE_STATUSES = frozenset({408, 429, 502, 503, 504})
+
+
+def create_client(
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+) -> httpx.AsyncClient:
+    """
+    Build the shared upstream client.
+
+    Connections are kept alive and reused across requests, so page fan-out
+    does not pay a TCP/TLS handshake per page. A transport can be injected
+    to run against a fake upstream.
+    """
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(UPSTREAM_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        transport=transport,
+    )
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling upstream while a host's circuit is open"""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"{host} is failing, requests paused for {retry_after:.1f}s")
+        self.host = host
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """
+    Rate limiter: `rate` requests per second with bursts of up to `burst`.
+
+    acquire() takes a token (or several), sleeping until they are due. Callers reserve
+    tokens in arrival order, so concurrent waiters are spaced 1/rate apart.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens -= tokens
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the next `seconds` (e.g. after a 429)"""
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    """
+    Fails fast once a host has failed `threshold` times in a row.
+
+    The circuit then stays open for `reset_timeout` seconds, after which a
+    single probe request is let through while other requests wait for its
+    outcome: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold: int, reset_timeout: float):
+        self.threshold = max(1, threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self.opened_at = 0.0
+        self.probe: Optional[asyncio.Event] = None
+
+    async def before_request(self, host: str) -> None:
+        while True:
+            if self.state == "open":
+                remaining = self.opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    raise UpstreamUnavailable(host, remaining)
+                self.state = "half-open"
+            if self.state != "half-open":
+                return
+            if self.probe is None:
+                self.probe = asyncio.Event()
+                return
+            # Another request is probing; wait for its outcome
+            await self.probe.wait()
+
+    def _end_probe(self) -> None:
+        if self.probe is not None:
+            self.probe.set()
+            self.probe = None
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.failures = 0
+        self._end_probe()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half-open" or self.failures >= self.threshold:
+            if self.state != "open":
+                print(f"Upstream circuit opened after {self.failures} failures")
+                self.opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+        self._end_probe()
+
+    def abandon(self) -> None:
+        """The request was cancelled before it had an outcome"""
+        self._end_probe()
+
+
+def parse_retry_after(header: Optional[str]) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP date)"""
+    if not header:
+        return None
+    try:
+        return max(0.0, float(header))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(header).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class UpstreamGovernor:
+    """
+    Shared policy for every upstream request, kept per API host.
+
+    Each request waits for a token from the host's rate limiter and is
+    refused up front while the host's circuit is open. Retryable statuses
+    and transport errors are retried up to `max_retries` times with full
+    jitter backoff, honouring Retry-After; a 429 also pauses the host's
+    limiter so other requests back off too. Other responses are returned
+    as they are. Only 5xx and transport errors count against the circuit.
+    """
+
+    def __init__(
+        self,
+        rate: float = UPSTREAM_RATE_LIMIT,
+        burst: int = UPSTREAM_RATE_BURST,
+        max_retries: int = UPSTREAM_MAX_RETRIES,
+        backoff_base: float = UPSTREAM_BACKOFF_BASE,
+        backoff_max: float = UPSTREAM_BACKOFF_MAX,
+        breaker_threshold: int = UPSTREAM_BREAKER_THRESHOLD,
+        breaker_reset: float = UPSTREAM_BREAKER_RESET,
+        seed: Optional[int] = None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max(0, max_retries)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.random = random.Random(seed)
+        self.limiters: Dict[str, TokenBucket] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.retries = 0
+        self.rejected = 0
+
+    def backoff(self, attempt: int) -> float:
+        return self.random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    def _host(self, host: str) -> Tuple[TokenBucket, CircuitBreaker]:
+        if host not in self.limiters:
+            self.limiters[host] = TokenBucket(self.rate, self.burst)
+            self.breakers[host] = CircuitBreaker(
+                self.breaker_threshold, self.breaker_reset
+            )
+        return self.limiters[host], self.breakers[host]
+
+    async def send(
+        self, url: str, request: Callable[[], Awaitable[httpx.Response]]
+    ) -> httpx.Response:
+        """Run request() for url under the host's rate limit, retries and circuit"""
+        host = httpx.URL(url).host
+        limiter, breaker = self._host(host)
+        attempt = 0
+        while True:
+            try:
+                await breaker.before_request(host)
+            except UpstreamUnavailable:
+                self.rejected += 1
+                raise
+            await limiter.acquire()
+
+            try:
+                response = await request()
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                if attempt >= self.max_retries or breaker.state == "open":
+                    raise
+                delay = self.backoff(attempt)
+                reason = type(e).__name__
+            except BaseException:
+                breaker.abandon()
+                raise
+            else:
+                if response.status_code >= 500:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                if response.status_code not in RETRYABLE_STATUSES:
+                    return response
+
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+                delay = self.backoff(attempt) if retry_after is None else retry_after
+                if response.status_code == 429:
+                    limiter.pause(delay)
+                if (
+                    attempt >= self.max_retries
+                    or delay > self.backoff_max
+                    or breaker.state == "open"
+                ):
+                    return response
+                reason = f"status {response.status_code}"
+
+            attempt += 1
+            self.retries += 1
+            print(
+                f"Retrying {host} after {reason} in {delay:.2f}s "
+                f"(attempt {attempt}/{self.max_retries})"
+            )
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict:
+        return {
+            "retries": self.retries,
+            "rejected": self.rejected,
+            "hosts": {
+                host: {
+                    "circuit": breaker.state,
+                    "consecutive_failures": breaker.failures,
+                    "times_opened": breaker.opened,
+                }
+                for host, breaker in self.breakers.items()
+            },
+        }
+
+
+upstream_governor = UpstreamGovernor()
+
+
+class ContentRange(NamedTuple):
+    start: int
+    end: int
+    total: int
+
+
+def parse_content_range(header: Optional[str]) -> Optional[ContentRange]:
+    """Parse 'a-b/total' (optionally prefixed by a unit) from content-range"""
+    if not header:
+        return None
+    try:
+        span, total = header.split()[-1].split("/")
+        start, end = span.split("-")
+        return ContentRange(int(start), int(end), int(total))
+    except ValueError:
+        return None
+
+
+class LaneHistory:
+    """Last known result count per lane, used to speculate on page ranges"""
+
+    def __init__(self, maxsize: int = 10000):
+        self._totals = LRUCache(maxsize)
+
+    def expected_total(self, lane: str) -> Optional[int]:
+        return self._totals.get(lane)
+
+    def record(self, lane: str, total: int) -> None:
+        self._totals.put(lane, total)
+
+
+lane_history = LaneHistory()
+
+
+class FairScheduler:
+    """
+    Global cap on in-flight upstream requests, shared fairly between lanes.
+
+    Requests acquire a slot for their lane. While slots are free they run
+    immediately; once the cap is reached waiters queue per lane and freed
+    slots go round-robin across the waiting lanes, so a lane with many
+    pages cannot starve the others.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.granted = 0
+        self.queued = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self._waiting.values())
+
+    def stats(self) -> Dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": self.waiting(),
+            "waiting_lanes": len(self._waiting),
+            "granted": self.granted,
+            "queued": self.queued,
+        }
+
+    def _grant(self) -> None:
+        self.in_flight += 1
+        self.granted += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    async def acquire(self, lane: str) -> None:
+        if self.in_flight < self.limit and not self._waiting:
+            self._grant()
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(lane, deque()).append(waiter)
+        self.queued += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self._forget(lane, waiter)
+            raise
+
+    def _forget(self, lane: str, waiter: asyncio.Future) -> None:
+        queue = self._waiting.get(lane)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        if not queue:
+            del self._waiting[lane]
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        while self._waiting and self.in_flight < self.limit:
+            # Serve the lane that has waited longest, then requeue it last
+            lane, queue = self._waiting.popitem(last=False)
+            waiter = queue.popleft()
+            if queue:
+                self._waiting[lane] = queue
+            if not waiter.done():
+                self._grant()
+                waiter.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, lane: str):
+        await self.acquire(lane)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+upstream_scheduler = FairScheduler(UPSTREAM_MAX_IN_FLIGHT)
+
+
+class Hedger:
+    """
+    Duplicates slow page requests to cut tail latency.
+
+    A page that has not answered after the `percentile` of recent page
+    latencies for its API gets a second, identical request; whichever
+    succeeds first is used and the other is cancelled. Every request adds
+    `max_ratio` of a hedge credit (up to a small reserve) and a hedge spends
+    one, so hedges add at most that share of extra upstream load.
+    """
+
+    def __init__(
+        self,
+        percentile: float = UPSTREAM_HEDGE_PERCENTILE,
+        max_ratio: float = UPSTREAM_HEDGE_MAX_RATIO,
+        window: int = UPSTREAM_HEDGE_WINDOW,
+        min_samples: int = UPSTREAM_HEDGE_MIN_SAMPLES,
+        reserve: float = 10.0,
+    ):
+        self.percentile = percentile
+        self.max_ratio = max_ratio
+        self.window = window
+        self.min_samples = max(1, min_samples)
+        self.reserve = reserve
+        self.credit = 0.0
+        self.latencies: Dict[str, Deque[float]] = {}
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self.over_budget = 0
+
+    @property
+    def enabled(self) -> bool:
+        return 0 < self.percentile < 100 and self.max_ratio > 0
+
+    def delay(self, api: str) -> Optional[float]:
+        """Seconds to wait before hedging a page of `api`, None if not hedging"""
+        samples = self.latencies.get(api)
+        if not self.enabled or samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def record(self, api: str, latency: float) -> None:
+        samples = self.latencies.get(api)
+        if samples is None:
+            samples = self.latencies[api] = deque(maxlen=self.window)
+        samples.append(latency)
+
+    async def run(
+        self, api: str, call: Callable[[], Awaitable[Any]]
+    ) -> Tuple[Any, Optional[bool]]:
+        """
+        Run call(), hedging it if it is slow.
+
+        Returns (result, won) where won is None if no hedge was sent and
+        otherwise whether the hedge answered first.
+        """
+        self.requests += 1
+        self.credit = min(self.reserve, self.credit + self.max_ratio)
+        delay = self.delay(api)
+
+        async def timed():
+            started = time.monotonic()
+            result = await call()
+            self.record(api, time.monotonic() - started)
+            return result
+
+        primary = asyncio.ensure_future(timed())
+        tasks = [primary]
+        try:
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+            if primary.done() or delay is None:
+                return await primary, None
+            if self.credit < 1:
+                self.over_budget += 1
+                return await primary, None
+
+            self.credit -= 1
+            self.fired += 1
+            hedge = asyncio.ensure_future(timed())
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        won = task is hedge
+                        self.won += won
+                        return task.result(), won
+            # Both failed: report the original request's error
+            return primary.result(), False
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()  # mark the loser's error as retrieved
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "requests": self.requests,
+            "hedges_fired": self.fired,
+            "hedges_won": self.won,
+            "skipped_over_budget": self.over_budget,
+            "delay_ms": {
+                api: round(delay * 1000, 1)
+                for api in self.latencies
+                if (delay := self.delay(api)) is not None
+            },
+        }
+
+
+page_hedger = Hedger()
+
+
+def as_item_list(page_data: Any) -> List:
+    """Items of a page body: a list, a {"data": [...]} wrapper or one object"""
+    if isinstance(page_data, list):
+        return page_data
+    if isinstance(page_data, dict) and isinstance(page_data.get("data"), list):
+        return page_data["data"]
+    return [page_data]
+
+
+class Paginator:
+    """
+    Fetches every Range page of one upstream search.
+
+    send(range_header) performs one request and returns the response (raising
+    for HTTP errors). The first page reports the total in content-range; the
+    rest are requested concurrently, at most `concurrency` at a time. When
+    the lane's result count is known from earlier calls, the likely next
+    pages are requested together with the first one. Speculative pages that
+    turn out to lie beyond the real total are cancelled and their responses
+    or errors dropped.
+
+    pages() yields (start, items) as each page completes, first page first;
+    fetch_all() returns all items in range order. Afterwards content_range,
+    cma_func_explain and stats() describe the run.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str], Awaitable[httpx.Response]],
+        lane: str,
+        page_size: int = UPSTREAM_PAGE_SIZE,
+        concurrency: int = UPSTREAM_PAGE_CONCURRENCY,
+        speculative_pages: int = UPSTREAM_SPECULATIVE_PAGES,
+        history: Optional[LaneHistory] = lane_history,
+        scheduler: Optional[FairScheduler] = upstream_scheduler,
+        hedger: Optional[Hedger] = page_hedger,
+    ):
+        self.send = send
+        self.lane = lane
+        self.page_size = max(1, page_size)
+        self.concurrency = max(1, concurrency)
+        self.speculative_pages = max(0, speculative_pages)
+        self.history = history
+        self.scheduler = scheduler
+        self.hedger = hedger
+
+        self.status_code: Optional[int] = None
+        self.content_range: Optional[str] = None
+        self.cma_func_explain: Optional[str] = None
+        self.total: Optional[int] = None
+        self.pages_fetched = 0
+        self.speculative_launched = 0
+        self.speculative_dropped = 0
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def stats(self) -> Dict:
+        return {
+            "page_size": self.page_size,
+            "pages_fetched": self.pages_fetched,
+            "speculative_launched": self.speculative_launched,
+            "speculative_used": self.speculative_launched - self.speculative_dropped,
+            "hedges_fired": self.hedges_fired,
+            "hedges_won": self.hedges_won,
+        }
+
+    async def pages(self) -> AsyncIterator[Tuple[int, List]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+        # In-flight page requests: task -> (start, end) of the requested range
+        tasks: Dict[asyncio.Task, Tuple[int, int]] = {}
+
+        def launch(start: int, end: int) -> asyncio.Task:
+            async def attempt():
+                if self.scheduler is None:
+                    return await self.send(f"{start}-{end}")
+                async with self.scheduler.slot(self.lane):
+                    return await self.send(f"{start}-{end}")
+
+            async def fetch():
+                async with semaphore:
+                    if self.hedger is None:
+                        return await attempt()
+                    response, won = await self.hedger.run(api, attempt)
+                    if won is not None:
+                        self.hedges_fired += 1
+                        self.hedges_won += won
+                    return response
+
+            task = asyncio.ensure_future(fetch())
+            tasks[task] = (start, end)
+            return task
+
+        def drop(task: asyncio.Task) -> None:
+            tasks.pop(task, None)
+            if task.done():
+                if not task.cancelled():
+                    task.exception()  # mark any error as retrieved
+            else:
+                task.cancel()
+
+        # Latencies are tracked per API ("spoton", "schedule"), not per lane
+        api = self.lane.split(":", 1)[0]
+
+        try:
+            first = launch(0, self.page_size - 1)
+            expected = self.history.expected_total(self.lane) if self.history else None
+            if expected:
+                stop = min(expected, self.page_size * (1 + self.speculative_pages))
+                for start in range(self.page_size, stop, self.page_size):
+                    launch(start, start + self.page_size - 1)
+                    self.speculative_launched += 1
+
+            print(f"Making initial request with Range: 0-{self.page_size - 1}")
+            response = await first
+            tasks.pop(first)
+            self.pages_fetched += 1
+            self.status_code = response.status_code
+            self.content_range = response.headers.get("content-range")
+            self.cma_func_explain = response.headers.get("cma-func-explain")
+            print(
+                f"Initial response: status={self.status_code}, "
+                f"content-range={self.content_range}"
+            )
+            yield 0, as_item_list(response.json())
+
+            # Check if there are more pages (status 206 = Partial Content)
+            parsed = parse_content_range(self.content_range)
+            wanted: Dict[int, int] = {}
+            if self.status_code == 206 and parsed:
+                self.total = parsed.total
+                for start in range(parsed.end + 1, parsed.total, self.page_size):
+                    wanted[start] = min(start + self.page_size - 1, parsed.total - 1)
+            if self.history is not None and parsed:
+                self.history.record(self.lane, parsed.total)
+
+            # Keep speculative pages that start on a wanted range; the last
+            # one may overshoot the total and is re-requested if rejected
+            exact_end = dict(wanted)
+            for task, (start, _) in list(tasks.items()):
+                if start in wanted:
+                    del wanted[start]
+                else:
+                    drop(task)
+                    self.speculative_dropped += 1
+            for start, end in wanted.items():
+                launch(start, end)
+            if tasks:
+                print(f"Fetching {len(tasks)} more pages of {self.total} items")
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    start, end = tasks.pop(task)
+                    try:
+                        page = as_item_list(task.result().json())
+                    except Exception as e:
+                        if end != exact_end[start]:
+                            pending.add(launch(start, exact_end[start]))
+                            continue
+                        print(f"Error fetching range {start}-{end}: {e}")
+                        raise
+                    self.pages_fetched += 1
+                    yield start, page
+        finally:
+            for task in list(tasks):
+                drop(task)
+
+    async def fetch_all(self) -> List:
+        pages = [page async for page in self.pages()]
+        pages.sort(key=lambda page: page[0])
+        return [item for _, items in pages for item in items]